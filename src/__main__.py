@@ -8,6 +8,7 @@ from .physics import apply_gift
 from .logger import init_logger, log_event
 from .orchestrator import run_simulation, run_turn
 from .spawner import run_designed_spawn
+from .store import has_store, open_store
 
 
 def _handle_gift(args) -> None:
@@ -22,6 +23,8 @@ def _handle_gift(args) -> None:
         return
 
     data_dir = DEFAULT_CONFIG.data_dir
+    if has_store(data_dir):
+        open_store(data_dir)
     world = load_world(data_dir)
     if not world:
         print("Error: no world state found")
@@ -62,6 +65,8 @@ def main() -> None:
     parser.add_argument("-e", "--energy", type=int)
     parser.add_argument("-i", "--invoker", choices=["claude", "codex", "mixed"])
     parser.add_argument("-c", "--concurrency", type=int)
+    parser.add_argument("--round-deadline", type=int,
+                        help="seconds after which unfinished agent sessions are cancelled")
     mode = parser.add_mutually_exclusive_group()
     mode.add_argument("-n", "--rounds", type=int, help="number of rounds to run")
     mode.add_argument("-t", "--turns", type=int, help="number of turns to run")
@@ -70,6 +75,12 @@ def main() -> None:
                         help="gift energy to an agent")
     parser.add_argument("-m", "--message", type=str, default="",
                         help="message to send with --gift")
+    parser.add_argument("--eval-mode", choices=["serial", "parallel", "batch"],
+                        help="evaluate axes one by one, concurrently, or in one call")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="evaluate round N while round N+1 is invoked")
+    parser.add_argument("--storage", choices=["json", "sqlite"],
+                        help="state backend (sqlite is kept once data/state.db exists)")
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--claude-model", type=str, help="model for claude agents")
     parser.add_argument("--codex-model", type=str, help="model for codex agents")
@@ -83,13 +94,19 @@ def main() -> None:
         initial_agent_count=args.agents or DEFAULT_CONFIG.initial_agent_count,
         initial_energy=args.energy or DEFAULT_CONFIG.initial_energy,
         concurrency=args.concurrency or DEFAULT_CONFIG.concurrency,
+        round_deadline=args.round_deadline or DEFAULT_CONFIG.round_deadline,
         invoker=args.invoker or DEFAULT_CONFIG.invoker,
         dry_run=args.dry_run,
+        eval_mode=args.eval_mode or DEFAULT_CONFIG.eval_mode,
+        pipeline=args.pipeline,
+        storage=args.storage or DEFAULT_CONFIG.storage,
         claude_model=args.claude_model or DEFAULT_CONFIG.claude_model,
         codex_model=args.codex_model or DEFAULT_CONFIG.codex_model,
     )
 
     init_logger(config.logs_dir)
+    if config.storage == "sqlite" or has_store(config.data_dir):
+        open_store(config.data_dir)
 
     world = load_world(config.data_dir)
     if world:
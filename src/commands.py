@@ -26,7 +26,7 @@ COMMAND_SPECS: list[CommandSpec] = [
         CommandParam("script", "<filename>"),
         CommandParam("price", "<number>"),
         CommandParam("description", "<text>"),
-    ], limits='min price 0.5, max 2 services. Optional: "upgradeable": false for immutable.'),
+    ], limits='min price 0.5, max 2 services. Optional: "upgradeable": false for immutable; "persistent": true keeps the script running (one JSON request per stdin line, one reply per stdout line); "limits": {"cpu": seconds, "memory_mb", "fsize_mb", "nproc"} sets the per-call caps (default: CPU up to the 300s timeout, 64MB files, no memory cap; at most 8192MB memory, 1024MB files, 256 processes); "state_file": true stores state in a file the script reads from "state_path", then applies the merge patches in "state_log" (one per line) if given. Scripts may return "state_patch" (JSON merge patch, null deletes a key) instead of the full "state". "state_blob_mb": N (max 64) adds a binary state.bin the script can mmap ("state_blob" in the payload); it is rolled back when a call fails. "batch": true queues paid calls and runs the script once at round end with trigger "batch" and context.requests (a list of {caller_id, caller_name, input, price}); return {"outputs": [{"output", "effects"}, ...]} in the same order. Hook "on_event" with "event_topics": ["pattern", ...] (fnmatch, max 10) runs the script once per turn with trigger "on_event" and context.events (matching emits from other services).'),
     CommandSpec("update_service", [
         CommandParam("name", "<name>"),
         CommandParam("price", "<number>"),
@@ -3,6 +3,8 @@
 import json
 import os
 
+from .store import get_store
+
 SERVICE_NAME = "evaluator"
 VOTES_DIR = "eval"
 VOTES_FILE = "votes.json"
@@ -25,13 +27,10 @@ def handle_evaluator_service(
     data_dir: str,
 ) -> tuple[str, float]:
     """Process a RATE command. Returns (output_text, energy_gained)."""
-    votes = _load_votes(data_dir)
-    round_key = str(round_num)
-    if round_key not in votes:
-        votes[round_key] = {}
+    round_votes = _load_round_votes(data_dir, round_num)
 
-    if caller_id in votes[round_key]:
-        return f"Already voted this round. Your vote: {votes[round_key][caller_id]['target']}", 0.0
+    if caller_id in round_votes:
+        return f"Already voted this round. Your vote: {round_votes[caller_id]['target']}", 0.0
 
     text = input_text.strip()
     if not text:
@@ -40,7 +39,6 @@ def handle_evaluator_service(
     parts = text.split(None, 1)
     cmd = parts[0].upper()
     if cmd == "STATUS":
-        round_votes = votes.get(round_key, {})
         return f"Round {round_num}: {len(round_votes)} vote(s) cast. Budget: {EVAL_BUDGET}E. Voting is secret — results revealed at round end.", 0.0
 
     if cmd != "RATE":
@@ -57,12 +55,11 @@ def handle_evaluator_service(
     if target.lower() == caller_id.lower() or target.lower() == caller_name.lower():
         return "Cannot vote for yourself.", 0.0
 
-    votes[round_key][caller_id] = {
+    _save_vote(data_dir, round_num, caller_id, {
         "voter_name": caller_name,
         "target": target,
         "reason": reason[:200],
-    }
-    _save_votes(votes, data_dir)
+    })
 
     return f"Vote recorded: {target}. Reason: {reason[:200] if reason else '(none)'}", 0.0
 
@@ -76,9 +73,7 @@ def distribute_eval_rewards(world, data_dir: str) -> list:
     entity = load_entity(data_dir, SERVICE_NAME)
     budget = entity.energy if entity else 0.0
 
-    votes = _load_votes(data_dir)
-    round_key = str(world.round)
-    round_votes = votes.get(round_key, {})
+    round_votes = _load_round_votes(data_dir, world.round)
 
     if not round_votes or budget <= 0:
         return []
@@ -103,7 +98,7 @@ def distribute_eval_rewards(world, data_dir: str) -> list:
     for agent_id, count in sorted(tally.items(), key=lambda x: -x[1]):
         amount = round(budget * count / total_votes, 2)
         agent = next(a for a in world.agents if a.id == agent_id)
-        actual = transfer_energy(entity, agent, amount)
+        actual = transfer_energy(entity, agent, amount, kind="eval_reward")
         if actual <= 0:
             continue
 
@@ -142,3 +137,20 @@ def _save_votes(votes: dict, data_dir: str) -> None:
     path = _votes_path(data_dir)
     with open(path, "w") as f:
         json.dump(votes, f, indent=2)
+
+
+def _load_round_votes(data_dir: str, round_num: int) -> dict:
+    store = get_store(data_dir)
+    if store is not None:
+        return store.load_votes(round_num)
+    return _load_votes(data_dir).get(str(round_num), {})
+
+
+def _save_vote(data_dir: str, round_num: int, voter_id: str, vote: dict) -> None:
+    store = get_store(data_dir)
+    if store is not None:
+        store.put_vote(round_num, voter_id, vote)
+        return
+    votes = _load_votes(data_dir)
+    votes.setdefault(str(round_num), {})[voter_id] = vote
+    _save_votes(votes, data_dir)
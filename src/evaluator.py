@@ -1,11 +1,12 @@
 import json
 import os
-import subprocess
+import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 from .types import Agent, SimulationConfig, WorldEvent, WorldState
 from .world import get_alive_agents
-from .config import clean_env
+from .launcher import launch
 
 
 EVAL_AXES = [
@@ -34,33 +35,82 @@ def evaluate_round(
     world: WorldState, config: SimulationConfig,
     budget: float = 5.0,
 ) -> list[WorldEvent]:
-    if config.dry_run:
+    summaries = round_summaries(world, config)
+    if summaries is None:
         return []
+    return apply_scores(world, score_summaries(summaries, config), world.round)
+
+
+def round_summaries(world: WorldState, config: SimulationConfig) -> str | None:
+    """Snapshot what the evaluator sees of the current round, or None if nothing to score."""
+    if config.dry_run:
+        return None
 
     alive = get_alive_agents(world)
     if not alive:
-        return []
+        return None
 
     summaries = _build_agent_summaries(alive, config.private_dir, config.logs_dir, world.round)
     if not summaries.strip():
-        return []
+        return None
+    return summaries
 
-    template_path = os.path.join(os.path.dirname(__file__), "evaluator_prompt.md")
-    with open(template_path) as f:
-        template = f.read()
 
-    all_events = []
-    for axis in EVAL_AXES:
-        events = _evaluate_axis(axis, template, summaries, alive, world, config)
-        all_events.extend(events)
+def score_summaries(summaries: str, config: SimulationConfig) -> list[dict | None]:
+    """Run the LLM evaluator. Returns rewards per axis in EVAL_AXES order.
 
+    Does not touch world state, so it can run in the background.
+    """
+    if config.eval_mode == "batch":
+        return _evaluate_batch(summaries)
+
+    template = _load_template("evaluator_prompt.md")
+    workers = 1 if config.eval_mode == "serial" else max(1, min(config.concurrency, len(EVAL_AXES)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(
+            lambda axis: _evaluate_axis(axis, template, summaries), EVAL_AXES,
+        ))
+
+
+def apply_scores(world: WorldState, axis_rewards: list[dict | None], scored_round: int) -> list[WorldEvent]:
+    # Rewards are applied in EVAL_AXES order whatever order the calls finished in.
+    all_events = []
+    for axis, rewards in zip(EVAL_AXES, axis_rewards):
+        if rewards:
+            all_events.extend(_apply_rewards(world, rewards, BUDGET_PER_AXIS, axis["name"], scored_round))
     return all_events
 
 
-def _evaluate_axis(
-    axis: dict, template: str, summaries: str,
-    alive: list[Agent], world: WorldState, config: SimulationConfig,
-) -> list[WorldEvent]:
+def _load_template(filename: str) -> str:
+    with open(os.path.join(os.path.dirname(__file__), filename)) as f:
+        return f.read()
+
+
+def _run_evaluator(prompt: str, output_dir: str, label: str) -> dict | None:
+    """Run one evaluator session and return the rewards.json it wrote."""
+    result = launch(
+        ["claude", "-p", "--model", "claude-sonnet-4-6"], prompt, 300,
+        label=f"eval:{label}",
+    )
+
+    if result.returncode != 0:
+        print(f"  [eval] {label} failed: {result.stderr[:200]}")
+        return None
+
+    rewards_path = os.path.join(output_dir, "rewards.json")
+    if not os.path.exists(rewards_path):
+        print(f"  [eval] {label}: no rewards.json")
+        return None
+
+    with open(rewards_path) as f:
+        rewards = json.load(f)
+    if not isinstance(rewards, dict):
+        print(f"  [eval] {label}: rewards.json is not an object")
+        return None
+    return rewards
+
+
+def _evaluate_axis(axis: dict, template: str, summaries: str) -> dict | None:
     output_dir = tempfile.mkdtemp(prefix="systems-evaluator-")
     try:
         prompt = template.format(
@@ -72,36 +122,37 @@ def _evaluate_axis(
         )
 
         print(f"  [eval] {axis['name']} (budget={BUDGET_PER_AXIS})...")
+        return _run_evaluator(prompt, output_dir, axis["name"])
+    except Exception as e:
+        print(f"  [eval] {axis['name']} error: {e}")
+        return None
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
 
-        fd, prompt_file = tempfile.mkstemp(prefix="systems-eval-", suffix=".txt")
-        os.write(fd, prompt.encode())
-        os.close(fd)
 
-        env = clean_env()
-        result = subprocess.run(
-            ["sh", "-c", f'cat "{prompt_file}" | claude -p --model claude-sonnet-4-6'],
-            capture_output=True, text=True, timeout=300, env=env,
+def _evaluate_batch(summaries: str) -> list[dict | None]:
+    """Score every axis in one session. Returns rewards per axis, in EVAL_AXES order."""
+    output_dir = tempfile.mkdtemp(prefix="systems-evaluator-")
+    try:
+        axes = "\n".join(f"- {axis['name']}: {axis['description']}" for axis in EVAL_AXES)
+        prompt = _load_template("evaluator_batch_prompt.md").format(
+            axes=axes,
+            budget=BUDGET_PER_AXIS,
+            agent_summaries=summaries,
+            output_dir=output_dir,
         )
-        os.unlink(prompt_file)
-
-        if result.returncode != 0:
-            print(f"  [eval] {axis['name']} failed: {result.stderr[:200]}")
-            return []
 
-        rewards_path = os.path.join(output_dir, "rewards.json")
-        if not os.path.exists(rewards_path):
-            print(f"  [eval] {axis['name']}: no rewards.json")
-            return []
-
-        with open(rewards_path) as f:
-            rewards = json.load(f)
-
-        return _apply_rewards(world, rewards, BUDGET_PER_AXIS, axis["name"])
+        print(f"  [eval] all axes in one call (budget={BUDGET_PER_AXIS} each)...")
+        rewards = _run_evaluator(prompt, output_dir, "batch") or {}
+        per_axis = []
+        for axis in EVAL_AXES:
+            axis_rewards = rewards.get(axis["name"])
+            per_axis.append(axis_rewards if isinstance(axis_rewards, dict) else None)
+        return per_axis
     except Exception as e:
-        print(f"  [eval] {axis['name']} error: {e}")
-        return []
+        print(f"  [eval] batch error: {e}")
+        return [None] * len(EVAL_AXES)
     finally:
-        import shutil
         shutil.rmtree(output_dir, ignore_errors=True)
 
 
@@ -159,6 +210,7 @@ def _load_round_actions(logs_dir: str, round_num: int) -> dict[str, list[str]]:
 
 def _apply_rewards(
     world: WorldState, rewards: dict, budget: float, axis_name: str,
+    scored_round: int | None = None,
 ) -> list[WorldEvent]:
     alive_ids = {a.id for a in world.agents if a.alive}
     total = 0.0
@@ -178,11 +230,14 @@ def _apply_rewards(
         agent.energy += amount
         total += amount
 
+        details = {"amount": amount, "source": "evaluator", "axis": axis_name}
+        if scored_round is not None and scored_round != world.round:
+            details["eval_round"] = scored_round
         events.append(WorldEvent(
             round=world.round,
             type="energy_reward",
             agent_id=agent_id,
-            details={"amount": amount, "source": "evaluator", "axis": axis_name},
+            details=details,
         ))
         print(f"  [eval]   {agent.name}: +{amount:.1f}")
 
@@ -1,19 +1,145 @@
-"""Service event log — shared, per-round event bus."""
+"""Service event log — shared, per-round event bus.
+
+The current round's `emit` events live in memory. Each one is appended to
+data/events/round-<N>.jsonl as it happens, so a turn-by-turn run can pick
+the round back up in a new process. Only the current round's segment is
+kept; starting a round deletes the older ones. The agent-facing managed/ and public/
+events.json snapshots are written once per turn, only if something was
+emitted. Each service may emit up to MAX_EVENTS_PER_SERVICE events per round.
+
+take_pending() hands out the events emitted since it was last called, for
+on_event hooks (see execution.dispatch_events). It appends a
+{"delivered": N} marker to the segment, so a new process resumes with the
+events no dispatch has taken yet still pending.
+"""
 from __future__ import annotations
 
 import json
 import os
-import shutil
+import threading
+from collections import Counter
+
+from .services import write_json_atomic
 
 EVENTS_FILE = "events.json"
-MAX_EVENTS_PER_ROUND = 200
+EVENTS_DIR = "events"
+MAX_EVENTS_PER_SERVICE = 50
 
 
 def _events_path(data_dir: str) -> str:
     return os.path.join(data_dir, "managed", EVENTS_FILE)
 
 
+def _segment_path(data_dir: str, round_num: int) -> str:
+    return os.path.join(data_dir, EVENTS_DIR, f"round-{round_num}.jsonl")
+
+
+class EventBus:
+    """This round's emitted events for one data dir."""
+
+    def __init__(self, data_dir: str) -> None:
+        self.data_dir = data_dir
+        self.round: int | None = None
+        self.events: list[dict] = []
+        self._per_service: Counter[str] = Counter()
+        self._delivered = 0
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _load_round(self, round_num: int) -> None:
+        self.round = round_num
+        self.events = []
+        self._per_service.clear()
+        self._delivered = 0
+        path = _segment_path(self.data_dir, round_num)
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line after a crash
+                    if "delivered" in record:
+                        self._delivered = record["delivered"]
+                        continue
+                    self.events.append(record)
+                    self._per_service[record["service"].lower()] += 1
+
+    def _write_segment(self, record: dict) -> None:
+        path = _segment_path(self.data_dir, self.round)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def start_round(self, round_num: int) -> None:
+        with self._lock:
+            # Older rounds are never read again; a segment for this round
+            # is left over from an interrupted start.
+            events_dir = os.path.join(self.data_dir, EVENTS_DIR)
+            if os.path.isdir(events_dir):
+                for name in os.listdir(events_dir):
+                    if name.startswith("round-") and name.endswith(".jsonl"):
+                        os.remove(os.path.join(events_dir, name))
+            self.round = round_num
+            self.events = []
+            self._per_service.clear()
+            self._delivered = 0
+            self._dirty = True
+            self.publish()
+
+    def append(self, service_name: str, event_name: str, event_data: dict, round_num: int) -> bool:
+        """Record one event. False if the service has used up its quota."""
+        with self._lock:
+            if self.round != round_num:
+                self._load_round(round_num)
+            key = service_name.lower()
+            if self._per_service[key] >= MAX_EVENTS_PER_SERVICE:
+                return False
+            event = {"round": round_num, "service": service_name, "event": event_name, "data": event_data}
+            self._write_segment(event)
+            self.events.append(event)
+            self._per_service[key] += 1
+            self._dirty = True
+            return True
+
+    def take_pending(self, round_num: int) -> list[dict]:
+        with self._lock:
+            if self.round != round_num:
+                self._load_round(round_num)
+            pending = self.events[self._delivered:]
+            if pending:
+                self._delivered = len(self.events)
+                self._write_segment({"delivered": self._delivered})
+            return pending
+
+    def publish(self) -> None:
+        """Write the events.json snapshots if anything changed since last time."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            for dest_dir in ("managed", "public"):
+                try:
+                    write_json_atomic(os.path.join(self.data_dir, dest_dir, EVENTS_FILE), self.events)
+                except OSError:
+                    pass
+
+
+_buses: dict[str, EventBus] = {}
+_buses_lock = threading.Lock()
+
+
+def get_bus(data_dir: str) -> EventBus:
+    key = os.path.abspath(data_dir)
+    with _buses_lock:
+        bus = _buses.get(key)
+        if bus is None:
+            bus = _buses[key] = EventBus(data_dir)
+        return bus
+
+
 def load_events(data_dir: str) -> list[dict]:
+    """The agent-facing snapshot (as of the last publish)."""
     path = _events_path(data_dir)
     if not os.path.exists(path):
         return []
@@ -21,35 +147,25 @@ def load_events(data_dir: str) -> list[dict]:
         return json.load(f)
 
 
-def save_events(events: list[dict], data_dir: str) -> None:
-    path = _events_path(data_dir)
-    with open(path, "w") as f:
-        json.dump(events, f, indent=2)
-    public_copy = os.path.join(data_dir, "public", EVENTS_FILE)
-    try:
-        shutil.copy2(path, public_copy)
-    except OSError:
-        pass
-
-
 def append_event(
     data_dir: str,
     service_name: str,
     event_name: str,
     event_data: dict,
     round_num: int,
-) -> None:
-    events = load_events(data_dir)
-    if len(events) >= MAX_EVENTS_PER_ROUND:
-        return
-    events.append({
-        "round": round_num,
-        "service": service_name,
-        "event": event_name,
-        "data": event_data,
-    })
-    save_events(events, data_dir)
-
-
-def clear_events(data_dir: str) -> None:
-    save_events([], data_dir)
+) -> bool:
+    return get_bus(data_dir).append(service_name, event_name, event_data, round_num)
+
+
+def take_pending_events(data_dir: str, round_num: int) -> list[dict]:
+    return get_bus(data_dir).take_pending(round_num)
+
+
+def publish_events(data_dir: str) -> None:
+    """Turn boundary: refresh managed/ and public/ events.json."""
+    get_bus(data_dir).publish()
+
+
+def clear_events(data_dir: str, round_num: int = 0) -> None:
+    """Start a new round's event log (and publish the empty snapshot)."""
+    get_bus(data_dir).start_round(round_num)
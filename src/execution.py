@@ -2,6 +2,9 @@
 
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from functools import partial
 
 from .types import (
     Agent, PublishServiceRequest, SubscribeRequest, UnsubscribeRequest,
@@ -10,21 +13,97 @@ from .types import (
     WorldEvent, WorldState,
 )
 from .services import (
-    Service, find_service, load_entity, save_entity, delete_entity,
-    load_all_entities, count_agent_services,
-    install_script, get_script_path,
+    Service, find_service, load_entity, save_entity, delete_entity, entity_version,
+    load_all_entities, count_agent_services, event_subscribers, hooked_services,
+    install_script, get_script_path, mark_state_changed, state_log_path, state_path,
     subscribe, unsubscribe,
     MIN_SERVICE_PRICE, MAX_SERVICES_PER_AGENT,
 )
-from .sandbox import run_service_script, parse_service_output
+from .sandbox import (
+    ScriptResult, run_service_script, parse_batch_output, parse_service_output, clamp_limits,
+)
 
-VALID_HOOKS = {"on_round_end", "on_agent_death", "on_transfer"}
-from .events import append_event
-from .physics import transfer_energy
+VALID_HOOKS = {"on_round_end", "on_agent_death", "on_transfer", "on_event"}
+MAX_EVENT_TOPICS = 10
+HOOK_WORKERS = 4
+# Energy debited from a service's pool per CPU second its script uses (0 = off).
+COMPUTE_COST_PER_CPU_SECOND = 0.0
+VIEW_WORKERS = 8
+MAX_BATCH_QUEUE = 100
+from .events import append_event, take_pending_events
+from .stateblob import blob_path, clamp_blob_mb, create_blob, discard, restore, snapshot
+from .statepatch import StatePatch, apply_state
+from .viewcache import view_cache
+from .physics import take_transfers, transfer_energy
 from .grid.service import grid_handler
 from .eval_service import evaluator_handler
 
 
+def _charge_compute(entity: Service, script: ScriptResult) -> dict:
+    """Usage details for one script run; debits the compute surcharge, if any,
+    from the service's pool (never below zero)."""
+    details = script.usage
+    cost = min(round(script.cpu_seconds * COMPUTE_COST_PER_CPU_SECOND, 4), entity.energy)
+    if cost > 0:
+        entity.energy -= cost
+        details["compute_cost"] = cost
+    return details
+
+
+def _state_kwargs(entity: Service, data_dir: str) -> dict:
+    """How a script receives its state: inline, or as a file path for
+    state_file services."""
+    kwargs = {"state": entity.state}
+    if entity.state_file:
+        kwargs = {"state": {}, "state_path": state_path(entity, data_dir)}
+        log = state_log_path(entity, data_dir)
+        if log:
+            kwargs["state_log"] = log
+    if entity.state_blob_mb:
+        service_dir = os.path.dirname(get_script_path(data_dir, entity))
+        kwargs["state_blob"] = {
+            "path": blob_path(service_dir), "max_bytes": entity.state_blob_mb * 1024 * 1024,
+        }
+    return kwargs
+
+
+def _run_script(
+    entity: Service, data_dir: str,
+    caller_id: str, caller_name: str, input_text: str, round_num: int, **kwargs,
+) -> ScriptResult:
+    """run_service_script for entity, with its state, limits and worker mode.
+
+    Unless this is a view, the entity's state blob is snapshotted first and
+    rolled back if the call fails or leaves it over its size limit.
+    """
+    script_path = get_script_path(data_dir, entity)
+    run = partial(
+        run_service_script, script_path, caller_id, caller_name, input_text, round_num,
+        pool_energy=entity.energy, persistent=entity.persistent, limits=entity.limits,
+        **_state_kwargs(entity, data_dir), **kwargs,
+    )
+    if not entity.state_blob_mb or kwargs.get("trigger") == "view":
+        return run()
+    path = blob_path(os.path.dirname(script_path))
+    snap = snapshot(path)
+    script = run()
+    max_bytes = entity.state_blob_mb * 1024 * 1024
+    if script.success and os.path.exists(path) and os.path.getsize(path) > max_bytes:
+        script = replace(script, output=f"ERROR: state blob exceeds {entity.state_blob_mb}MB", success=False)
+    if script.success:
+        discard(snap)
+    else:
+        restore(path, snap)
+    return script
+
+
+def _update_state(entity: Service, update: dict | None, data_dir: str) -> None:
+    """Apply a script's new state or state_patch to the entity."""
+    entity.state, changed = apply_state(entity.state, update)
+    if changed:
+        mark_state_changed(entity, data_dir, update if isinstance(update, StatePatch) else None)
+
+
 def _find_agent(world, caller_id, target_name):
     """Look up an alive agent by name or id, excluding the caller."""
     target = target_name.lower()
@@ -66,7 +145,7 @@ def transfer_handler(caller_id, caller_name, input_text, round_num, entity, data
     receiver = _find_agent(world, caller_id, to)
     if receiver is None:
         return "Recipient not found.", [], None
-    actual = transfer_energy(caller, receiver, amount)
+    actual = transfer_energy(caller, receiver, amount, kind="transfer")
     if actual <= 0:
         return "Insufficient energy.", [], None
     return f"Transferred {actual:.2f} to {receiver.name}.", [], None
@@ -110,23 +189,87 @@ def process_publish_service(
         subscription_fee=getattr(request, "subscription_fee", 0.0),
         hooks=[h for h in getattr(request, "hooks", []) if h in VALID_HOOKS],
         upgradeable=getattr(request, "upgradeable", True),
+        persistent=getattr(request, "persistent", False),
+        state_file=getattr(request, "state_file", False),
+        state_blob_mb=clamp_blob_mb(getattr(request, "state_blob_mb", 0)),
+        batch=getattr(request, "batch", False),
+        event_topics=[str(t)[:100] for t in getattr(request, "event_topics", [])][:MAX_EVENT_TOPICS],
+        limits=clamp_limits(getattr(request, "limits", {})),
     )
+    if entity.state_blob_mb:
+        create_blob(os.path.dirname(installed))
     save_entity(entity, data_dir)
 
     return [WorldEvent(
         round=world.round,
         type="publish_service",
         agent_id=agent.id,
-        details={"service": request.name, "price": request.price, "script": request.script, "upgradeable": entity.upgradeable},
+        details={
+            "service": request.name, "price": request.price, "script": request.script,
+            "upgradeable": entity.upgradeable, "persistent": entity.persistent,
+            "state_file": entity.state_file, "state_blob_mb": entity.state_blob_mb,
+            "batch": entity.batch,
+        },
     )]
 
 
+def prefetch_views(
+    batch: list[tuple[Agent, UseServiceRequest]],
+    world: WorldState,
+    data_dir: str,
+) -> dict[int, ScriptResult]:
+    """Run the view requests in batch side by side, keyed by id(request).
+
+    Views cannot change anything, so they all run against the service state
+    as it is now, on up to VIEW_WORKERS threads. Each result comes with the
+    entity_version it ran against. Pass it to process_use_service as
+    `prefetched`; it still writes the result files and events in request
+    order, and runs the view again if an earlier command saved the service
+    (or replaced it) in the meantime.
+    """
+    jobs, versions = {}, {}
+    for agent, request in batch:
+        if not request.view or request.name in NATIVE_HANDLERS:
+            continue
+        entity = find_service(request.name, data_dir)
+        if entity is None:
+            continue
+        jobs[id(request)] = partial(run_view, agent, request, entity, world, data_dir)
+        versions[id(request)] = entity_version(entity.name, data_dir)
+    if not jobs:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(VIEW_WORKERS, len(jobs)), thread_name_prefix="view") as pool:
+        futures = {key: pool.submit(job) for key, job in jobs.items()}
+        return {key: (versions[key], future.result()) for key, future in futures.items()}
+
+
+def run_view(
+    agent: Agent, request: UseServiceRequest, entity: Service, world: WorldState, data_dir: str,
+) -> ScriptResult:
+    """Run a view call, or answer it from view_cache when the script, state
+    and request are unchanged (cpu_seconds is then 0)."""
+    key = None
+    if not entity.persistent and not entity.state_blob_mb:
+        script_path = get_script_path(data_dir, entity)
+        key = view_cache.key(script_path, entity.state, agent.id, entity.energy, request.input, world.round)
+        output = view_cache.get(key) if key else None
+        if output is not None:
+            return ScriptResult(output, True)
+    script = _run_script(
+        entity, data_dir, agent.id, agent.name, request.input, world.round, price=0.0, trigger="view",
+    )
+    if key and script.success and not script.truncated:
+        view_cache.put(key, script.output)
+    return script
+
+
 def process_use_service(
     agent: Agent,
     request: UseServiceRequest,
     world: WorldState,
     data_dir: str,
     private_dir: str,
+    prefetched: tuple[int, ScriptResult] | None = None,
 ) -> list[WorldEvent]:
 
     entity = find_service(request.name, data_dir)
@@ -135,6 +278,8 @@ def process_use_service(
 
     handler = NATIVE_HANDLERS.get(request.name)
     provider = None
+    truncated = False
+    usage: dict = {}
 
     if handler:
         # Native handler path
@@ -150,53 +295,58 @@ def process_use_service(
     else:
         # User-published script path
         if request.view:
-            script_path = get_script_path(data_dir, entity)
-            output_raw, success = run_service_script(
-                script_path, agent.id, agent.name, request.input, world.round,
-                pool_energy=entity.energy, price=0.0,
-                state=entity.state, trigger="view",
-            )
-            if not success:
+            if prefetched and prefetched[0] == entity_version(entity.name, data_dir):
+                script = prefetched[1]
+            else:
+                script = run_view(agent, request, entity, world, data_dir)
+            usage = _charge_compute(entity, script)
+            if "compute_cost" in usage:
+                save_entity(entity, data_dir)
+            if not script.success:
                 return [WorldEvent(
                     round=world.round, type="use_service", agent_id=agent.id,
-                    details={"service": request.name, "success": False, "view": True, "error": output_raw[:200]},
+                    details={"service": request.name, "success": False, "view": True,
+                             "error": script.output[:200], **usage},
                 )]
-            display_text, _, _ = parse_service_output(output_raw)
-            results_dir = os.path.join(private_dir, agent.id, "service_results")
-            os.makedirs(results_dir, exist_ok=True)
-            with open(os.path.join(results_dir, f"{entity.name}.txt"), "w") as f:
-                f.write(display_text)
+            display_text, _, _ = parse_service_output(script.output)
+            _write_result(private_dir, agent.id, entity.name, display_text)
+            view_details = {"service": request.name, "success": True, "view": True, "price": 0.0, **usage}
+            if script.truncated:
+                view_details["truncated"] = True
             return [WorldEvent(
                 round=world.round, type="use_service", agent_id=agent.id,
-                details={"service": request.name, "success": True, "view": True, "price": 0.0},
+                details=view_details,
             )]
 
         if agent.energy < entity.price:
             return []
 
+        if entity.batch:
+            return _queue_batch_call(agent, request, entity, world, data_dir)
+
         transfer_energy(agent, entity, entity.price)
 
-        script_path = get_script_path(data_dir, entity)
-        output_raw, success = run_service_script(
-            script_path, agent.id, agent.name, request.input, world.round,
-            pool_energy=entity.energy, price=entity.price,
-            state=entity.state, trigger="call",
+        script = _run_script(
+            entity, data_dir, agent.id, agent.name, request.input, world.round,
+            price=entity.price, trigger="call",
         )
 
-        if not success:
+        if not script.success:
             transfer_energy(entity, agent, entity.price)
+            usage = _charge_compute(entity, script)
             save_entity(entity, data_dir)
             return [WorldEvent(
                 round=world.round, type="use_service", agent_id=agent.id,
-                details={"service": request.name, "success": False, "error": output_raw[:200]},
+                details={"service": request.name, "success": False, "error": script.output[:200], **usage},
             )]
 
-        output, effects, new_state = parse_service_output(output_raw)
+        output, effects, new_state = parse_service_output(script.output)
+        truncated = script.truncated
+        usage = _charge_compute(entity, script)
         provider = next((a for a in world.agents if a.id == entity.provider_id and a.alive), None)
 
     # Common path
-    if new_state is not None:
-        entity.state = new_state
+    _update_state(entity, new_state, data_dir)
 
     details = {
         "service": request.name,
@@ -204,7 +354,10 @@ def process_use_service(
         "price": entity.price,
         "input": request.input[:200],
         "success": True,
+        **usage,
     }
+    if truncated:
+        details["truncated"] = True
 
     all_events = [WorldEvent(
         round=world.round, type="use_service", agent_id=agent.id,
@@ -222,15 +375,210 @@ def process_use_service(
     entity.call_count += 1
     save_entity(entity, data_dir)
 
-    results_dir = os.path.join(private_dir, agent.id, "service_results")
-    os.makedirs(results_dir, exist_ok=True)
-    with open(os.path.join(results_dir, f"{entity.name}.txt"), "w") as f:
-        f.write(output)
+    _write_result(private_dir, agent.id, entity.name, output)
 
     return all_events
 
 
+def _write_result(private_dir: str, agent_id: str, service_name: str, text: str) -> None:
+    results_dir = os.path.join(private_dir, agent_id, "service_results")
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, f"{service_name}.txt"), "w") as f:
+        f.write(text)
+
+
+# ---------------------------------------------------------------------------
+# Batched services
+# ---------------------------------------------------------------------------
+
+def _queue_batch_call(
+    agent: Agent, request: UseServiceRequest, entity: Service, world: WorldState, data_dir: str,
+) -> list[WorldEvent]:
+    """Escrow the price in the service's pool and queue the call for settle_batches."""
+    if len(entity.batch_queue) >= MAX_BATCH_QUEUE:
+        return []
+    transfer_energy(agent, entity, entity.price)
+    entity.batch_queue.append({
+        "caller_id": agent.id, "caller_name": agent.name,
+        "input": request.input, "price": entity.price,
+    })
+    save_entity(entity, data_dir)
+    return [WorldEvent(
+        round=world.round, type="use_service", agent_id=agent.id,
+        details={"service": request.name, "price": entity.price, "queued": True},
+    )]
+
+
+def settle_batches(world: WorldState, data_dir: str, private_dir: str) -> list[WorldEvent]:
+    """Run each batch service once over the calls queued this round.
+
+    The script gets trigger "batch" and context.requests, and answers with
+    one output per request. Each caller is then settled like a regular
+    call: effects or provider payment on success, a refund of the escrowed
+    price if the run failed or returned nothing for them.
+    """
+    events: list[WorldEvent] = []
+    for entity in load_all_entities(data_dir):
+        if not entity.batch_queue:
+            continue
+        queue, entity.batch_queue = entity.batch_queue, []
+        script = _run_script(
+            entity, data_dir, "system", "Engine", "", world.round,
+            price=entity.price, trigger="batch", context={"requests": queue},
+        )
+        usage = _charge_compute(entity, script)
+        results, new_state = parse_batch_output(script.output) if script.success else (None, None)
+        error = script.output[:200] if not script.success else "invalid batch output"
+        if results is not None:
+            _update_state(entity, new_state, data_dir)
+        events.append(WorldEvent(
+            round=world.round, type="service_effect", agent_id=entity.provider_id,
+            details={"service": entity.name, "effect": "batch", "calls": len(queue),
+                     "success": results is not None, **usage},
+        ))
+        provider = next((a for a in world.agents if a.id == entity.provider_id and a.alive), None)
+
+        for i, call in enumerate(queue):
+            caller = next((a for a in world.agents if a.id == call["caller_id"]), None)
+            result = results[i] if results is not None and i < len(results) else None
+            if result is None:
+                if caller is not None:
+                    transfer_energy(entity, caller, call["price"])
+                events.append(WorldEvent(
+                    round=world.round, type="use_service", agent_id=call["caller_id"],
+                    details={"service": entity.name, "success": False, "batch": True,
+                             "error": error if results is None else "no output for this call"},
+                ))
+                continue
+            output, effects = result
+            events.append(WorldEvent(
+                round=world.round, type="use_service", agent_id=call["caller_id"],
+                details={
+                    "service": entity.name, "provider": entity.provider_id, "price": call["price"],
+                    "input": call["input"][:200], "success": True, "batch": True,
+                },
+            ))
+            if effects and caller is not None:
+                events.extend(execute_effects(effects, caller, entity, world, data_dir, private_dir))
+            elif provider:
+                transfer_energy(entity, provider, call["price"])
+            entity.call_count += 1
+            if caller is not None:
+                _write_result(private_dir, caller.id, entity.name, output)
+
+        save_entity(entity, data_dir)
+    return events
+
+
 MAX_CALL_DEPTH = 3
+FANOUT_WORKERS = 4
+
+
+def _group_calls(effects: list) -> list:
+    """Gather runs of consecutive call_service effects into lists.
+
+    Each list is a fan-out group whose calls run concurrently. A second call
+    to the same service starts a new group, so one service never runs
+    twice at once. Other effects pass through unchanged.
+    """
+    grouped: list = []
+    names: set[str] = set()
+    for eff in effects:
+        if isinstance(eff, dict) and eff.get("type") == "call_service":
+            name = str(eff.get("name", "")).lower()
+            if grouped and isinstance(grouped[-1], list) and name not in names:
+                grouped[-1].append(eff)
+            else:
+                grouped.append([eff])
+                names = set()
+            names.add(name)
+        else:
+            grouped.append(eff)
+    return grouped
+
+
+def _call_services(
+    calls: list[dict],
+    caller: Agent,
+    entity: Service,
+    world: WorldState,
+    data_dir: str,
+    private_dir: str,
+    from_hook: bool,
+    call_depth: int,
+) -> list[WorldEvent]:
+    """Run a fan-out group of call_service effects.
+
+    Prices are reserved from the entity's pool in declaration order, then
+    the target scripts run side by side. Results are merged into
+    state["_call_results"] and sub-effects applied in declaration order,
+    after every branch has finished. If an earlier branch's sub-effects
+    saved a later branch's target (a nested call_service into it), that
+    branch's result is stale and its script runs again there, as in a
+    serial run. Persistent and state_blob targets keep state the engine
+    cannot roll back, so their scripts only ever run in order.
+    """
+    if call_depth >= MAX_CALL_DEPTH:
+        return []
+    branches = []
+    for eff in calls:
+        target_name = str(eff.get("name", ""))
+        call_input = str(eff.get("input", ""))
+        if not target_name or target_name == entity.name:
+            continue
+        target_entity = find_service(target_name, data_dir)
+        if target_entity is None or target_entity.protocol:
+            continue
+        call_cost = target_entity.price
+        if call_cost > entity.energy:
+            continue
+        transfer_energy(entity, target_entity, call_cost)
+        branches.append((target_name, target_entity, partial(
+            _run_script, target_entity, data_dir, f"service:{entity.name}", entity.name,
+            call_input, world.round, price=target_entity.price, trigger="service_call",
+        )))
+    if not branches:
+        return []
+    versions = [entity_version(target_entity.name, data_dir) for _, target_entity, _ in branches]
+    ahead = [i for i, (_, target_entity, _) in enumerate(branches)
+             if not (target_entity.persistent or target_entity.state_blob_mb)]
+    scripts: dict[int, ScriptResult] = {}
+    if len(ahead) > 1:
+        with ThreadPoolExecutor(max_workers=min(FANOUT_WORKERS, len(ahead)), thread_name_prefix="fanout") as pool:
+            scripts = dict(zip(ahead, pool.map(lambda i: branches[i][2](), ahead)))
+
+    events: list[WorldEvent] = []
+    for i, (target_name, target_entity, run) in enumerate(branches):
+        script = scripts.get(i)
+        if script is None or entity_version(target_entity.name, data_dir) != versions[i]:
+            script = run()
+        call_details = {
+            "service": target_entity.name, "effect": "call_service",
+            "caller_service": entity.name, "success": script.success,
+            "depth": call_depth + 1, **_charge_compute(target_entity, script),
+        }
+        if script.truncated:
+            call_details["truncated"] = True
+        events.append(WorldEvent(
+            round=world.round, type="service_effect",
+            agent_id=target_entity.provider_id, details=call_details,
+        ))
+        if script.success:
+            display, sub_effects, new_target_state = parse_service_output(script.output)
+            _update_state(target_entity, new_target_state, data_dir)
+            call_results = entity.state.get("_call_results", {})
+            call_results[target_name] = display[:2000]
+            entity.state["_call_results"] = call_results
+            mark_state_changed(entity, data_dir, {"_call_results": {target_name: call_results[target_name]}})
+            if sub_effects:
+                events.extend(execute_effects(
+                    sub_effects, caller, target_entity, world,
+                    data_dir, private_dir, from_hook=from_hook,
+                    call_depth=call_depth + 1,
+                ))
+            target_entity.call_count += 1
+        save_entity(target_entity, data_dir)
+    return events
 
 
 def execute_effects(
@@ -246,14 +594,19 @@ def execute_effects(
     """Execute effects from a service script, spending from the entity energy."""
     events: list[WorldEvent] = []
 
-    for eff in effects:
+    for eff in _group_calls(effects):
+        if isinstance(eff, list):
+            events.extend(_call_services(
+                eff, caller, entity, world, data_dir, private_dir, from_hook, call_depth,
+            ))
+            continue
         if not isinstance(eff, dict):
             continue
         etype = eff.get("type", "")
 
         if etype == "transfer_to_caller" and not from_hook:
             requested = float(eff.get("amount", 0))
-            actual = transfer_energy(entity, caller, requested)
+            actual = transfer_energy(entity, caller, requested, kind="transfer_to_caller")
             if actual <= 0:
                 continue
             events.append(WorldEvent(
@@ -271,7 +624,7 @@ def execute_effects(
             if target is None:
                 continue
             requested = float(eff.get("amount", 0))
-            actual = transfer_energy(entity, target, requested)
+            actual = transfer_energy(entity, target, requested, kind="transfer_to")
             if actual <= 0:
                 continue
             events.append(WorldEvent(
@@ -306,57 +659,12 @@ def execute_effects(
             safe_data = {}
             for k, v in list(event_data.items())[:20]:
                 safe_data[str(k)[:50]] = v if isinstance(v, (int, float, bool)) else str(v)[:500]
-            if event_name:
-                append_event(data_dir, entity.name, event_name, safe_data, world.round)
+            if event_name and append_event(data_dir, entity.name, event_name, safe_data, world.round):
                 events.append(WorldEvent(
                     round=world.round, type="service_effect", agent_id="system",
                     details={"service": entity.name, "effect": "emit", "event": event_name},
                 ))
 
-        elif etype == "call_service":
-            if call_depth >= MAX_CALL_DEPTH:
-                continue
-            target_name = str(eff.get("name", ""))
-            call_input = str(eff.get("input", ""))
-            if not target_name or target_name == entity.name:
-                continue
-            target_entity = find_service(target_name, data_dir)
-            if target_entity is None or target_entity.protocol:
-                continue
-            call_cost = target_entity.price
-            if call_cost > entity.energy:
-                continue
-            transfer_energy(entity, target_entity, call_cost)
-            # Run target service
-            target_script = get_script_path(data_dir, target_entity)
-            output_raw, success = run_service_script(
-                target_script, f"service:{entity.name}", entity.name,
-                call_input, world.round,
-                pool_energy=target_entity.energy, price=target_entity.price,
-                state=target_entity.state, trigger="service_call",
-            )
-            events.append(WorldEvent(
-                round=world.round, type="service_effect",
-                agent_id=target_entity.provider_id,
-                details={"service": target_entity.name, "effect": "call_service",
-                         "caller_service": entity.name, "success": success,
-                         "depth": call_depth + 1},
-            ))
-            if success:
-                display, sub_effects, new_target_state = parse_service_output(output_raw)
-                if new_target_state is not None:
-                    target_entity.state = new_target_state
-                call_results = entity.state.get("_call_results", {})
-                call_results[target_name] = display[:2000]
-                entity.state["_call_results"] = call_results
-                if sub_effects:
-                    events.extend(execute_effects(
-                        sub_effects, caller, target_entity, world,
-                        data_dir, private_dir, from_hook=from_hook,
-                        call_depth=call_depth + 1,
-                    ))
-                target_entity.call_count += 1
-            save_entity(target_entity, data_dir)
 
     return events
 
@@ -371,14 +679,27 @@ def process_unpublish_service(
     if entity is None or entity.provider_id != agent.id:
         return []
 
+    # Batch calls still queued get their escrowed price back.
+    events: list[WorldEvent] = []
+    for call in entity.batch_queue:
+        caller = next((a for a in world.agents if a.id == call["caller_id"]), None)
+        if caller is not None:
+            transfer_energy(entity, caller, call["price"])
+        events.append(WorldEvent(
+            round=world.round, type="use_service", agent_id=call["caller_id"],
+            details={"service": entity.name, "success": False, "batch": True,
+                     "error": "service unpublished"},
+        ))
+    entity.batch_queue = []
     delete_entity(data_dir, entity.name)
 
-    return [WorldEvent(
+    events.append(WorldEvent(
         round=world.round,
         type="unpublish_service",
         agent_id=agent.id,
         details={"service": request.name},
-    )]
+    ))
+    return events
 
 
 def process_update_service(
@@ -486,40 +807,122 @@ def run_hooks(
     if hook_name not in VALID_HOOKS:
         return []
 
-    entities = load_all_entities(data_dir)
+    jobs = [(entity, context) for entity in hooked_services(hook_name, data_dir) if not entity.protocol]
+    return _run_hook_batch(jobs, hook_name, world, data_dir, private_dir)
+
+
+def _run_hook_batch(
+    jobs: list[tuple[Service, dict]], hook_name: str,
+    world: WorldState, data_dir: str, private_dir: str,
+) -> list[WorldEvent]:
+    """Run one hook for several services, given in name order.
+
+    A hook script only sees its own state and pool, so the scripts run side
+    by side on up to HOOK_WORKERS threads. Results are then applied one
+    service at a time in the given order, as a serial run would. If applying
+    an earlier hook's effects saved a later service (a call_service into
+    it), that service's result is stale and its script runs again there.
+    Persistent and state_blob services keep state the engine cannot roll
+    back, so their scripts only ever run in order.
+    """
+    if not jobs:
+        return []
+    runs = [
+        partial(_run_script, entity, data_dir, "system", "Engine", "", world.round,
+                trigger=hook_name, context=context)
+        for entity, context in jobs
+    ]
+    versions = [entity_version(entity.name, data_dir) for entity, _ in jobs]
+    ahead = [i for i, (entity, _) in enumerate(jobs) if not (entity.persistent or entity.state_blob_mb)]
+    scripts: dict[int, ScriptResult] = {}
+    if len(ahead) > 1:
+        with ThreadPoolExecutor(max_workers=min(HOOK_WORKERS, len(ahead)), thread_name_prefix="hook") as pool:
+            scripts = dict(zip(ahead, pool.map(lambda i: runs[i](), ahead)))
+
     events: list[WorldEvent] = []
+    for i, (entity, _) in enumerate(jobs):
+        script = scripts.get(i)
+        if script is None or entity_version(entity.name, data_dir) != versions[i]:
+            script = runs[i]()
+        events.extend(_apply_hook(entity, hook_name, script, world, data_dir, private_dir))
+    return events
 
-    for entity in entities:
-        if hook_name not in entity.hooks:
-            continue
-        if entity.protocol:
-            continue
 
-        script_path = get_script_path(data_dir, entity)
-        output_raw, success = run_service_script(
-            script_path, "system", "Engine", "", world.round,
-            pool_energy=entity.energy,
-            state=entity.state, trigger=hook_name, context=context,
-        )
+def _apply_hook(
+    entity: Service, hook_name: str, script: ScriptResult,
+    world: WorldState, data_dir: str, private_dir: str,
+) -> list[WorldEvent]:
+    usage = _charge_compute(entity, script)
 
-        if not success:
-            events.append(WorldEvent(
-                round=world.round, type="service_effect",
-                agent_id=entity.provider_id,
-                details={"service": entity.name, "hook": hook_name, "error": output_raw[:200]},
-            ))
-            continue
+    if not script.success:
+        if "compute_cost" in usage:
+            save_entity(entity, data_dir)
+        return [WorldEvent(
+            round=world.round, type="service_effect",
+            agent_id=entity.provider_id,
+            details={"service": entity.name, "hook": hook_name, "error": script.output[:200], **usage},
+        )]
 
-        display_text, effects, new_state = parse_service_output(output_raw)
-        if new_state is not None:
-            entity.state = new_state
+    display_text, effects, new_state = parse_service_output(script.output)
+    _update_state(entity, new_state, data_dir)
 
-        if effects:
-            events.extend(execute_effects(
-                effects, None, entity, world, data_dir, private_dir,
-                from_hook=True, call_depth=0,
-            ))
+    events: list[WorldEvent] = []
+    if effects:
+        events.extend(execute_effects(
+            effects, None, entity, world, data_dir, private_dir,
+            from_hook=True, call_depth=0,
+        ))
+
+    save_entity(entity, data_dir)
+    return events
+
+
+def dispatch_transfers(world: WorldState, data_dir: str, private_dir: str) -> list[WorldEvent]:
+    """Run on_transfer hooks once over the transfers journaled since the last
+    dispatch (context {"transfers": [...]}), instead of once per transfer."""
+    transfers = take_transfers()
+    if not transfers:
+        return []
+    return run_hooks("on_transfer", {"round": world.round, "transfers": transfers}, world, data_dir, private_dir)
+
+
+MAX_DRAIN_PASSES = 10
 
-        save_entity(entity, data_dir)
 
+def drain_hooks(world: WorldState, data_dir: str, private_dir: str) -> list[WorldEvent]:
+    """Dispatch events and transfers until the hooks they run leave nothing new.
+
+    Run at the end of a round so that what the last hooks emitted or moved
+    is delivered before the round's event log is cleared. Each pass is one
+    hop of a pipeline; MAX_DRAIN_PASSES bounds one that keeps feeding itself.
+    """
+    events: list[WorldEvent] = []
+    for _ in range(MAX_DRAIN_PASSES):
+        hop = dispatch_events(world, data_dir, private_dir)
+        hop.extend(dispatch_transfers(world, data_dir, private_dir))
+        if not hop:
+            break
+        events.extend(hop)
     return events
+
+
+def dispatch_events(world: WorldState, data_dir: str, private_dir: str) -> list[WorldEvent]:
+    """Deliver events emitted since the last dispatch to on_event hooks.
+
+    Subscribers are found through the registry's topic index. Each one runs
+    once, with context {"events": [...]} holding every matching event in
+    emission order (its own emits excluded). Events the hooks emit in turn
+    wait for the next dispatch (see drain_hooks).
+    """
+    batches: dict[str, tuple[Service, list[dict]]] = {}
+    for event in take_pending_events(data_dir, world.round):
+        for entity in event_subscribers(event["event"], data_dir):
+            if entity.protocol or entity.name.lower() == event["service"].lower():
+                continue
+            batches.setdefault(entity.name.lower(), (entity, []))[1].append(event)
+
+    jobs = [
+        (entity, {"round": world.round, "events": matched})
+        for entity, matched in (batches[key] for key in sorted(batches))
+    ]
+    return _run_hook_batch(jobs, "on_event", world, data_dir, private_dir)
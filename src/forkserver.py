@@ -0,0 +1,395 @@
+"""Forkserver for Python service scripts.
+
+Most published services are `#!/usr/bin/env python3` scripts, and a fresh
+interpreter per call costs far more than the scripts themselves. Scripts
+whose shebang resolves to the engine's own interpreter (same binary, same
+venv) are forked from a server running that interpreter; any other shebang,
+including another python3 version or environment, is exec'd. The
+forkserver is one Python process, started on first use, with common stdlib
+modules already imported. For each call the engine passes it the script path
+and the child's stdin/stdout/stderr pipe ends over a Unix socket (SCM_RIGHTS).
+The server forks, and the child runs the script with runpy as `__main__`.
+The server reaps the child and replies with its exit code and rusage.
+
+Exec'd scripts go through the same server with "exec": the child sets its
+rlimits and then execs the script. The limits are in place before the
+script's first instruction, so nothing it forks can escape them.
+
+The stdin/stdout JSON contract is unchanged. The child runs in its own
+session, so on timeout the engine kills its whole process group just like a
+subprocess. This file only imports the stdlib: the server runs it by path.
+"""
+from __future__ import annotations
+
+import atexit
+import gc
+import json
+import os
+import resource
+import selectors
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PREIMPORTS = ("json", "re", "math", "random", "collections", "itertools", "functools", "datetime", "hashlib", "string")
+
+
+_shebang_cache: dict[str, tuple[int, bool]] = {}
+_engine: tuple[str, str] | None = None
+
+
+def _interpreter_identity(path: str) -> tuple[str, str]:
+    """(binary, venv root) of a python executable. A venv's python is a
+    symlink to its base binary, so the binary alone does not tell the
+    venv's site-packages from the base install's."""
+    path = os.path.abspath(path)
+    env = os.path.dirname(os.path.dirname(path))
+    if not os.path.exists(os.path.join(env, "pyvenv.cfg")):
+        env = ""
+    return os.path.realpath(path), env
+
+
+def _shebang_interpreter(first_line: bytes) -> str | None:
+    """The interpreter path a `#!` line runs, or None if it has none or
+    passes it arguments."""
+    if not first_line.startswith(b"#!"):
+        return None
+    argv = first_line[2:].decode(errors="replace").split()
+    if len(argv) == 2 and os.path.basename(argv[0]) == "env":
+        return shutil.which(argv[1])
+    if len(argv) == 1:
+        return argv[0]
+    return None
+
+
+def is_python_script(script_path: str) -> bool:
+    """True for scripts whose shebang resolves to the engine's interpreter,
+    so the forkserver (which runs sys.executable) can run them in-process."""
+    global _engine
+    try:
+        mtime = os.stat(script_path).st_mtime_ns
+    except OSError:
+        return False
+    cached = _shebang_cache.get(script_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(script_path, "rb") as f:
+            first = f.readline(256)
+    except OSError:
+        return False
+    interpreter = _shebang_interpreter(first.rstrip(b"\r\n"))
+    if _engine is None:
+        _engine = _interpreter_identity(sys.executable)
+    result = interpreter is not None and _interpreter_identity(interpreter) == _engine
+    _shebang_cache[script_path] = (mtime, result)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Client (engine side)
+# ---------------------------------------------------------------------------
+
+_server: subprocess.Popen | None = None
+_sock_path = ""
+_broken = False
+_server_lock = threading.Lock()
+
+
+def _ensure_server() -> str:
+    global _server, _sock_path, _broken
+    with _server_lock:
+        if _server is not None and _server.poll() is None:
+            return _sock_path
+        if _broken:
+            raise OSError("forkserver unavailable")
+        sock_path = os.path.join(tempfile.mkdtemp(prefix="systems-fork-"), "server.sock")
+        # -P: keep this file's directory (src/, with its own types.py) off sys.path.
+        _server = subprocess.Popen(
+            [sys.executable, "-P", os.path.abspath(__file__), sock_path, str(os.getpid())],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 10
+        while not os.path.exists(sock_path):
+            if _server.poll() is not None or time.monotonic() > deadline:
+                _server.kill()
+                _broken = True
+                raise OSError("forkserver failed to start")
+            time.sleep(0.005)
+        _sock_path = sock_path
+        return sock_path
+
+
+def shutdown_forkserver() -> None:
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.kill()
+            _server.wait()
+            _server = None
+
+
+atexit.register(shutdown_forkserver)
+
+
+class ForkedChild:
+    """A script forked by the server, with the parts of Popen the sandbox uses:
+    pid, unbuffered stdin/stdout/stderr pipes and wait()."""
+
+    def __init__(self, conn: socket.socket, pid: int, stdin, stdout, stderr) -> None:
+        self.pid = pid
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: int | None = None
+        self.cpu_seconds = 0.0
+        self.max_rss_kb = 0
+        self._conn = conn
+        self._buffer = b""
+
+    def _readline(self, deadline: float | None = None) -> bytes | None:
+        """Next reply line from the server, or None if `deadline` passes first."""
+        while b"\n" not in self._buffer:
+            timeout = None if deadline is None else max(0.001, deadline - time.monotonic())
+            self._conn.settimeout(timeout)
+            try:
+                chunk = self._conn.recv(4096)
+            except TimeoutError:
+                return None
+            if not chunk:
+                break
+            self._buffer += chunk
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        return line
+
+    def wait(self, deadline: float | None = None) -> int | None:
+        """Wait for the server to report the child's exit. Returns None if
+        `deadline` (a time.monotonic() value) passes first."""
+        if self.returncode is None:
+            try:
+                line = self._readline(deadline)
+            except OSError:
+                line = b""
+            if line is None:
+                return None
+            self._conn.close()
+            try:
+                status = json.loads(line or "{}")
+            except ValueError:
+                status = {}
+            self.returncode = status.get("returncode", -1)
+            self.cpu_seconds = status.get("cpu_seconds", 0.0)
+            self.max_rss_kb = status.get("max_rss_kb", 0)
+        return self.returncode
+
+
+def spawn_python(script_path: str, rlimits: list[tuple[int, int, int]] = ()) -> ForkedChild:
+    """Start a python3 service script in a forked child (its own session).
+
+    rlimits are (resource, soft, hard) triples set in the child before the
+    script runs.
+
+    Raises OSError if the forkserver is unavailable, so callers can fall back
+    to a plain subprocess.
+    """
+    return _spawn(script_path, rlimits, exec_script=False)
+
+
+def spawn_exec(script_path: str, rlimits: list[tuple[int, int, int]] = ()) -> ForkedChild:
+    """Like spawn_python, but the forked child execs the script (any shebang)."""
+    return _spawn(script_path, rlimits, exec_script=True)
+
+
+def _spawn(script_path: str, rlimits, exec_script: bool) -> ForkedChild:
+    sock_path = _ensure_server()
+    in_r, in_w = os.pipe()
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(sock_path)
+        request = json.dumps({
+            "script": os.path.abspath(script_path), "rlimits": list(rlimits), "exec": exec_script,
+        }).encode() + b"\n"
+        socket.send_fds(conn, [request], [in_r, out_w, err_w])
+    except OSError:
+        conn.close()
+        for fd in (in_w, out_r, err_r):
+            os.close(fd)
+        raise
+    finally:
+        # The server holds its own copies now (or never will).
+        for fd in (in_r, out_w, err_w):
+            os.close(fd)
+    child = ForkedChild(
+        conn, 0,
+        os.fdopen(in_w, "wb", buffering=0),
+        os.fdopen(out_r, "rb", buffering=0),
+        os.fdopen(err_r, "rb", buffering=0),
+    )
+    try:
+        child.pid = json.loads(child._readline() or "{}")["pid"]
+    except (OSError, ValueError, KeyError) as e:
+        for f in (child.stdin, child.stdout, child.stderr, conn):
+            f.close()
+        raise OSError(f"forkserver did not start the script: {e}") from None
+    return child
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+def _run_child(script_path: str, fds: list[int], rlimits: list[list[int]], exec_script: bool = False) -> None:
+    """In the forked child: apply rlimits and become the script. Never returns."""
+    code = 1
+    try:
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        os.setsid()
+        for res, soft, hard in rlimits:
+            resource.setrlimit(res, (soft, hard))
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", closefd=False)
+
+        if exec_script:
+            for sig in (signal.SIGPIPE, signal.SIGXFSZ):  # what Popen's restore_signals resets
+                signal.signal(sig, signal.SIG_DFL)
+            try:
+                os.execv(script_path, [script_path])
+            except OSError as e:
+                print(f"cannot exec script: {e}", file=sys.stderr)
+                code = 126
+                return
+
+        import random
+        import runpy
+        import traceback
+
+        random.seed()
+        sys.argv = [script_path]
+        sys.path.insert(0, os.path.dirname(script_path))
+        try:
+            runpy.run_path(script_path, run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+        except BaseException as e:
+            # Start at the script's own frames, as a standalone interpreter would.
+            tb = e.__traceback__
+            while tb is not None and tb.tb_frame.f_code.co_filename != script_path:
+                tb = tb.tb_next
+            traceback.print_exception(type(e), e, tb)
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+        os._exit(code)
+
+
+def serve(sock_path: str, parent_pid: int) -> None:
+    for name in PREIMPORTS + ("runpy", "pkgutil", "traceback"):
+        __import__(name)
+    # Keep the collector from touching (and so copying) inherited objects in children.
+    gc.freeze()
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(sock_path + ".tmp")
+    listener.listen(64)
+    os.rename(sock_path + ".tmp", sock_path)
+
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+
+    sel = selectors.DefaultSelector()
+    sel.register(listener, selectors.EVENT_READ)
+    sel.register(wake_r, selectors.EVENT_READ)
+    waiting: dict[int, socket.socket] = {}
+
+    while os.getppid() == parent_pid:
+        for key, _ in sel.select(timeout=1.0):
+            if key.fileobj is listener:
+                conn, _ = listener.accept()
+                try:
+                    msg, fds, _, _ = socket.recv_fds(conn, 65536, 3)
+                    request = json.loads(msg)
+                    script_path = request["script"]
+                    rlimits = request.get("rlimits", [])
+                    exec_script = bool(request.get("exec"))
+                except (OSError, ValueError, KeyError):
+                    conn.close()
+                    continue
+                if len(fds) != 3:
+                    for fd in fds:
+                        os.close(fd)
+                    conn.close()
+                    continue
+                pid = os.fork()
+                if pid == 0:
+                    listener.close()
+                    conn.close()
+                    for other in waiting.values():
+                        other.close()
+                    _run_child(script_path, fds, rlimits, exec_script)
+                for fd in fds:
+                    os.close(fd)
+                try:
+                    conn.sendall(json.dumps({"pid": pid}).encode() + b"\n")
+                except OSError:
+                    pass
+                waiting[pid] = conn
+            else:
+                try:
+                    while os.read(wake_r, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+
+        while waiting:
+            try:
+                pid, status, rusage = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            conn = waiting.pop(pid, None)
+            if conn is None:
+                continue
+            reply = {
+                "returncode": os.waitstatus_to_exitcode(status),
+                "cpu_seconds": rusage.ru_utime + rusage.ru_stime,
+                "max_rss_kb": rusage.ru_maxrss,
+            }
+            try:
+                conn.sendall(json.dumps(reply).encode() + b"\n")
+            except OSError:
+                pass
+            conn.close()
+
+    try:
+        os.unlink(sock_path)
+    except OSError:
+        pass
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], int(sys.argv[2]))
@@ -5,8 +5,15 @@ import os
 import random
 
 from .types import GridAgent, GridCell, GridWorld, Position, Resource
+from ..store import get_store
 
 WORLD_FILE = "grid_world.json"
+STORE_KEY = "grid"
+
+
+def _store(grid_dir: str):
+    # Grid state lives in data/grid/; the SQLite store is keyed by data/.
+    return get_store(os.path.dirname(os.path.abspath(grid_dir)))
 
 
 def create_grid_world(
@@ -60,17 +67,26 @@ def save_grid_world(world: GridWorld, data_dir: str) -> None:
         ],
         "grid": grid_data,
     }
+    store = _store(data_dir)
+    if store is not None:
+        store.put_doc(STORE_KEY, data)
+        return
     with open(path, "w") as f:
         json.dump(data, f, indent=2)
 
 
 def load_grid_world(data_dir: str) -> GridWorld | None:
-    path = os.path.join(data_dir, WORLD_FILE)
-    if not os.path.exists(path):
-        return None
-
-    with open(path) as f:
-        data = json.load(f)
+    store = _store(data_dir)
+    if store is not None:
+        data = store.get_doc(STORE_KEY)
+        if data is None:
+            return None
+    else:
+        path = os.path.join(data_dir, WORLD_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
 
     agents = [
         GridAgent(
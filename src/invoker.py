@@ -1,7 +1,8 @@
+import asyncio
 import json
 import os
-import subprocess
 import tempfile
+from typing import Callable
 
 from .types import (
     Agent, AgentCommands,
@@ -10,17 +11,21 @@ from .types import (
     DepositRequest, WithdrawRequest, WorldState,
 )
 from .prompt import build_full_prompt, COMMANDS_FILE
-from .config import default_model, MODEL_PRICING, DEFAULT_PRICING, clean_env
+from .config import default_model
+from .launcher import launch, launch_async, LaunchResult
+from .streams import ClaudeStream, CodexStream, MAX_TEXT_CHARS
 
 
 class InvokeResult:
-    __slots__ = ("commands", "raw_output", "stream_file", "cost_usd", "failed")
+    __slots__ = ("commands", "raw_output", "stream_file", "cost_usd", "input_tokens", "output_tokens", "failed")
 
-    def __init__(self, commands: AgentCommands | None = None, raw_output: str = "", stream_file: str = "", cost_usd: float = 0.0, failed: bool = False) -> None:
+    def __init__(self, commands: AgentCommands | None = None, raw_output: str = "", stream_file: str = "", cost_usd: float = 0.0, input_tokens: int = 0, output_tokens: int = 0, failed: bool = False) -> None:
         self.commands = commands or AgentCommands()
         self.raw_output = raw_output
         self.stream_file = stream_file
         self.cost_usd = cost_usd
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
         self.failed = failed
 
 
@@ -47,6 +52,81 @@ def invoke_agent(
     return _invoke_claude(prompt, agent, model, timeout, logs_dir, world.round, agent_abs)
 
 
+async def invoke_agent_async(
+    agent: Agent,
+    world: WorldState,
+    public_dir: str,
+    private_dir: str,
+    timeout: int,
+    dry_run: bool,
+    logs_dir: str = "logs",
+) -> InvokeResult:
+    """Asyncio counterpart of invoke_agent. Cancelling the task kills the CLI."""
+    if dry_run:
+        return _dry_run_response(agent, world)
+
+    agent_dir = os.path.join(private_dir, agent.id)
+    os.makedirs(agent_dir, exist_ok=True)
+    prompt = build_full_prompt(agent, world, public_dir, agent_dir)
+
+    agent_abs = os.path.abspath(agent_dir)
+    model = agent.model or default_model(agent.invoker)
+    if agent.invoker == "codex":
+        return await _invoke_codex_async(prompt, agent, model, timeout, logs_dir, world.round, agent_abs)
+    return await _invoke_claude_async(prompt, agent, model, timeout, logs_dir, world.round, agent_abs)
+
+
+async def invoke_agents_async(
+    agents: list[Agent],
+    world: WorldState,
+    public_dir: str,
+    private_dir: str,
+    timeout: int,
+    dry_run: bool,
+    logs_dir: str = "logs",
+    concurrency: int = 4,
+    deadline: float | None = None,
+    on_start: Callable[[Agent], None] | None = None,
+    on_done: Callable[[Agent, InvokeResult], None] | None = None,
+) -> dict[str, InvokeResult]:
+    """Run many agent sessions from one event loop.
+
+    At most `concurrency` sessions run at once. Sessions still running when
+    `deadline` seconds have passed are cancelled (their CLI is killed) and
+    reported as failed.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(agent: Agent) -> InvokeResult:
+        async with semaphore:
+            if on_start:
+                on_start(agent)
+            result = await invoke_agent_async(agent, world, public_dir, private_dir, timeout, dry_run, logs_dir)
+            if on_done:
+                on_done(agent, result)
+            return result
+
+    tasks = {agent.id: asyncio.create_task(run_one(agent)) for agent in agents}
+    if not tasks:
+        return {}
+    _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    results: dict[str, InvokeResult] = {}
+    for agent in agents:
+        task = tasks[agent.id]
+        if task.cancelled():
+            print(f"  [{agent.name}] cancelled (round deadline {deadline}s exceeded)")
+            results[agent.id] = InvokeResult(raw_output="ERROR: round deadline exceeded", failed=True)
+        elif task.exception() is not None:
+            results[agent.id] = _handle_error(task.exception(), agent)
+        else:
+            results[agent.id] = task.result()
+    return results
+
+
 MAX_USES_PER_TURN = 16
 MAX_PUBLISHES_PER_TURN = 2
 
@@ -118,6 +198,12 @@ def _parse_json_commands(raw: str) -> AgentCommands:
                     subscription_fee=float(entry.get("subscription_fee", 0.0)),
                     hooks=list(entry.get("hooks", [])),
                     upgradeable=bool(entry.get("upgradeable", True)),
+                    persistent=bool(entry.get("persistent", False)),
+                    limits=entry["limits"] if isinstance(entry.get("limits"), dict) else {},
+                    state_file=bool(entry.get("state_file", False)),
+                    state_blob_mb=int(entry.get("state_blob_mb", 0)),
+                    batch=bool(entry.get("batch", False)),
+                    event_topics=list(entry.get("event_topics", [])),
                 ))
             except (KeyError, ValueError):
                 pass
@@ -180,147 +266,103 @@ def _parse_json_commands(raw: str) -> AgentCommands:
     return cmds
 
 
-def _invoke_claude(prompt: str, agent: Agent, model: str, timeout: int, logs_dir: str, round_num: int, cwd: str = ".") -> InvokeResult:
-    fd, prompt_file = tempfile.mkstemp(prefix=f"systems-prompt-{agent.id}-", suffix=".txt")
+def _claude_argv(model: str) -> list[str]:
+    return ["claude", "-p", "--verbose", "--output-format", "stream-json", "--model", model, "--dangerously-skip-permissions"]
+
+
+def _codex_argv(model: str, output_file: str) -> list[str]:
+    return ["codex", "exec", "--json", "-m", model, "-o", output_file, "--sandbox", "danger-full-access"]
+
+
+def _stream_path(logs_dir: str, round_num: int, agent: Agent) -> str:
     stream_dir = os.path.join(logs_dir, "streams")
     os.makedirs(stream_dir, exist_ok=True)
-    stream_file = os.path.join(stream_dir, f"r{round_num}-{agent.id}.jsonl")
+    return os.path.join(stream_dir, f"r{round_num}-{agent.id}.jsonl")
+
+
+def _invoke_claude(prompt: str, agent: Agent, model: str, timeout: int, logs_dir: str, round_num: int, cwd: str = ".") -> InvokeResult:
+    stream_file = _stream_path(logs_dir, round_num, agent)
     _clear_command_files(cwd)
     try:
-        os.write(fd, prompt.encode())
-        os.close(fd)
-
-        env = clean_env()
-        result = subprocess.run(
-            ["sh", "-c", f'cat "{prompt_file}" | claude -p --verbose --output-format stream-json --model {model} --dangerously-skip-permissions'],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            env=env,
-            cwd=cwd,
-        )
-
-        # Save raw JSONL stream
-        with open(stream_file, "w") as f:
-            f.write(result.stdout)
-
-        if result.returncode != 0:
-            print(f"  [{agent.name}] claude exited with code {result.returncode}: {result.stderr[:200]}")
-            return InvokeResult(raw_output=result.stderr[:500], stream_file=stream_file, failed=True)
-
-        # Extract text and cost from stream
-        raw = _extract_text_from_claude_stream(result.stdout)
-        cost_usd = _extract_cost_from_claude_stream(result.stdout)
-        commands = _read_commands_file(cwd)
-
-        return InvokeResult(commands=commands, raw_output=raw, stream_file=stream_file, cost_usd=cost_usd)
+        with ClaudeStream(stream_file) as stream:
+            launched = launch(_claude_argv(model), prompt, timeout, cwd, stream.feed, label=f"agent:{agent.id}")
+        return _claude_result(stream, launched, agent, cwd)
+    except Exception as err:
+        return _handle_error(err, agent)
+
+
+def _invoke_codex(prompt: str, agent: Agent, model: str, timeout: int, logs_dir: str, round_num: int, cwd: str = ".") -> InvokeResult:
+    fd, output_file = tempfile.mkstemp(prefix=f"systems-output-{agent.id}-", suffix=".txt")
+    os.close(fd)
+    stream_file = _stream_path(logs_dir, round_num, agent)
+    _clear_command_files(cwd)
+    try:
+        with CodexStream(stream_file, model) as stream:
+            launched = launch(_codex_argv(model, output_file), prompt, timeout, cwd, stream.feed, label=f"agent:{agent.id}")
+        return _codex_result(stream, launched, output_file, agent, cwd)
     except Exception as err:
         return _handle_error(err, agent)
     finally:
         try:
-            os.unlink(prompt_file)
+            os.unlink(output_file)
         except OSError:
             pass
 
 
-def _invoke_codex(prompt: str, agent: Agent, model: str, timeout: int, logs_dir: str, round_num: int, cwd: str = ".") -> InvokeResult:
-    fd, prompt_file = tempfile.mkstemp(prefix=f"systems-prompt-{agent.id}-", suffix=".txt")
-    fd2, output_file = tempfile.mkstemp(prefix=f"systems-output-{agent.id}-", suffix=".txt")
-    os.close(fd2)
-    stream_dir = os.path.join(logs_dir, "streams")
-    os.makedirs(stream_dir, exist_ok=True)
-    stream_file = os.path.join(stream_dir, f"r{round_num}-{agent.id}.jsonl")
+async def _invoke_claude_async(prompt: str, agent: Agent, model: str, timeout: int, logs_dir: str, round_num: int, cwd: str = ".") -> InvokeResult:
+    stream_file = _stream_path(logs_dir, round_num, agent)
     _clear_command_files(cwd)
     try:
-        os.write(fd, prompt.encode())
-        os.close(fd)
-
-        env = clean_env()
-        result = subprocess.run(
-            ["sh", "-c", f'cat "{prompt_file}" | codex exec --json -m {model} -o "{output_file}" --sandbox danger-full-access'],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            env=env,
-            cwd=cwd,
-        )
-
-        # Save raw JSONL stream
-        with open(stream_file, "w") as f:
-            f.write(result.stdout)
-
-        if result.returncode != 0:
-            print(f"  [{agent.name}] codex exited with code {result.returncode}: {result.stderr[:200]}")
-            return InvokeResult(raw_output=result.stderr[:500], stream_file=stream_file, failed=True)
-
-        with open(output_file) as f:
-            raw = f.read()
-
-        cost_usd = _extract_cost_from_codex_stream(result.stdout, model)
-        commands = _read_commands_file(cwd)
-
-        return InvokeResult(commands=commands, raw_output=raw, stream_file=stream_file, cost_usd=cost_usd)
+        with ClaudeStream(stream_file) as stream:
+            launched = await launch_async(_claude_argv(model), prompt, timeout, cwd, stream.feed, label=f"agent:{agent.id}")
+        return _claude_result(stream, launched, agent, cwd)
     except Exception as err:
         return _handle_error(err, agent)
-    finally:
-        for f in (prompt_file, output_file):
-            try:
-                os.unlink(f)
-            except OSError:
-                pass
 
 
-def _extract_text_from_claude_stream(jsonl: str) -> str:
-    parts: list[str] = []
-    for line in jsonl.splitlines():
-        if not line.strip():
-            continue
+async def _invoke_codex_async(prompt: str, agent: Agent, model: str, timeout: int, logs_dir: str, round_num: int, cwd: str = ".") -> InvokeResult:
+    fd, output_file = tempfile.mkstemp(prefix=f"systems-output-{agent.id}-", suffix=".txt")
+    os.close(fd)
+    stream_file = _stream_path(logs_dir, round_num, agent)
+    _clear_command_files(cwd)
+    try:
+        with CodexStream(stream_file, model) as stream:
+            launched = await launch_async(_codex_argv(model, output_file), prompt, timeout, cwd, stream.feed, label=f"agent:{agent.id}")
+        return _codex_result(stream, launched, output_file, agent, cwd)
+    except Exception as err:
+        return _handle_error(err, agent)
+    finally:
         try:
-            obj = json.loads(line)
-            # assistant message with text content
-            if obj.get("type") == "assistant" and "message" in obj:
-                for block in obj["message"].get("content", []):
-                    if block.get("type") == "text":
-                        parts.append(block["text"])
-            # result message
-            elif obj.get("type") == "result":
-                if obj.get("result"):
-                    parts.append(obj["result"])
-        except json.JSONDecodeError:
-            continue
-    return "\n".join(parts) if parts else jsonl
+            os.unlink(output_file)
+        except OSError:
+            pass
 
 
+def _claude_result(stream: ClaudeStream, launched: LaunchResult, agent: Agent, cwd: str) -> InvokeResult:
+    if launched.returncode != 0:
+        print(f"  [{agent.name}] claude exited with code {launched.returncode}: {launched.stderr[:200]}")
+        return InvokeResult(raw_output=launched.stderr[:500], stream_file=stream.stream_file, failed=True)
 
-def _extract_cost_from_claude_stream(jsonl: str) -> float:
-    for line in jsonl.splitlines():
-        if not line.strip():
-            continue
-        try:
-            obj = json.loads(line)
-            if obj.get("type") == "result":
-                return float(obj.get("total_cost_usd", 0.0))
-        except (json.JSONDecodeError, ValueError, TypeError):
-            continue
-    return 0.0
+    return InvokeResult(
+        commands=_read_commands_file(cwd), raw_output=stream.text,
+        stream_file=stream.stream_file, cost_usd=stream.cost_usd,
+        input_tokens=stream.input_tokens, output_tokens=stream.output_tokens,
+    )
 
 
-def _extract_cost_from_codex_stream(jsonl: str, model: str) -> float:
-    input_price, output_price = MODEL_PRICING.get(model, DEFAULT_PRICING)
-    total_input = 0
-    total_output = 0
-    for line in jsonl.splitlines():
-        if not line.strip():
-            continue
-        try:
-            obj = json.loads(line)
-            if obj.get("type") == "turn.completed":
-                usage = obj.get("usage", {})
-                total_input += usage.get("input_tokens", 0)
-                total_output += usage.get("output_tokens", 0)
-        except (json.JSONDecodeError, ValueError, TypeError):
-            continue
-    return (total_input * input_price + total_output * output_price) / 1_000_000
+def _codex_result(stream: CodexStream, launched: LaunchResult, output_file: str, agent: Agent, cwd: str) -> InvokeResult:
+    if launched.returncode != 0:
+        print(f"  [{agent.name}] codex exited with code {launched.returncode}: {launched.stderr[:200]}")
+        return InvokeResult(raw_output=launched.stderr[:500], stream_file=stream.stream_file, failed=True)
+
+    with open(output_file) as f:
+        raw = f.read(MAX_TEXT_CHARS)
+
+    return InvokeResult(
+        commands=_read_commands_file(cwd), raw_output=raw,
+        stream_file=stream.stream_file, cost_usd=stream.cost_usd,
+        input_tokens=stream.input_tokens, output_tokens=stream.output_tokens,
+    )
 
 
 def _handle_error(err: Exception, agent: Agent) -> InvokeResult:
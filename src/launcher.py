@@ -0,0 +1,302 @@
+"""Shared launcher for claude/codex CLI sessions (agents, evaluator, designer).
+
+The CLI is exec'd directly with the prompt on stdin — no shell, no `cat`, no
+temp prompt file. Each session runs in its own process group so a timeout
+kills everything the CLI started, not just its parent. Every launch is
+recorded in logs/invocations.jsonl with wall time, CPU time and peak RSS.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from .config import clean_env
+from .logger import log_invocation
+
+MAX_STDERR = 4096
+MAX_STDOUT = 65536
+STREAM_LINE_LIMIT = 32 * 1024 * 1024
+
+
+_sessions: dict[int, str] = {}  # pid -> label of launch() sessions still running
+_sessions_lock = threading.Lock()
+
+
+@dataclass
+class LaunchResult:
+    returncode: int
+    stdout: str = ""
+    stderr: str = ""
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    max_rss_kb: int = 0
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def kill_sessions(prefixes: tuple[str, ...]) -> int:
+    """Kill running launch() sessions whose label starts with one of prefixes.
+
+    Their launch() calls return a failed result once the group is gone.
+    Returns how many sessions were killed.
+    """
+    with _sessions_lock:
+        pids = [pid for pid, label in _sessions.items() if label.startswith(prefixes)]
+    for pid in pids:
+        _kill_group(pid)
+    return len(pids)
+
+
+def _open_pidfd(pid: int) -> int | None:
+    """A pidfd for pid, or None where there is none (non-Linux, kernel < 5.3)."""
+    try:
+        return os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return None
+
+
+def _record(label: str, argv: list[str], result: LaunchResult, timed_out: bool, wall: float) -> None:
+    log_invocation({
+        "label": label,
+        "cli": argv[0],
+        "timed_out": timed_out,
+        "returncode": result.returncode,
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(result.cpu_seconds, 3),
+        "max_rss_kb": result.max_rss_kb,
+    })
+
+
+def launch(
+    argv: list[str],
+    stdin_text: str,
+    timeout: float,
+    cwd: str | None = None,
+    on_line: Callable[[str], None] | None = None,
+    label: str = "",
+) -> LaunchResult:
+    """Run a CLI to completion. Raises subprocess.TimeoutExpired after `timeout` seconds.
+
+    stdout lines go to on_line as they arrive; without on_line the first
+    MAX_STDOUT characters are kept in the result.
+    """
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        argv,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+        env=clean_env(),
+        cwd=cwd,
+        start_new_session=True,
+    )
+    with _sessions_lock:
+        _sessions[proc.pid] = label
+    stdout: list[str] = []
+    stderr: list[str] = []
+
+    def feed_stdin() -> None:
+        try:
+            proc.stdin.write(stdin_text)
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    def drain_stderr() -> None:
+        kept = 0
+        for chunk in iter(lambda: proc.stderr.read(8192), ""):
+            if kept < MAX_STDERR:
+                stderr.append(chunk[:MAX_STDERR - kept])
+                kept += len(stderr[-1])
+
+    expired = threading.Event()
+
+    def expire() -> None:
+        expired.set()
+        _kill_group(proc.pid)
+
+    helpers = [
+        threading.Thread(target=feed_stdin, daemon=True),
+        threading.Thread(target=drain_stderr, daemon=True),
+    ]
+    for t in helpers:
+        t.start()
+    timer = threading.Timer(timeout, expire)
+    timer.start()
+    rusage = None
+    try:
+        kept = 0
+        for line in proc.stdout:
+            if on_line:
+                on_line(line)
+            elif kept < MAX_STDOUT:
+                stdout.append(line[:MAX_STDOUT - kept])
+                kept += len(stdout[-1])
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    finally:
+        timer.cancel()
+        if proc.returncode is None:
+            _kill_group(proc.pid)
+            _, status, rusage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        with _sessions_lock:
+            _sessions.pop(proc.pid, None)
+        if expired.is_set():
+            # Leftover group members may still hold the pipes open.
+            _kill_group(proc.pid)
+        for t in helpers:
+            t.join()
+        proc.stdout.close()
+        proc.stderr.close()
+
+    wall = time.monotonic() - started
+    result = LaunchResult(
+        returncode=proc.returncode,
+        stdout="".join(stdout),
+        stderr="".join(stderr),
+        wall_seconds=wall,
+        cpu_seconds=rusage.ru_utime + rusage.ru_stime,
+        max_rss_kb=rusage.ru_maxrss,
+    )
+    _record(label, argv, result, expired.is_set(), wall)
+    if expired.is_set():
+        raise subprocess.TimeoutExpired(argv, timeout)
+    return result
+
+
+async def launch_async(
+    argv: list[str],
+    stdin_text: str,
+    timeout: float,
+    cwd: str | None = None,
+    on_line: Callable[[str], None] | None = None,
+    label: str = "",
+) -> LaunchResult:
+    """Asyncio counterpart of launch. Raises TimeoutError after `timeout` seconds.
+
+    Pipes are driven by the running event loop and exit is detected through
+    a pidfd, so no thread is tied up per session and the engine still reaps
+    the child itself (for rusage). Without pidfd support, a worker thread
+    blocks in wait4 instead. Cancelling the awaiting task kills the process
+    group.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        argv,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=clean_env(),
+        cwd=cwd,
+        start_new_session=True,
+    )
+    pidfd = _open_pidfd(proc.pid)
+    if pidfd is not None:
+        exited = loop.create_future()
+        loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    else:
+        exited = loop.run_in_executor(None, os.wait4, proc.pid, 0)
+    stdout_reader = asyncio.StreamReader(limit=STREAM_LINE_LIMIT)
+    stderr_reader = asyncio.StreamReader()
+    transports = []
+    for reader, pipe in ((stdout_reader, proc.stdout), (stderr_reader, proc.stderr)):
+        transport, _ = await loop.connect_read_pipe(
+            lambda r=reader: asyncio.StreamReaderProtocol(r), pipe,
+        )
+        transports.append(transport)
+    stdout: list[str] = []
+
+    async def feed_stdin() -> None:
+        fd = proc.stdin.fileno()
+        os.set_blocking(fd, False)
+        data = memoryview(stdin_text.encode())
+        try:
+            while data:
+                try:
+                    data = data[os.write(fd, data):]
+                except BlockingIOError:
+                    writable = loop.create_future()
+                    loop.add_writer(fd, lambda: writable.done() or writable.set_result(None))
+                    try:
+                        await writable
+                    finally:
+                        loop.remove_writer(fd)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            proc.stdin.close()
+
+    async def pump_stdout() -> None:
+        kept = 0
+        while chunk := await stdout_reader.readline():
+            line = chunk.decode(errors="replace")
+            if on_line:
+                on_line(line)
+            elif kept < MAX_STDOUT:
+                stdout.append(line[:MAX_STDOUT - kept])
+                kept += len(stdout[-1])
+
+    async def drain_stderr() -> bytes:
+        kept = b""
+        while chunk := await stderr_reader.read(8192):
+            kept += chunk[:MAX_STDERR - len(kept)]
+        return kept
+
+    async def communicate() -> bytes:
+        stderr_task = asyncio.create_task(drain_stderr())
+        await asyncio.gather(feed_stdin(), pump_stdout())
+        stderr = await stderr_task
+        await asyncio.shield(exited)
+        return stderr
+
+    timed_out = False
+    try:
+        stderr = await asyncio.wait_for(communicate(), timeout)
+    except BaseException as err:
+        timed_out = isinstance(err, TimeoutError)
+        _kill_group(proc.pid)
+        await asyncio.shield(exited)
+        raise
+    finally:
+        for transport in transports:
+            transport.close()
+        if pidfd is not None:
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+            _, status, rusage = os.wait4(proc.pid, 0)
+        else:
+            _, status, rusage = await asyncio.shield(exited)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        wall = time.monotonic() - started
+        result = LaunchResult(
+            returncode=proc.returncode,
+            wall_seconds=wall,
+            cpu_seconds=rusage.ru_utime + rusage.ru_stime,
+            max_rss_kb=rusage.ru_maxrss,
+        )
+        _record(label, argv, result, timed_out, wall)
+        if timed_out:
+            raise TimeoutError(f"{argv[0]} timed out after {timeout}s") from None
+
+    result.stdout = "".join(stdout)
+    result.stderr = stderr.decode(errors="replace")
+    return result
@@ -26,6 +26,12 @@ def log_event(event: WorldEvent) -> None:
         f.write(json.dumps(asdict(event)) + "\n")
 
 
+def log_invocation(entry: dict) -> None:
+    path = os.path.join(_logs_dir, "invocations.jsonl")
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
 def print_round_summary(world: WorldState, results: list[RoundResult]) -> None:
     alive = [a for a in world.agents if a.alive]
 
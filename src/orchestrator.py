@@ -1,29 +1,41 @@
+import asyncio
 import json
 import os
+import time
 from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 
 from .types import Agent, SimulationConfig, RoundResult, WorldEvent, WorldState
-from .world import get_alive_agents, save_world
+from .world import get_alive_agents, save_world, world_data
 from .physics import consume_energy, check_deaths, random_energy_reward
 from .execution import (
     process_publish_service, process_use_service, process_unpublish_service,
     process_update_service, process_deposit, process_withdraw,
-    process_subscribe, process_unsubscribe, run_hooks,
+    process_subscribe, process_unsubscribe, run_hooks, prefetch_views, settle_batches,
+    dispatch_events, dispatch_transfers, drain_hooks,
 )
-from .services import ensure_system_services, load_entity, save_entity, collect_subscription_fees
+from .services import (
+    ensure_system_services, load_entity, save_entity, collect_subscription_fees, flush_services,
+    persist_services,
+)
+from .store import get_store
+from .workers import shutdown_workers
+from .viewcache import view_cache
 from .eval_service import EVAL_BUDGET, distribute_eval_rewards
-from .events import clear_events
+from .events import clear_events, publish_events
 from .config import TOP_MODELS
-from .invoker import invoke_agent, InvokeResult
+from .invoker import invoke_agent, invoke_agents_async, InvokeResult
 from .logger import log_round_result, log_event, print_round_summary
 from .audit import audit_agent, audit_round
 from .turns import load_turns, save_turns, delete_turns, create_turns
 from .spawner import (
     snapshot_self_prompts, deploy_self_prompts, update_agent_prompt,
-    spontaneous_spawn, designed_spawn,
+    spontaneous_spawn, designed_spawn, pooled_spawn, DesignerPool,
 )
-from .evaluator import evaluate_round
+from .evaluator import evaluate_round, round_summaries, score_summaries, apply_scores
 from .commands import write_commands_file
+from .launcher import kill_sessions
 
 
 # ---------------------------------------------------------------------------
@@ -39,8 +51,17 @@ def _invoke_worker(
     dry_run: bool,
     logs_dir: str,
 ) -> tuple[Agent, InvokeResult]:
-    print(f"  [{agent.name}] invoking ({agent.invoker}/{agent.model})...", flush=True)
+    _report_start(agent)
     result = invoke_agent(agent, world, public_dir, private_dir, timeout, dry_run, logs_dir)
+    _report_result(agent, result)
+    return agent, result
+
+
+def _report_start(agent: Agent) -> None:
+    print(f"  [{agent.name}] invoking ({agent.invoker}/{agent.model})...", flush=True)
+
+
+def _report_result(agent: Agent, result: InvokeResult) -> None:
     if result.failed:
         print(f"  [{agent.name}] FAILED", flush=True)
     else:
@@ -71,48 +92,102 @@ def _invoke_worker(
             actions.append(f"{len(result.commands.withdraw)} WITHDRAW")
         action = ", ".join(actions) if actions else "no actions"
         cost_str = f", ${result.cost_usd:.3f}" if result.cost_usd > 0 else ""
+        if result.input_tokens or result.output_tokens:
+            cost_str += f", {result.input_tokens}/{result.output_tokens} tok"
         print(f"  [{agent.name}] done ({action}{cost_str})", flush=True)
-    return agent, result
+
+
+def _invoke_all(
+    agents: list[Agent], world: WorldState, config: SimulationConfig,
+) -> dict[str, InvokeResult]:
+    """Invoke agents with up to config.concurrency sessions in flight."""
+    return asyncio.run(invoke_agents_async(
+        agents, world, config.public_dir, config.private_dir,
+        config.round_timeout, config.dry_run, config.logs_dir,
+        concurrency=config.concurrency,
+        deadline=config.round_deadline or None,
+        on_start=_report_start, on_done=_report_result,
+    ))
+
+
+@contextmanager
+def _command_txn(world: WorldState, config: SimulationConfig):
+    """With the SQLite backend, commit everything one command changed (services,
+    subscriptions, votes, grid, agent energy) as a single transaction."""
+    store = get_store(config.data_dir)
+    if store is None:
+        yield
+        return
+    with store.transaction():
+        yield
+        persist_services(config.data_dir)
+        store.put_doc("world", world_data(world))
 
 
 def _process_agent_result(
     agent: Agent, result: InvokeResult, energy_before: float,
     world: WorldState, config: SimulationConfig,
+    views: dict | None = None,
 ) -> RoundResult:
+    """Apply one agent's commands. `views` holds view results already run by
+    prefetch_views; without it, this agent's views are prefetched here."""
     all_events: list[WorldEvent] = []
     cmds = result.commands
 
     # Skip command execution, energy consumption, and logging in dry-run mode
     if not config.dry_run:
         for pub_req in cmds.publish:
-            all_events.extend(process_publish_service(agent, pub_req, world, config.data_dir, config.private_dir))
+            with _command_txn(world, config):
+                all_events.extend(process_publish_service(agent, pub_req, world, config.data_dir, config.private_dir))
 
         for unpub_req in cmds.unpublish:
-            all_events.extend(process_unpublish_service(agent, unpub_req, world, config.data_dir))
+            with _command_txn(world, config):
+                all_events.extend(process_unpublish_service(agent, unpub_req, world, config.data_dir))
 
         for update_req in cmds.update:
-            all_events.extend(process_update_service(agent, update_req, world, config.data_dir))
+            with _command_txn(world, config):
+                all_events.extend(process_update_service(agent, update_req, world, config.data_dir))
 
         for sub_req in cmds.subscribe:
-            all_events.extend(process_subscribe(agent, sub_req, world, config.data_dir))
+            with _command_txn(world, config):
+                all_events.extend(process_subscribe(agent, sub_req, world, config.data_dir))
 
         for unsub_req in cmds.unsubscribe:
-            all_events.extend(process_unsubscribe(agent, unsub_req, world, config.data_dir))
+            with _command_txn(world, config):
+                all_events.extend(process_unsubscribe(agent, unsub_req, world, config.data_dir))
 
+        if views is None:
+            views = prefetch_views([(agent, u) for u in cmds.use], world, config.data_dir)
         for use_req in cmds.use:
             if agent.energy <= 0:
                 break
-            all_events.extend(process_use_service(agent, use_req, world, config.data_dir, config.private_dir))
+            with _command_txn(world, config):
+                all_events.extend(process_use_service(
+                    agent, use_req, world, config.data_dir, config.private_dir,
+                    prefetched=views.get(id(use_req)),
+                ))
 
         for dep_req in cmds.deposit:
-            all_events.extend(process_deposit(agent, dep_req, world, config.data_dir))
+            with _command_txn(world, config):
+                all_events.extend(process_deposit(agent, dep_req, world, config.data_dir))
 
         for wdr_req in cmds.withdraw:
-            all_events.extend(process_withdraw(agent, wdr_req, world, config.data_dir))
+            with _command_txn(world, config):
+                all_events.extend(process_withdraw(agent, wdr_req, world, config.data_dir))
+
+        # Deliver this turn's emitted events and journaled transfers to hooks.
+        with _command_txn(world, config):
+            all_events.extend(dispatch_events(world, config.data_dir, config.private_dir))
+            all_events.extend(dispatch_transfers(world, config.data_dir, config.private_dir))
 
         consume_events = consume_energy(agent, world.round)
         all_events.extend(consume_events)
 
+        # Turn boundary: write back the services this turn touched and
+        # publish what they emitted.
+        flush_services(config.data_dir)
+        publish_events(config.data_dir)
+
     round_result = RoundResult(
         agent_id=agent.id,
         agent_name=agent.name,
@@ -129,6 +204,95 @@ def _process_agent_result(
     return round_result
 
 
+# ---------------------------------------------------------------------------
+# Advisory work (off the round's critical path)
+# ---------------------------------------------------------------------------
+
+ADVISORY_LABELS = ("design:", "eval:")
+CANCEL_GRACE = 5.0  # seconds close() keeps killing advisory CLIs before giving up
+
+
+class AdvisoryWork:
+    """Slow advisory steps that run alongside the round instead of inside finalize.
+
+    Designed agents come from a DesignerPool. With config.pipeline, the LLM
+    evaluation of round N also runs in the background while round N+1's
+    agents are invoked. Its rewards commit after that invocation phase,
+    before any of round N+1's commands are applied.
+    """
+
+    def __init__(self, world: WorldState, config: SimulationConfig) -> None:
+        self.config = config
+        self.designers = DesignerPool(world, config)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="advisory")
+        self._pending_eval: tuple[int, Future] | None = None
+
+    def submit_eval(self, world: WorldState) -> None:
+        summaries = round_summaries(world, self.config)
+        if summaries is None:
+            return
+        future = self._executor.submit(score_summaries, summaries, self.config)
+        self._pending_eval = (world.round, future)
+
+    def commit_eval(self, world: WorldState) -> list[WorldEvent]:
+        """Apply the pending evaluation's rewards, waiting for it if still running."""
+        if self._pending_eval is None:
+            return []
+        scored_round, future = self._pending_eval
+        self._pending_eval = None
+        if not future.done():
+            print(f"  [eval] waiting for round {scored_round} evaluation...", flush=True)
+        try:
+            scores = future.result()
+        except Exception as e:
+            print(f"  [eval] round {scored_round} evaluation error: {e}")
+            return []
+        return apply_scores(world, scores, scored_round)
+
+    def close(self, world: WorldState, interrupted: bool = False) -> list[WorldEvent]:
+        """Commit the pending evaluation and stop the designers. When the
+        simulation was interrupted, cancel all of it instead.
+
+        Designs still running at a normal close would only feed a later run,
+        so their sessions are killed rather than waited for; designs already
+        in the inventory are kept.
+        """
+        if interrupted:
+            self.cancel()
+            return []
+        events = self.commit_eval(world)
+        self._executor.shutdown(wait=True)
+        self.designers.shutdown(wait=False)
+        self._kill_until_drained(("design:",), lambda: self.designers.in_flight > 0)
+        return events
+
+    def cancel(self) -> None:
+        """Drop queued work and kill the designer/evaluator CLIs still running."""
+        pending = self._pending_eval[1] if self._pending_eval else None
+        self._pending_eval = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.designers.shutdown(wait=False)
+        self._kill_until_drained(
+            ADVISORY_LABELS,
+            lambda: (pending is not None and not pending.done()) or self.designers.in_flight > 0,
+        )
+
+    @staticmethod
+    def _kill_until_drained(labels: tuple[str, ...], busy) -> None:
+        """Kill sessions under labels until busy() is false or CANCEL_GRACE passes.
+
+        Killing a session makes its launch() return, but an evaluator may go
+        on to launch its next axis, so this keeps killing until the work
+        has drained.
+        """
+        deadline = time.monotonic() + CANCEL_GRACE
+        while True:
+            kill_sessions(labels)
+            if not busy() or time.monotonic() >= deadline:
+                return
+            time.sleep(0.05)
+
+
 # ---------------------------------------------------------------------------
 # Round lifecycle (turn-based)
 # ---------------------------------------------------------------------------
@@ -147,7 +311,7 @@ def _ensure_round_started(world: WorldState, config: SimulationConfig):
         world.round += 1
         turns = create_turns(world)
         if not config.dry_run:
-            clear_events(config.data_dir)
+            clear_events(config.data_dir, world.round)
             save_turns(turns, config.data_dir)
 
             eval_entity = load_entity(config.data_dir, "evaluator")
@@ -165,21 +329,31 @@ def _ensure_round_started(world: WorldState, config: SimulationConfig):
         # __main__.py already loads world.json at startup.
         authorized_prompts = snapshot_self_prompts(world.agents, config.private_dir)
 
+    # Agents read managed/services.json, so publish it before anyone is invoked.
+    flush_services(config.data_dir)
     return turns, authorized_prompts
 
 
 def _finalize_round(
     world: WorldState, config: SimulationConfig,
     authorized_prompts: dict[str, str | None],
+    advisory: AdvisoryWork | None = None,
 ) -> None:
+    # Batched services run once over the calls queued this round.
+    for event in settle_batches(world, config.data_dir, config.private_dir):
+        log_event(event)
+
     reward_events = random_energy_reward(world, config.energy_reward_count, config.energy_reward_amount)
     for event in reward_events:
         log_event(event)
 
     if not config.dry_run:
-        eval_events = evaluate_round(world, config)
-        for event in eval_events:
-            log_event(event)
+        if advisory and config.pipeline:
+            advisory.submit_eval(world)
+        else:
+            eval_events = evaluate_round(world, config)
+            for event in eval_events:
+                log_event(event)
 
         peer_events = distribute_eval_rewards(world, config.data_dir)
         for event in peer_events:
@@ -193,6 +367,8 @@ def _finalize_round(
     )
     for event in hook_events:
         log_event(event)
+    for event in dispatch_events(world, config.data_dir, config.private_dir):
+        log_event(event)
 
     sub_results = collect_subscription_fees(world, config.data_dir)
     for agent_id, service_name, amount in sub_results:
@@ -201,21 +377,32 @@ def _finalize_round(
         else:
             log_event(WorldEvent(round=world.round, type="unsubscribe", agent_id=agent_id, details={"service": service_name, "reason": "insufficient_energy"}))
 
+    # on_transfer: eval rewards and subscription fees, plus anything hooks moved.
+    for event in dispatch_transfers(world, config.data_dir, config.private_dir):
+        log_event(event)
+
     death_events = check_deaths(world)
     for event in death_events:
         log_event(event)
 
-    # Lifecycle hooks: on_agent_death
-    for death_event in death_events:
-        dead = next((a for a in world.agents if a.id == death_event.agent_id), None)
-        if dead:
-            death_hook_events = run_hooks(
-                "on_agent_death",
-                {"dead_agent_id": dead.id, "dead_agent_name": dead.name, "round": world.round},
-                world, config.data_dir, config.private_dir,
-            )
-            for event in death_hook_events:
-                log_event(event)
+    # Lifecycle hooks: on_agent_death, once for all of this round's deaths.
+    # dead_agent_id/name (the first death) are kept for older scripts.
+    deaths = [
+        {"dead_agent_id": a.id, "dead_agent_name": a.name}
+        for e in death_events for a in world.agents if a.id == e.agent_id
+    ]
+    if deaths:
+        death_hook_events = run_hooks(
+            "on_agent_death",
+            {**deaths[0], "deaths": deaths, "round": world.round},
+            world, config.data_dir, config.private_dir,
+        )
+        for event in death_hook_events:
+            log_event(event)
+
+    # Deliver what the hooks above emitted or moved before the round's events are cleared.
+    for event in drain_hooks(world, config.data_dir, config.private_dir):
+        log_event(event)
 
     # Services survive owner death — no cleanup needed
 
@@ -224,16 +411,26 @@ def _finalize_round(
         for event in respawn_events:
             log_event(event)
 
-        for d_invoker, d_model in TOP_MODELS:
-            design_events = designed_spawn(world, config, authorized_prompts, d_invoker, d_model)
-            for event in design_events:
-                log_event(event)
+        if advisory:
+            design_events = pooled_spawn(world, config, authorized_prompts, advisory.designers)
+        else:
+            design_events = []
+            for d_invoker, d_model in TOP_MODELS:
+                design_events.extend(designed_spawn(world, config, authorized_prompts, d_invoker, d_model))
+        for event in design_events:
+            log_event(event)
 
+    flush_services(config.data_dir)
+    publish_events(config.data_dir)
     if not config.dry_run:
         save_world(world, config.data_dir)
 
     delete_turns(config.data_dir)
 
+    cache = view_cache.stats()
+    if cache["hits"] or cache["misses"]:
+        print(f"  [view cache] {cache['hits']} hits, {cache['misses']} misses, {cache['entries']} entries")
+
 
 # ---------------------------------------------------------------------------
 # Entry points
@@ -305,9 +502,18 @@ def run_turn(world: WorldState, config: SimulationConfig) -> None:
 def run_round(
     world: WorldState, config: SimulationConfig,
     authorized_prompts: dict[str, str | None],
+    advisory: AdvisoryWork | None = None,
 ) -> list[RoundResult]:
-    """Process an entire round: invoke all agents, finalize."""
+    """Process an entire round: invoke all agents, finalize.
+
+    With advisory work, designed agents are produced in the background while
+    agents are invoked, and finalize spawns whatever is ready. In pipeline
+    mode the previous round's evaluation also overlaps this round's
+    invocations (see AdvisoryWork).
+    """
     turns, _ = _ensure_round_started(world, config)
+    if advisory:
+        advisory.designers.refill()
 
     # Get pending agents
     pending = []
@@ -320,14 +526,31 @@ def run_round(
 
     deploy_self_prompts(authorized_prompts, config.private_dir)
 
+    # Invocation phase: every agent sees the same round-start world, so the
+    # sessions are independent and can run side by side.
+    energy_before = {a.id: a.energy for a in pending}
+    invoked = _invoke_all(pending, world, config)
+
+    # Pipeline commit point: last round's evaluation lands before this
+    # round's commands are applied.
+    if advisory:
+        for event in advisory.commit_eval(world):
+            log_event(event)
+
+    # Apply phase: commands are applied one agent at a time in turn order
+    # (shuffled at round start and persisted in turns.json), regardless of
+    # which session finished first. Every agent's read-only view calls run
+    # up front, in parallel, against the same pre-apply state.
+    views = {}
+    if not config.dry_run:
+        views = prefetch_views(
+            [(a, u) for a in pending for u in invoked[a.id].commands.use], world, config.data_dir,
+        )
     results: list[RoundResult] = []
     for agent in pending:
-        energy_before = agent.energy
-        _, result = _invoke_worker(
-            agent, world, config.public_dir, config.private_dir,
-            config.round_timeout, config.dry_run, config.logs_dir,
+        round_result = _process_agent_result(
+            agent, invoked[agent.id], energy_before[agent.id], world, config, views,
         )
-        round_result = _process_agent_result(agent, result, energy_before, world, config)
         results.append(round_result)
         turns.completed.append(agent.id)
 
@@ -344,7 +567,7 @@ def run_round(
             print(f"    - {f['agent']} [{f['rule']}]: {f['detail'][:120]}")
 
     # Finalize
-    _finalize_round(world, config, authorized_prompts)
+    _finalize_round(world, config, authorized_prompts, advisory)
     print_round_summary(world, results)
 
     return results
@@ -365,19 +588,33 @@ def run_simulation(world: WorldState, config: SimulationConfig, max_rounds: int
         save_world(world, config.data_dir)
 
     authorized_prompts = snapshot_self_prompts(world.agents, config.private_dir)
+    advisory = AdvisoryWork(world, config) if not config.dry_run else None
 
     rounds_done = 0
-    while True:
-        alive = get_alive_agents(world)
-        if not alive:
-            print("\nAll entities have ceased to exist.")
-            break
+    interrupted = False
+    try:
+        while True:
+            alive = get_alive_agents(world)
+            if not alive:
+                print("\nAll entities have ceased to exist.")
+                break
 
-        run_round(world, config, authorized_prompts)
-        rounds_done += 1
+            run_round(world, config, authorized_prompts, advisory)
+            rounds_done += 1
 
-        if max_rounds and rounds_done >= max_rounds:
-            break
+            if max_rounds and rounds_done >= max_rounds:
+                break
+    except BaseException:
+        interrupted = True
+        raise
+    finally:
+        if advisory:
+            final_events = advisory.close(world, interrupted)
+            for event in final_events:
+                log_event(event)
+            if final_events:
+                save_world(world, config.data_dir)
+        shutdown_workers()
 
     alive = get_alive_agents(world)
     print(f"\n=== Simulation ended at round {world.round} ===")
@@ -10,17 +10,37 @@ from .types import (
 
 FIXED_TURN_COST = 1.0
 
+# Transfer journal: value transfers (not service prices or escrow) recorded
+# for on_transfer hooks, drained once per turn by take_transfers().
+_journal: list[dict] = []
 
-def transfer_energy(source: Entity, target: Entity, amount: float) -> float:
-    """L1 primitive: move energy between any entities. Returns actual amount transferred."""
+
+def _ref(entity: Entity) -> str:
+    return entity.id if isinstance(entity, Agent) else f"service:{entity.name}"
+
+
+def transfer_energy(source: Entity, target: Entity, amount: float, kind: str | None = None) -> float:
+    """L1 primitive: move energy between any entities. Returns actual amount transferred.
+
+    With `kind`, the transfer is also recorded in the transfer journal.
+    """
     actual = min(amount, source.energy)
     if actual <= 0:
         return 0.0
     source.energy -= actual
     target.energy += actual
+    if kind:
+        _journal.append({"from": _ref(source), "to": _ref(target), "amount": actual, "kind": kind})
     return actual
 
 
+def take_transfers() -> list[dict]:
+    """Journaled transfers since the last call, in order."""
+    transfers = _journal[:]
+    del _journal[:len(transfers)]
+    return transfers
+
+
 def consume_energy(agent: Agent, round_num: int) -> list[WorldEvent]:
     agent.energy -= FIXED_TURN_COST
     agent.age += 1
@@ -1,10 +1,93 @@
 from __future__ import annotations
 
 import json
+import os
+import resource
+import selectors
+import signal
 import subprocess
+import time
+from dataclasses import dataclass
+
+from .forkserver import ForkedChild, is_python_script, spawn_exec, spawn_python
+from .statepatch import StatePatch
+from .workers import request_worker
 
 MAX_OUTPUT = 8192
+MAX_STDERR = 500
 TIMEOUT = 300
+USE_FORKSERVER = True
+
+# Per-call resource caps. CPU defaults to the wall-clock TIMEOUT and files to
+# 64MB; memory is only capped when a service asks for it. A service may set
+# any of these at publish time ("limits"), up to MAX_LIMITS. nproc counts
+# every process of the engine's user, so it is also opt-in.
+DEFAULT_LIMITS = {"cpu": TIMEOUT, "fsize_mb": 64}
+MAX_LIMITS = {"cpu": TIMEOUT, "memory_mb": 8192, "fsize_mb": 1024, "nproc": 256}
+_RLIMITS = {
+    "cpu": resource.RLIMIT_CPU,
+    "memory_mb": resource.RLIMIT_AS,
+    "nproc": resource.RLIMIT_NPROC,
+    "fsize_mb": resource.RLIMIT_FSIZE,
+}
+
+
+@dataclass
+class ScriptResult:
+    output: str
+    success: bool
+    truncated: bool = False
+    cpu_seconds: float = 0.0
+    max_rss_kb: int = 0
+
+    @property
+    def usage(self) -> dict:
+        """Measured rusage for event details."""
+        return {"cpu_seconds": round(self.cpu_seconds, 3), "max_rss_kb": self.max_rss_kb}
+
+
+def clamp_limits(requested: dict | None) -> dict[str, int]:
+    """The valid caps in a publish request, each clamped to MAX_LIMITS."""
+    limits = {}
+    for key, value in (requested or {}).items():
+        if key not in _RLIMITS:
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            limits[key] = min(value, MAX_LIMITS[key])
+    return limits
+
+
+def resolve_limits(requested: dict | None) -> dict[str, int]:
+    """Effective caps for a call: DEFAULT_LIMITS overridden by `requested`."""
+    return {**DEFAULT_LIMITS, **clamp_limits(requested)}
+
+
+def _rlimits(limits: dict[str, int], persistent: bool = False) -> list[tuple[int, int, int]]:
+    """(resource, soft, hard) triples, never above the engine's own hard limits.
+
+    RLIMIT_CPU is cumulative over a process's life, so persistent workers
+    rely on the per-request timeout instead.
+    """
+    triples = []
+    for key, value in limits.items():
+        if persistent and key == "cpu":
+            continue
+        res = _RLIMITS[key]
+        if key == "cpu":
+            soft, hard = value, value + 1  # SIGXCPU first, SIGKILL a second later
+        elif key == "nproc":
+            soft = hard = value
+        else:
+            soft = hard = value * 1024 * 1024
+        _, engine_hard = resource.getrlimit(res)
+        if engine_hard != resource.RLIM_INFINITY:
+            soft, hard = min(soft, engine_hard), min(hard, engine_hard)
+        triples.append((res, soft, hard))
+    return triples
 
 
 def run_service_script(
@@ -18,8 +101,22 @@ def run_service_script(
     state: dict | None = None,
     trigger: str = "call",
     context: dict | None = None,
-) -> tuple[str, bool]:
-    """Execute a service script. Returns (output, success)."""
+    persistent: bool = False,
+    limits: dict | None = None,
+    state_path: str | None = None,
+    state_log: str | None = None,
+    state_blob: dict | None = None,
+) -> ScriptResult:
+    """Execute a service script under its resource limits.
+
+    Persistent services get the same payload as one line on their long-lived
+    worker's stdin (see workers.py) instead of a fresh process. Output is
+    read incrementally: a script that prints more than MAX_OUTPUT bytes is
+    killed and its result marked truncated. With state_path (state_file
+    services) the script reads its state from that file, plus the merge
+    patches in state_log if given, instead of "state";
+    state_blob describes its binary blob (see stateblob.py).
+    """
     input_json = json.dumps({
         "trigger": trigger,
         "caller_id": caller_id,
@@ -30,31 +127,173 @@ def run_service_script(
         "price": price,
         "state": state or {},
         "context": context or {},
+        **({"state_path": state_path} if state_path else {}),
+        **({"state_log": state_log} if state_log else {}),
+        **({"state_blob": state_blob} if state_blob else {}),
     })
+    limits = resolve_limits(limits)
 
+    if persistent:
+        return ScriptResult(*request_worker(
+            script_path, input_json, TIMEOUT, MAX_OUTPUT, _rlimits(limits, persistent=True),
+        ))
+
+    try:
+        proc = _start(script_path, _rlimits(limits))
+    except Exception as e:
+        return ScriptResult(f"ERROR: {str(e)[:200]}", False)
+    deadline = time.monotonic() + TIMEOUT
     try:
-        result = subprocess.run(
-            [script_path],
-            input=input_json,
-            capture_output=True,
-            text=True,
-            timeout=TIMEOUT,
-        )
-        output = result.stdout[:MAX_OUTPUT]
-        if result.returncode != 0:
-            err = result.stderr[:500] if result.stderr else "non-zero exit code"
-            return f"ERROR: {err}", False
-        return output if output else "(no output)", True
-    except subprocess.TimeoutExpired:
-        return f"ERROR: script timed out ({TIMEOUT}s limit)", False
+        stdout, stderr, truncated = _communicate(proc, input_json.encode(), deadline)
+    except TimeoutError:
+        return _timed_out(proc)
     except Exception as e:
-        return f"ERROR: {str(e)[:200]}", False
+        _kill_group(proc.pid)
+        _reap(proc)
+        return ScriptResult(f"ERROR: {str(e)[:200]}", False)
+    finally:
+        for pipe in (proc.stdin, proc.stdout, proc.stderr):
+            pipe.close()
+
+    if truncated:
+        _kill_group(proc.pid)
+    returncode, cpu, rss = _reap(proc, deadline)
+    if returncode is None:
+        return _timed_out(proc)  # closed its output but kept running
+    usage = {"cpu_seconds": cpu, "max_rss_kb": rss}
+    output = stdout.decode(errors="replace")
+    if truncated:
+        return ScriptResult(output, True, truncated=True, **usage)
+    if returncode == -signal.SIGXCPU or (returncode == -signal.SIGKILL and cpu >= limits["cpu"]):
+        return ScriptResult(f"ERROR: CPU limit exceeded ({limits['cpu']}s)", False, **usage)
+    if returncode != 0:
+        err = stderr.decode(errors="replace") if stderr else "non-zero exit code"
+        return ScriptResult(f"ERROR: {err}", False, **usage)
+    return ScriptResult(output if output else "(no output)", True, **usage)
+
+
+def _start(script_path: str, rlimits: list[tuple[int, int, int]]):
+    """Popen-like handle for the script, started with its rlimits already set.
+
+    The forkserver runs scripts whose shebang is the engine's own python in
+    the forked child and execs any other script from it. Only without a forkserver is the script started
+    with Popen; the limits then land a moment after exec, and a child it
+    forks in that window keeps the engine's limits.
+    """
+    if USE_FORKSERVER:
+        try:
+            if is_python_script(script_path):
+                return spawn_python(script_path, rlimits)
+            return spawn_exec(script_path, rlimits)
+        except OSError:
+            pass  # forkserver unavailable: fall back to Popen
+    proc = subprocess.Popen(
+        [script_path],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0,
+        start_new_session=True,
+    )
+    apply_rlimits(proc.pid, rlimits)
+    return proc
+
+
+def apply_rlimits(pid: int, rlimits: list[tuple[int, int, int]]) -> None:
+    """Set limits on a running process (no preexec_fn: the engine is threaded)."""
+    for res, soft, hard in rlimits:
+        try:
+            resource.prlimit(pid, res, (soft, hard))
+        except (ProcessLookupError, PermissionError, ValueError):
+            pass
+
+
+def _timed_out(proc) -> ScriptResult:
+    _kill_group(proc.pid)
+    _, cpu, rss = _reap(proc)
+    return ScriptResult(f"ERROR: script timed out ({TIMEOUT}s limit)", False, cpu_seconds=cpu, max_rss_kb=rss)
+
+
+def _reap(proc, deadline: float | None = None) -> tuple[int | None, float, int]:
+    """Wait for the script. Returns (returncode, cpu_seconds, max_rss_kb).
+
+    With a deadline, returncode is None if the script is still running when
+    it passes; the caller kills the group and reaps again without one.
+    """
+    if isinstance(proc, ForkedChild):
+        return proc.wait(deadline), proc.cpu_seconds, proc.max_rss_kb
+    delay = 0.001
+    while True:
+        pid, status, rusage = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return proc.returncode, rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None, 0.0, 0
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _communicate(proc, data: bytes, deadline: float) -> tuple[bytes, bytes, bool]:
+    """Feed stdin and drain stdout/stderr in bounded memory. Raises TimeoutError.
+
+    Stops as soon as stdout exceeds MAX_OUTPUT bytes and returns the first
+    MAX_OUTPUT with truncated=True; the caller kills the script. stderr past
+    MAX_STDERR bytes is read and discarded.
+    """
+    stdout = bytearray()
+    stderr = bytearray()
+    view = memoryview(data)
+    with selectors.DefaultSelector() as sel:
+        os.set_blocking(proc.stdin.fileno(), False)
+        sel.register(proc.stdin, selectors.EVENT_WRITE)
+        sel.register(proc.stdout, selectors.EVENT_READ)
+        sel.register(proc.stderr, selectors.EVENT_READ)
+        readers = 2
+        while readers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            for key, _ in sel.select(remaining):
+                pipe = key.fileobj
+                if pipe is proc.stdin:
+                    try:
+                        view = view[os.write(pipe.fileno(), view):]
+                    except BlockingIOError:
+                        continue
+                    except (BrokenPipeError, ConnectionResetError):
+                        view = view[:0]
+                    if not view:
+                        sel.unregister(pipe)
+                        pipe.close()
+                    continue
+                chunk = os.read(pipe.fileno(), 65536)
+                if not chunk:
+                    sel.unregister(pipe)
+                    readers -= 1
+                elif pipe is proc.stdout:
+                    stdout += chunk
+                    if len(stdout) > MAX_OUTPUT:
+                        return bytes(stdout[:MAX_OUTPUT]), bytes(stderr), True
+                else:
+                    stderr += chunk[:MAX_STDERR - len(stderr)]
+    return bytes(stdout), bytes(stderr), False
 
 
 def parse_service_output(raw: str) -> tuple[str, list[dict], dict | None]:
     """Parse script output. Returns (display_text, effects_list, new_state).
 
     If output is valid JSON with "output" key, parse effects and state.
+    A "state_patch" (without "state") comes back as a StatePatch; apply it
+    with statepatch.apply_state.
     Otherwise treat entire output as plain text (backward compat).
     """
     stripped = raw.strip()
@@ -67,10 +306,41 @@ def parse_service_output(raw: str) -> tuple[str, list[dict], dict | None]:
             effects = data.get("effects", [])
             if not isinstance(effects, list):
                 effects = []
-            new_state = data.get("state", None)
-            if new_state is not None and not isinstance(new_state, dict):
-                new_state = None
-            return output, effects, new_state
+            return output, effects, _parse_state(data)
         return raw, [], None
     except (json.JSONDecodeError, ValueError):
         return raw, [], None
+
+
+def _parse_state(data: dict) -> dict | None:
+    new_state = data.get("state", None)
+    if new_state is not None and not isinstance(new_state, dict):
+        new_state = None
+    patch = data.get("state_patch")
+    if new_state is None and isinstance(patch, dict):
+        new_state = StatePatch(patch)
+    return new_state
+
+
+def parse_batch_output(raw: str) -> tuple[list[tuple[str, list[dict]]] | None, dict | None]:
+    """Parse a batch run's output. Returns (per-caller results, new_state).
+
+    The script prints {"outputs": [{"output": ..., "effects": [...]}, ...]}
+    in request order, plus optional "state" / "state_patch". Results is
+    None if the output isn't in that form; entries that aren't objects
+    become None so the engine can refund those callers.
+    """
+    try:
+        data = json.loads(raw.strip())
+    except (json.JSONDecodeError, ValueError):
+        return None, None
+    if not isinstance(data, dict) or not isinstance(data.get("outputs"), list):
+        return None, None
+    results = []
+    for item in data["outputs"]:
+        if isinstance(item, dict) and "output" in item:
+            effects = item.get("effects", [])
+            results.append((str(item["output"]), effects if isinstance(effects, list) else []))
+        else:
+            results.append(None)
+    return results, _parse_state(data)
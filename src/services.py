@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import copy
+import fnmatch
 import json
 import os
 import shutil
 import stat
-from dataclasses import asdict, dataclass, field
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field, replace
 
 from .types import Entity, WorldState
 from .physics import transfer_energy
 from .grid.service import on_eviction as _grid_eviction
+from .statepatch import STATE_FILE, STATE_LOG, replay_log
+from .store import get_store
+from .viewcache import view_cache
 
 _EVICTION_HANDLERS = {"grid": _grid_eviction}
 
@@ -32,6 +39,13 @@ class Service(Entity):
     state: dict = field(default_factory=dict)
     upgradeable: bool = True
     protocol: bool = False
+    persistent: bool = False
+    limits: dict = field(default_factory=dict)
+    state_file: bool = False
+    state_blob_mb: int = 0
+    batch: bool = False
+    batch_queue: list[dict] = field(default_factory=list)
+    event_topics: list[str] = field(default_factory=list)
 
 
 # ---------------------------------------------------------------------------
@@ -46,65 +60,369 @@ def _entity_path(data_dir: str, name: str) -> str:
     return os.path.join(_service_dir(data_dir, name), "entity.json")
 
 
-def load_entity(data_dir: str, name: str) -> Service | None:
-    path = _entity_path(data_dir, name)
+def write_json_atomic(path: str, data) -> None:
+    """Write JSON via a temp file + rename so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _read_entity(path: str) -> Service | None:
     if not os.path.exists(path):
         return None
     with open(path) as f:
-        data = json.load(f)
+        return _entity_from_dict(json.load(f))
+
+
+def _entity_from_dict(data: dict) -> Service:
     known = Service.__dataclass_fields__
     return Service(**{k: v for k, v in data.items() if k in known})
 
 
+def _entity_record(entity: Service, with_state: bool = True) -> dict:
+    """asdict(entity), without copying state when it is stored elsewhere.
+    with_state=False is the agent-facing summary (no state, no batch queue)."""
+    if with_state and not entity.state_file:
+        return asdict(entity)
+    data = asdict(replace(entity, state={}))
+    del data["state"]
+    if not with_state:
+        del data["batch_queue"]
+    return data
+
+
+class ServiceRegistry:
+    """In-memory view of data/services/*/entity.json for one data dir.
+
+    Entities are read from disk once and served from dicts indexed by name
+    and by provider. Lookups return the live entity, so a caller that
+    mutates it must hand it back through save_entity. Saved entities are
+    marked dirty and written back in batches by flush(), which produces the
+    same entity.json files as before (or rows in state.db with the SQLite
+    backend). Any save or delete also marks the agent-facing services.json
+    mirrors stale; flush() republishes them once.
+
+    Services are also indexed by lifecycle hook, and on_event services by
+    their event_topics: exact topics in a dict, fnmatch patterns in a short
+    list.
+
+    state_file services keep their state in services/<name>/state.json.
+    mark_state_changed() appends merge patches to state.log beside it;
+    compact_states() folds the log into a fresh state.json at the turn
+    boundary (flush). A full replacement state is written by state_path()
+    before the next call instead. With the SQLite backend, patches wait in
+    memory until persist() or the next call's state_log_path(), so they
+    reach state.log inside the command's transaction.
+    """
+
+    def __init__(self, data_dir: str) -> None:
+        self.data_dir = data_dir
+        self._lock = threading.RLock()
+        self._by_name: dict[str, Service] = {}
+        self._by_provider: dict[str, set[str]] = {}
+        self._dirty: set[str] = set()
+        self._versions: dict[str, int] = {}  # bumped by every put() and delete()
+        self._state_dirty: set[str] = set()  # state.json must be rewritten
+        self._state_logged: set[str] = set()  # state.log holds patches to compact
+        self._patches: dict[str, list[dict]] = {}  # SQLite: patches not yet in state.log
+        self._by_hook: dict[str, set[str]] = {}
+        self._topics_exact: dict[str, set[str]] = {}
+        self._topics_wild: dict[str, list[str]] = {}
+        self._mirror_dirty = True  # republish on first flush
+        self._store = get_store(data_dir)
+        svc_root = os.path.join(data_dir, SERVICES_DIR)
+        if self._store is not None:
+            for data in self._store.load_services():
+                self._index(self._load_state(_entity_from_dict(data)))
+        elif os.path.isdir(svc_root):
+            for name in sorted(os.listdir(svc_root)):
+                entity = _read_entity(_entity_path(data_dir, name))
+                if entity:
+                    self._index(self._load_state(entity))
+
+    def _load_state(self, entity: Service) -> Service:
+        if entity.state_file:
+            svc_dir = _service_dir(self.data_dir, entity.name)
+            path = os.path.join(svc_dir, STATE_FILE)
+            if os.path.exists(path):
+                with open(path) as f:
+                    entity.state = json.load(f)
+            log = os.path.join(svc_dir, STATE_LOG)
+            if os.path.exists(log):
+                replay_log(entity.state, log)
+                self._state_logged.add(entity.name.lower())
+        return entity
+
+    def _index(self, entity: Service) -> None:
+        key = entity.name.lower()
+        self._unindex(key)
+        self._by_name[key] = entity
+        self._by_provider.setdefault(entity.provider_id, set()).add(key)
+        for hook in entity.hooks:
+            self._by_hook.setdefault(hook, set()).add(key)
+        if "on_event" in entity.hooks:
+            for topic in entity.event_topics:
+                if any(c in topic for c in "*?["):
+                    self._topics_wild.setdefault(key, []).append(topic)
+                else:
+                    self._topics_exact.setdefault(topic, set()).add(key)
+
+    def _unindex(self, key: str) -> Service | None:
+        old = self._by_name.pop(key, None)
+        if old is not None:
+            self._by_provider.get(old.provider_id, set()).discard(key)
+            for hook in old.hooks:
+                self._by_hook.get(hook, set()).discard(key)
+            for topic in old.event_topics:
+                self._topics_exact.get(topic, set()).discard(key)
+            self._topics_wild.pop(key, None)
+        return old
+
+    def get(self, name: str) -> Service | None:
+        with self._lock:
+            return self._by_name.get(name.lower())
+
+    def all(self) -> list[Service]:
+        with self._lock:
+            return [self._by_name[k] for k in sorted(self._by_name)]
+
+    def count_by_provider(self, provider_id: str) -> int:
+        with self._lock:
+            return len(self._by_provider.get(provider_id, ()))
+
+    def version(self, name: str) -> int:
+        """How many times the entity has been saved or deleted in this process."""
+        with self._lock:
+            return self._versions.get(name.lower(), 0)
+
+    def hooked(self, hook_name: str) -> list[Service]:
+        """Services registered for a lifecycle hook, by name."""
+        with self._lock:
+            return [self._by_name[k] for k in sorted(self._by_hook.get(hook_name, ()))]
+
+    def event_subscribers(self, event_name: str) -> list[Service]:
+        """on_event services whose event_topics match event_name, by name."""
+        with self._lock:
+            keys = set(self._topics_exact.get(event_name, ()))
+            keys.update(k for k, patterns in self._topics_wild.items()
+                        if any(fnmatch.fnmatchcase(event_name, p) for p in patterns))
+            return [self._by_name[k] for k in sorted(keys)]
+
+    def put(self, entity: Service) -> None:
+        with self._lock:
+            self._index(entity)
+            key = entity.name.lower()
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._dirty.add(key)
+            self._mirror_dirty = True
+
+    def delete(self, name: str) -> None:
+        key = name.lower()
+        with self._lock:
+            self._unindex(key)
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._dirty.discard(key)
+            self._state_dirty.discard(key)
+            self._state_logged.discard(key)
+            self._patches.pop(key, None)
+            self._mirror_dirty = True
+            if self._store is not None:
+                self._store.delete_service(key)
+            svc_dir = _service_dir(self.data_dir, key)
+            if os.path.exists(svc_dir):
+                shutil.rmtree(svc_dir)
+
+    def mark_state_changed(self, entity: Service, patch: dict | None = None) -> None:
+        """Record a change to a state_file service's state: `patch` (the merge
+        patch that made it) is appended to state.log; without one, state.json
+        is rewritten before the next call."""
+        if not entity.state_file:
+            return
+        key = entity.name.lower()
+        svc_dir = _service_dir(self.data_dir, key)
+        with self._lock:
+            if patch is None or key in self._state_dirty or not os.path.exists(os.path.join(svc_dir, STATE_FILE)):
+                self._state_dirty.add(key)
+                self._patches.pop(key, None)
+                return
+            self._patches.setdefault(key, []).append(patch)
+            self._state_logged.add(key)
+            if self._store is None:
+                self._append_patches(key)
+
+    def _append_patches(self, key: str) -> None:
+        patches = self._patches.pop(key, None)
+        if patches:
+            with open(os.path.join(_service_dir(self.data_dir, key), STATE_LOG), "a") as f:
+                f.writelines(json.dumps(patch) + "\n" for patch in patches)
+
+    def _compact_state(self, key: str, entity: Service) -> None:
+        svc_dir = _service_dir(self.data_dir, key)
+        os.makedirs(svc_dir, exist_ok=True)
+        write_json_atomic(os.path.join(svc_dir, STATE_FILE), entity.state)
+        if key in self._state_logged:
+            try:
+                os.remove(os.path.join(svc_dir, STATE_LOG))
+            except FileNotFoundError:
+                pass
+        self._state_dirty.discard(key)
+        self._state_logged.discard(key)
+        self._patches.pop(key, None)
+
+    def state_path(self, entity: Service) -> str:
+        """Path of the entity's state.json, rewritten first if a patch log
+        cannot bring it up to date."""
+        key = entity.name.lower()
+        path = os.path.join(_service_dir(self.data_dir, key), STATE_FILE)
+        with self._lock:
+            if key in self._state_dirty or not os.path.exists(path):
+                self._compact_state(key, entity)
+        return path
+
+    def state_log_path(self, entity: Service) -> str | None:
+        """Path of the entity's state.log, or None if it has no pending patches."""
+        key = entity.name.lower()
+        with self._lock:
+            if key not in self._state_logged:
+                return None
+            self._append_patches(key)
+        return os.path.join(_service_dir(self.data_dir, key), STATE_LOG)
+
+    def compact_states(self) -> int:
+        """Rewrite state.json for every state_file service with logged patches
+        or a replaced state, and drop the logs. Returns the number rewritten."""
+        with self._lock:
+            keys = sorted(self._state_dirty | self._state_logged)
+            for key in keys:
+                if key in self._by_name:
+                    self._compact_state(key, self._by_name[key])
+            self._state_dirty.clear()
+            self._state_logged.clear()
+            self._patches.clear()
+            return len(keys)
+
+    def persist(self) -> int:
+        """Write every dirty entity and append pending state patches to their
+        logs; state.json itself is left to compact_states(). Returns the
+        number of entities written."""
+        with self._lock:
+            for key in sorted(self._patches):
+                self._append_patches(key)
+            dirty = sorted(self._dirty)
+            self._dirty.clear()
+            if self._store is not None:
+                self._store.put_services([_entity_record(self._by_name[key]) for key in dirty])
+                return len(dirty)
+            for key in dirty:
+                entity = self._by_name[key]
+                os.makedirs(_service_dir(self.data_dir, key), exist_ok=True)
+                write_json_atomic(_entity_path(self.data_dir, key), _entity_record(entity))
+            return len(dirty)
+
+    def flush(self) -> int:
+        """compact_states() and persist(), then republish the mirrors if stale."""
+        with self._lock:
+            self.compact_states()
+            written = self.persist()
+            if self._mirror_dirty:
+                self._mirror_dirty = False
+                self._publish_mirror()
+            return written
+
+    def _publish_mirror(self) -> None:
+        summary = [_entity_record(e, with_state=False) for e in self.all()]
+        for dest_dir in ("managed", "public"):
+            dest = os.path.join(self.data_dir, dest_dir, "services.json")
+            try:
+                write_json_atomic(dest, summary)
+            except OSError:
+                pass
+
+
+_registries: dict[str, ServiceRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(data_dir: str) -> ServiceRegistry:
+    key = os.path.abspath(data_dir)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = ServiceRegistry(data_dir)
+        return registry
+
+
+def flush_services(data_dir: str) -> None:
+    """Write back entities saved since the last flush and republish
+    managed/public services.json if anything changed (turn/round boundary)."""
+    get_registry(data_dir).flush()
+
+
+def persist_services(data_dir: str) -> None:
+    """Write back saved entities and pending state patches without touching
+    the mirrors or rewriting state.json (used inside a per-command storage
+    transaction)."""
+    get_registry(data_dir).persist()
+
+
+def mark_state_changed(entity: Service, data_dir: str, patch: dict | None = None) -> None:
+    """Record that entity.state changed, by `patch` if it was a merge patch
+    (state_file services write it lazily)."""
+    get_registry(data_dir).mark_state_changed(entity, patch)
+
+
+def state_path(entity: Service, data_dir: str) -> str:
+    """Up-to-date state.json for a state_file service, for its script to read."""
+    return get_registry(data_dir).state_path(entity)
+
+
+def state_log_path(entity: Service, data_dir: str) -> str | None:
+    """state.log of patches on top of state_path(), if there are any."""
+    return get_registry(data_dir).state_log_path(entity)
+
+
+def load_entity(data_dir: str, name: str) -> Service | None:
+    return get_registry(data_dir).get(name)
+
+
 def save_entity(entity: Service, data_dir: str) -> None:
-    svc_dir = _service_dir(data_dir, entity.name)
-    os.makedirs(svc_dir, exist_ok=True)
-    with open(_entity_path(data_dir, entity.name), "w") as f:
-        json.dump(asdict(entity), f, indent=2)
-    _publish_mirror(data_dir)
+    get_registry(data_dir).put(entity)
+    view_cache.invalidate(_service_dir(data_dir, entity.name), entity.state)
+
+
+def entity_version(name: str, data_dir: str) -> int:
+    """Changes whenever the entity is saved, so callers can tell it was touched."""
+    return get_registry(data_dir).version(name)
 
 
 def load_all_entities(data_dir: str) -> list[Service]:
-    svc_root = os.path.join(data_dir, SERVICES_DIR)
-    if not os.path.isdir(svc_root):
-        return []
-    entities = []
-    for name in sorted(os.listdir(svc_root)):
-        entity = load_entity(data_dir, name)
-        if entity:
-            entities.append(entity)
-    return entities
+    return get_registry(data_dir).all()
 
 
 def delete_entity(data_dir: str, name: str) -> None:
-    svc_dir = _service_dir(data_dir, name)
-    if os.path.exists(svc_dir):
-        shutil.rmtree(svc_dir)
-    _publish_mirror(data_dir)
+    get_registry(data_dir).delete(name)
+    view_cache.invalidate(_service_dir(data_dir, name))
 
 
-def _publish_mirror(data_dir: str) -> None:
-    entities = load_all_entities(data_dir)
-    summary = []
-    for e in entities:
-        d = asdict(e)
-        d.pop("state", None)
-        summary.append(d)
-    for dest_dir in ("managed", "public"):
-        dest = os.path.join(data_dir, dest_dir, "services.json")
-        try:
-            with open(dest, "w") as f:
-                json.dump(summary, f, indent=2)
-        except OSError:
-            pass
+def hooked_services(hook_name: str, data_dir: str) -> list[Service]:
+    return get_registry(data_dir).hooked(hook_name)
+
+
+def event_subscribers(event_name: str, data_dir: str) -> list[Service]:
+    return get_registry(data_dir).event_subscribers(event_name)
 
 
 def find_service(name: str, data_dir: str) -> Service | None:
-    return load_entity(data_dir, name.lower())
+    return load_entity(data_dir, name)
 
 
 def count_agent_services(agent_id: str, data_dir: str) -> int:
-    return sum(1 for e in load_all_entities(data_dir) if e.provider_id == agent_id)
+    return get_registry(data_dir).count_by_provider(agent_id)
 
 
 # ---------------------------------------------------------------------------
@@ -119,6 +437,7 @@ def install_script(data_dir: str, service_name: str, source_path: str) -> str |
     dest = os.path.join(svc_dir, os.path.basename(source_path))
     shutil.copy2(source_path, dest)
     os.chmod(dest, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
+    view_cache.invalidate(svc_dir)
     return dest
 
 
@@ -182,11 +501,11 @@ SYSTEM_SERVICES = [
 def ensure_system_services(data_dir: str) -> None:
     for svc in SYSTEM_SERVICES:
         if load_entity(data_dir, svc.name) is None:
-            save_entity(svc, data_dir)
+            save_entity(copy.deepcopy(svc), data_dir)
 
 
 # ---------------------------------------------------------------------------
-# Subscriptions (unchanged)
+# Subscriptions
 # ---------------------------------------------------------------------------
 
 def _subscriptions_path(data_dir: str) -> str:
@@ -194,6 +513,9 @@ def _subscriptions_path(data_dir: str) -> str:
 
 
 def load_subscriptions(data_dir: str) -> dict[str, list[str]]:
+    store = get_store(data_dir)
+    if store is not None:
+        return store.load_subscriptions()
     path = _subscriptions_path(data_dir)
     if not os.path.exists(path):
         return {}
@@ -202,6 +524,11 @@ def load_subscriptions(data_dir: str) -> dict[str, list[str]]:
 
 
 def save_subscriptions(subs: dict[str, list[str]], data_dir: str) -> None:
+    store = get_store(data_dir)
+    if store is not None:
+        store.replace_subscriptions(subs)
+        _publish_subscriptions(subs, data_dir)
+        return
     path = _subscriptions_path(data_dir)
     with open(path, "w") as f:
         json.dump(subs, f, indent=2)
@@ -213,7 +540,21 @@ def save_subscriptions(subs: dict[str, list[str]], data_dir: str) -> None:
             pass
 
 
+def _publish_subscriptions(subs: dict[str, list[str]], data_dir: str) -> None:
+    for dest_dir in ("managed", "public"):
+        try:
+            write_json_atomic(os.path.join(data_dir, dest_dir, SUBSCRIPTIONS_FILE), subs)
+        except OSError:
+            pass
+
+
 def subscribe(agent_id: str, service_name: str, data_dir: str) -> bool:
+    store = get_store(data_dir)
+    if store is not None:
+        added = store.add_subscription(service_name, agent_id)
+        if added:
+            _publish_subscriptions(store.load_subscriptions(), data_dir)
+        return added
     subs = load_subscriptions(data_dir)
     subscribers = subs.get(service_name, [])
     if agent_id in subscribers:
@@ -225,6 +566,12 @@ def subscribe(agent_id: str, service_name: str, data_dir: str) -> bool:
 
 
 def unsubscribe(agent_id: str, service_name: str, data_dir: str) -> bool:
+    store = get_store(data_dir)
+    if store is not None:
+        removed = store.remove_subscription(service_name, agent_id)
+        if removed:
+            _publish_subscriptions(store.load_subscriptions(), data_dir)
+        return removed
     subs = load_subscriptions(data_dir)
     subscribers = subs.get(service_name, [])
     if agent_id not in subscribers:
@@ -236,6 +583,9 @@ def unsubscribe(agent_id: str, service_name: str, data_dir: str) -> bool:
 
 
 def is_subscribed(agent_id: str, service_name: str, data_dir: str) -> bool:
+    store = get_store(data_dir)
+    if store is not None:
+        return store.is_subscribed(service_name, agent_id)
     subs = load_subscriptions(data_dir)
     return agent_id in subs.get(service_name, [])
 
@@ -261,14 +611,14 @@ def collect_subscription_fees(world: WorldState, data_dir: str) -> list[tuple[st
                 continue
             if agent.energy >= entity.subscription_fee:
                 if entity.protocol:
-                    transfer_energy(agent, entity, entity.subscription_fee)
+                    transfer_energy(agent, entity, entity.subscription_fee, kind="subscription_fee")
                     save_entity(entity, data_dir)
                 else:
                     provider = next((a for a in world.agents if a.id == entity.provider_id and a.alive), None)
                     if provider:
-                        transfer_energy(agent, provider, entity.subscription_fee)
+                        transfer_energy(agent, provider, entity.subscription_fee, kind="subscription_fee")
                     else:
-                        transfer_energy(agent, entity, entity.subscription_fee)
+                        transfer_energy(agent, entity, entity.subscription_fee, kind="subscription_fee")
                         save_entity(entity, data_dir)
                 results.append((agent_id, service_name, entity.subscription_fee))
             else:
@@ -1,13 +1,16 @@
+import itertools
 import json
 import os
 import random
 import re
-import subprocess
 import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from .types import Agent, SimulationConfig, WorldEvent, WorldState
 from .world import get_alive_agents, save_world
-from .config import get_agent_name, TOP_MODELS, clean_env
+from .config import get_agent_name, TOP_MODELS
+from .launcher import launch
 from .prompt import SELF_PROMPT_FILE
 from .logger import log_event
 
@@ -173,23 +176,11 @@ def _design_self_prompt(
 
         print(f"  [design] generating prompt with {designer_invoker}/{designer_model}...")
 
-        fd, prompt_file = tempfile.mkstemp(prefix="systems-designer-", suffix=".txt")
-        os.write(fd, designer_prompt.encode())
-        os.close(fd)
-
-        env = clean_env()
         if designer_invoker == "claude":
-            result = subprocess.run(
-                ["sh", "-c", f'cat "{prompt_file}" | claude -p --model {designer_model}'],
-                capture_output=True, text=True, timeout=600, env=env,
-            )
+            argv = ["claude", "-p", "--model", designer_model]
         else:
-            result = subprocess.run(
-                ["sh", "-c", f'cat "{prompt_file}" | codex exec --json -m {designer_model} --sandbox danger-full-access'],
-                capture_output=True, text=True, timeout=600, env=env,
-            )
-
-        os.unlink(prompt_file)
+            argv = ["codex", "exec", "--json", "-m", designer_model, "--sandbox", "danger-full-access"]
+        result = launch(argv, designer_prompt, 600, label=f"design:{designer_model}")
 
         if result.returncode != 0:
             print(f"  [design] AI prompt generation failed: {result.stderr[:200]}")
@@ -225,14 +216,22 @@ def designed_spawn(
     designer_invoker: str, designer_model: str,
 ) -> list[WorldEvent]:
     """Spawn a fresh agent via intelligent design — AI-generated self_prompt, top-tier model."""
-    invoker, model = random.choice(TOP_MODELS)
-
     designed_name, designed_prompt = _design_self_prompt(world, config, designer_invoker, designer_model)
 
     if not designed_prompt:
         print(f"  [design] skipped — prompt generation failed")
         return []
 
+    return _spawn_designed(world, config, authorized_prompts, designed_name, designed_prompt)
+
+
+def _spawn_designed(
+    world: WorldState, config: SimulationConfig,
+    authorized_prompts: dict[str, str | None],
+    designed_name: str | None, designed_prompt: str,
+) -> list[WorldEvent]:
+    invoker, model = random.choice(TOP_MODELS)
+
     child = create_agent(
         world, config, invoker, model,
         authorized_prompts, designed_prompt,
@@ -259,6 +258,109 @@ def designed_spawn(
     return [event]
 
 
+# ---------------------------------------------------------------------------
+# Background designer pool
+# ---------------------------------------------------------------------------
+
+DESIGNS_FILE = "designs.json"
+
+
+def _designs_path(data_dir: str) -> str:
+    return os.path.join(data_dir, DESIGNS_FILE)
+
+
+def load_designs(data_dir: str) -> list[dict]:
+    path = _designs_path(data_dir)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_designs(designs: list[dict], data_dir: str) -> None:
+    path = _designs_path(data_dir)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(designs, f, indent=2)
+    os.replace(tmp, path)
+
+
+class DesignerPool:
+    """Designer sessions running in background threads.
+
+    Keeps an inventory of ready-to-spawn designs ({name, self_prompt,
+    designer}) in data/designs.json, topped up to one per TOP_MODELS entry.
+    Workers overlap with agent invocations; finalize only pops from the
+    inventory and never waits on a designer.
+    """
+
+    def __init__(self, world: WorldState, config: SimulationConfig) -> None:
+        self.world = world
+        self.config = config
+        self.target = len(TOP_MODELS)
+        self._lock = threading.Lock()
+        self._inventory = load_designs(config.data_dir)
+        self._in_flight = 0
+        self._designers = itertools.cycle(TOP_MODELS)
+        self._executor = ThreadPoolExecutor(max_workers=len(TOP_MODELS), thread_name_prefix="designer")
+        self._jobs: list[Future] = []
+
+    def refill(self) -> None:
+        with self._lock:
+            missing = self.target - len(self._inventory) - self._in_flight
+            jobs = [next(self._designers) for _ in range(max(0, missing))]
+            self._in_flight += len(jobs)
+        self._jobs = [job for job in self._jobs if not job.done()]
+        for d_invoker, d_model in jobs:
+            self._jobs.append(self._executor.submit(self._design, d_invoker, d_model))
+
+    def _design(self, d_invoker: str, d_model: str) -> None:
+        name, prompt = None, None
+        try:
+            name, prompt = _design_self_prompt(self.world, self.config, d_invoker, d_model)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                if prompt:
+                    self._inventory.append({"name": name, "self_prompt": prompt, "designer": d_model})
+                    save_designs(self._inventory, self.config.data_dir)
+
+    def take(self, count: int) -> list[dict]:
+        with self._lock:
+            taken, self._inventory = self._inventory[:count], self._inventory[count:]
+            if taken:
+                save_designs(self._inventory, self.config.data_dir)
+            return taken
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return self._in_flight
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Drop queued jobs and (by default) wait for running designers; their output is kept."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        with self._lock:
+            self._in_flight -= sum(job.cancelled() for job in self._jobs)
+            self._jobs = []
+
+
+def pooled_spawn(
+    world: WorldState, config: SimulationConfig,
+    authorized_prompts: dict[str, str | None],
+    designers: DesignerPool,
+) -> list[WorldEvent]:
+    """Spawn designed agents from the pool's inventory without waiting for designers."""
+    designs = designers.take(len(TOP_MODELS))
+    if not designs:
+        print(f"  [design] no designs ready ({designers.in_flight} in progress) — skipped")
+    events: list[WorldEvent] = []
+    for design in designs:
+        events.extend(_spawn_designed(world, config, authorized_prompts, design.get("name"), design["self_prompt"]))
+    designers.refill()
+    return events
+
+
 def run_designed_spawn(world: WorldState, config: SimulationConfig) -> None:
     """Run designed spawns outside of the normal round lifecycle."""
     authorized_prompts = snapshot_self_prompts(world.agents, config.private_dir)
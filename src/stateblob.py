@@ -0,0 +1,84 @@
+"""Binary state blobs for high-volume services.
+
+A service published with "state_blob_mb": N gets data/services/<name>/state.bin.
+Every call's payload carries "state_blob": {"path", "max_bytes"}. The script
+can open the file and mmap it for random access, growing it up to max_bytes.
+
+Before each call that may change state, the engine snapshots the blob. It
+uses a reflink clone where the filesystem supports one, otherwise a copy.
+If the call fails, or leaves the blob larger than max_bytes, the blob is
+restored in place, the same way a failed call refunds its caller. The file
+keeps its inode, so a persistent worker's mapping stays valid. Views get
+the path too but are not snapshotted: they must not write.
+"""
+from __future__ import annotations
+
+import fcntl
+import os
+import shutil
+import tempfile
+
+STATE_BLOB = "state.bin"
+MAX_STATE_BLOB_MB = 64  # never above sandbox's default RLIMIT_FSIZE
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+
+def clamp_blob_mb(requested) -> int:
+    try:
+        return max(0, min(int(requested), MAX_STATE_BLOB_MB))
+    except (TypeError, ValueError):
+        return 0
+
+
+def blob_path(service_dir: str) -> str:
+    return os.path.join(service_dir, STATE_BLOB)
+
+
+def create_blob(service_dir: str) -> str:
+    """Create an empty state.bin (kept if one already exists)."""
+    path = blob_path(service_dir)
+    os.makedirs(service_dir, exist_ok=True)
+    open(path, "ab").close()
+    return path
+
+
+def _clone(src: str, dst: str) -> None:
+    """Make dst's contents equal src's, in place: reflink if possible, else copy."""
+    with open(src, "rb") as fsrc, open(dst, "r+b" if os.path.exists(dst) else "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            fdst.truncate(os.fstat(fsrc.fileno()).st_size)
+            return
+        except OSError:
+            pass
+        fdst.truncate(0)
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+
+
+def snapshot(path: str) -> str | None:
+    """Copy-on-write snapshot of the blob, or None if there is no blob."""
+    if not os.path.exists(path):
+        return None
+    fd, snap = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".snap-")
+    os.close(fd)
+    try:
+        _clone(path, snap)
+    except BaseException:
+        os.unlink(snap)
+        raise
+    return snap
+
+
+def restore(path: str, snap: str | None) -> None:
+    """Roll the blob back to snap and drop the snapshot."""
+    if snap is None:
+        return
+    try:
+        _clone(snap, path)
+    finally:
+        os.unlink(snap)
+
+
+def discard(snap: str | None) -> None:
+    if snap is not None:
+        os.unlink(snap)
@@ -0,0 +1,68 @@
+"""State-patch protocol for service scripts.
+
+A script may answer with "state_patch" instead of "state": a JSON merge
+patch (RFC 7396) against its current state. Keys set to null are removed,
+nested objects are merged, and everything else replaces the old value. So
+a service only echoes back what it changed.
+
+Services published with "state_file": true keep their state in
+data/services/<name>/state.json rather than in entity.json. Their payload
+carries "state_path" (and an empty "state") so the script can read the
+file lazily. The engine applies the returned patch in memory and appends
+it to state.log next to the snapshot, one JSON merge patch per line. When
+the log exists the payload names it as "state_log", and the script's
+state is the snapshot with those patches applied in order. The snapshot
+is rewritten, and the log dropped, only at the turn boundary, or before
+the next call when a script returned a full "state" instead of a patch.
+So a call that changes a few keys costs a few bytes to persist.
+"""
+from __future__ import annotations
+
+import json
+
+STATE_FILE = "state.json"
+STATE_LOG = "state.log"
+
+
+class StatePatch(dict):
+    """A merge patch returned by a script, as opposed to a full new state."""
+
+
+def merge_patch(target: dict, patch: dict) -> dict:
+    """Apply an RFC 7396 merge patch to target in place and return it."""
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict):
+            current = target.get(key)
+            target[key] = merge_patch(current if isinstance(current, dict) else {}, value)
+        else:
+            target[key] = value
+    return target
+
+
+def replay_log(state: dict, path: str) -> dict:
+    """Apply the merge patches in a state log to state, in place."""
+    with open(path) as f:
+        for line in f:
+            try:
+                patch = json.loads(line)
+            except json.JSONDecodeError:
+                break  # torn last line after a crash
+            merge_patch(state, patch)
+    return state
+
+
+def apply_state(state: dict, update: dict | None) -> tuple[dict, bool]:
+    """Apply a script's state update. Returns (state, changed).
+
+    `update` is what parse_service_output returned: None (no change), a
+    StatePatch (merged into state in place) or a full replacement dict.
+    """
+    if update is None:
+        return state, False
+    if isinstance(update, StatePatch):
+        if not update:
+            return state, False
+        return merge_patch(state, update), True
+    return update, True
@@ -0,0 +1,237 @@
+"""Optional SQLite storage backend (--storage sqlite).
+
+Engine state lives in data/state.db (WAL mode) instead of whole-file JSON
+rewrites: services indexed by name and provider, subscriptions by service
+and agent, peer-eval votes by round, and small documents (world, turns,
+grid) in a key/value table. The engine commits one transaction per
+processed command, so a crash never leaves half an action on disk.
+
+The files agents read (world.json, managed/services.json,
+managed/subscriptions.json) are still exported. A fresh database is seeded
+from the existing JSON files, so a JSON run can be switched over mid-way.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+STATE_DB = "state.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS services (
+    name TEXT PRIMARY KEY,
+    provider_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS services_provider ON services (provider_id);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    service TEXT NOT NULL,
+    agent_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (service, agent_id)
+);
+CREATE INDEX IF NOT EXISTS subscriptions_agent ON subscriptions (agent_id);
+CREATE TABLE IF NOT EXISTS votes (
+    round INTEGER NOT NULL,
+    voter_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (round, voter_id)
+);
+CREATE TABLE IF NOT EXISTS docs (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SqliteStore:
+    """Engine state for one data dir. Each thread gets its own connection;
+    WAL lets readers proceed while a command transaction is open."""
+
+    def __init__(self, data_dir: str) -> None:
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, STATE_DB)
+        self._local = threading.local()
+        os.makedirs(data_dir, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'imported'").fetchone() is None:
+            with self.transaction():
+                self._import_json()
+                conn.execute("INSERT INTO meta VALUES ('imported', '1')")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Group writes into one atomic commit. Nested calls join the outer one."""
+        conn = self._conn()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # -- services -----------------------------------------------------------
+
+    def load_services(self) -> list[dict]:
+        rows = self._conn().execute("SELECT data FROM services ORDER BY name")
+        return [json.loads(data) for (data,) in rows]
+
+    def put_services(self, entities: list[dict]) -> None:
+        self._conn().executemany(
+            "INSERT OR REPLACE INTO services VALUES (?, ?, ?)",
+            [(e["name"].lower(), e["provider_id"], json.dumps(e)) for e in entities],
+        )
+
+    def delete_service(self, name: str) -> None:
+        self._conn().execute("DELETE FROM services WHERE name = ?", (name.lower(),))
+
+    # -- subscriptions ------------------------------------------------------
+
+    def load_subscriptions(self) -> dict[str, list[str]]:
+        subs: dict[str, list[str]] = {}
+        rows = self._conn().execute("SELECT service, agent_id FROM subscriptions ORDER BY seq")
+        for service, agent_id in rows:
+            subs.setdefault(service, []).append(agent_id)
+        return subs
+
+    def replace_subscriptions(self, subs: dict[str, list[str]]) -> None:
+        with self.transaction():
+            conn = self._conn()
+            conn.execute("DELETE FROM subscriptions")
+            conn.executemany(
+                "INSERT INTO subscriptions VALUES (?, ?, ?)",
+                [(service, agent_id, seq)
+                 for seq, (service, agent_id) in enumerate(
+                     (s, a) for s, agents in subs.items() for a in agents)],
+            )
+
+    def add_subscription(self, service: str, agent_id: str) -> bool:
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO subscriptions "
+            "SELECT ?, ?, COALESCE(MAX(seq), -1) + 1 FROM subscriptions",
+            (service, agent_id),
+        )
+        return cur.rowcount > 0
+
+    def remove_subscription(self, service: str, agent_id: str) -> bool:
+        cur = self._conn().execute(
+            "DELETE FROM subscriptions WHERE service = ? AND agent_id = ?", (service, agent_id),
+        )
+        return cur.rowcount > 0
+
+    def is_subscribed(self, service: str, agent_id: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM subscriptions WHERE service = ? AND agent_id = ?", (service, agent_id),
+        ).fetchone()
+        return row is not None
+
+    # -- votes --------------------------------------------------------------
+
+    def load_votes(self, round_num: int) -> dict[str, dict]:
+        rows = self._conn().execute(
+            "SELECT voter_id, data FROM votes WHERE round = ? ORDER BY rowid", (round_num,),
+        )
+        return {voter_id: json.loads(data) for voter_id, data in rows}
+
+    def put_vote(self, round_num: int, voter_id: str, vote: dict) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO votes VALUES (?, ?, ?)", (round_num, voter_id, json.dumps(vote)),
+        )
+
+    # -- documents ----------------------------------------------------------
+
+    def get_doc(self, key: str) -> dict | None:
+        row = self._conn().execute("SELECT data FROM docs WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_doc(self, key: str, data: dict) -> None:
+        self._conn().execute("INSERT OR REPLACE INTO docs VALUES (?, ?)", (key, json.dumps(data)))
+
+    def delete_doc(self, key: str) -> None:
+        self._conn().execute("DELETE FROM docs WHERE key = ?", (key,))
+
+    # -- import -------------------------------------------------------------
+
+    def _import_json(self) -> None:
+        def read(*parts: str):
+            path = os.path.join(self.data_dir, *parts)
+            if not os.path.exists(path):
+                return None
+            with open(path) as f:
+                return json.load(f)
+
+        for key, parts in (("world", ("world.json",)), ("turns", ("turns.json",)),
+                           ("grid", ("grid", "grid_world.json"))):
+            data = read(*parts)
+            if data is not None:
+                self.put_doc(key, data)
+
+        svc_root = os.path.join(self.data_dir, "services")
+        if os.path.isdir(svc_root):
+            entities = [read("services", name, "entity.json") for name in sorted(os.listdir(svc_root))]
+            self.put_services([e for e in entities if e])
+
+        self.replace_subscriptions(read("subscriptions.json") or {})
+        for round_key, round_votes in (read("eval", "votes.json") or {}).items():
+            for voter_id, vote in round_votes.items():
+                self.put_vote(int(round_key), voter_id, vote)
+
+
+_stores: dict[str, SqliteStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(data_dir: str) -> SqliteStore:
+    """Switch data_dir to the SQLite backend (idempotent)."""
+    key = os.path.abspath(data_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SqliteStore(data_dir)
+        return store
+
+
+def get_store(data_dir: str) -> SqliteStore | None:
+    """The SQLite store for data_dir, or None when it uses JSON files."""
+    return _stores.get(os.path.abspath(data_dir))
+
+
+def has_store(data_dir: str) -> bool:
+    return os.path.exists(os.path.join(data_dir, STATE_DB))
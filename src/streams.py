@@ -0,0 +1,124 @@
+"""Single-pass consumers for CLI stream output (logs/streams/).
+
+Each consumer is fed stdout one line at a time while the CLI runs. It tees
+the line to the stream file and extracts what the engine needs (text, cost,
+token usage) on the fly, so memory stays bounded however long the session is.
+"""
+from __future__ import annotations
+
+import json
+from collections import deque
+
+from .config import MODEL_PRICING, DEFAULT_PRICING
+
+MAX_TEXT_CHARS = 64_000
+
+
+class _Tail:
+    """Keep the last `limit` characters of appended parts."""
+
+    def __init__(self, limit: int = MAX_TEXT_CHARS) -> None:
+        self.limit = limit
+        self.parts: deque[str] = deque()
+        self.size = 0
+
+    def append(self, part: str) -> None:
+        self.parts.append(part)
+        self.size += len(part)
+        while self.size > self.limit and len(self.parts) > 1:
+            self.size -= len(self.parts.popleft())
+
+    def join(self, sep: str = "") -> str:
+        return sep.join(self.parts)[-self.limit:]
+
+    def __bool__(self) -> bool:
+        return bool(self.parts)
+
+
+class StreamConsumer:
+    """Tee stdout lines to a stream file. Subclasses parse each JSON line."""
+
+    def __init__(self, stream_file: str) -> None:
+        self.stream_file = stream_file
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._raw = _Tail()
+        self._file = open(stream_file, "w")
+
+    def __enter__(self) -> StreamConsumer:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def feed(self, line: str) -> None:
+        self._file.write(line)
+        self._file.flush()
+        self._raw.append(line)
+        if not line.strip():
+            return
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        if isinstance(obj, dict):
+            try:
+                self._parse(obj)
+            except (AttributeError, ValueError, TypeError):
+                pass
+
+    def _parse(self, obj: dict) -> None:
+        raise NotImplementedError
+
+
+class ClaudeStream(StreamConsumer):
+    """`claude -p --output-format stream-json`: assistant text, final result, cost, usage."""
+
+    def __init__(self, stream_file: str) -> None:
+        super().__init__(stream_file)
+        self.cost_usd = 0.0
+        self._text = _Tail()
+        self._has_result = False
+
+    def _parse(self, obj: dict) -> None:
+        # assistant message with text content
+        if obj.get("type") == "assistant" and "message" in obj:
+            for block in obj["message"].get("content", []):
+                if block.get("type") == "text":
+                    self._text.append(block["text"])
+        # result message
+        elif obj.get("type") == "result":
+            if obj.get("result"):
+                self._text.append(obj["result"])
+            if not self._has_result:
+                self._has_result = True
+                self.cost_usd = float(obj.get("total_cost_usd", 0.0))
+                usage = obj.get("usage") or {}
+                self.input_tokens = int(usage.get("input_tokens", 0))
+                self.output_tokens = int(usage.get("output_tokens", 0))
+
+    @property
+    def text(self) -> str:
+        return self._text.join("\n") if self._text else self._raw.join()
+
+
+class CodexStream(StreamConsumer):
+    """`codex exec --json`: token usage summed over turns, priced per model."""
+
+    def __init__(self, stream_file: str, model: str) -> None:
+        super().__init__(stream_file)
+        self.model = model
+
+    def _parse(self, obj: dict) -> None:
+        if obj.get("type") == "turn.completed":
+            usage = obj.get("usage", {})
+            self.input_tokens += usage.get("input_tokens", 0)
+            self.output_tokens += usage.get("output_tokens", 0)
+
+    @property
+    def cost_usd(self) -> float:
+        input_price, output_price = MODEL_PRICING.get(self.model, DEFAULT_PRICING)
+        return (self.input_tokens * input_price + self.output_tokens * output_price) / 1_000_000
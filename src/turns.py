@@ -4,9 +4,11 @@ import random
 from dataclasses import dataclass, field, asdict
 
 from .types import WorldState
+from .store import get_store
 
 
 TURNS_FILE = "turns.json"
+STORE_KEY = "turns"
 
 
 @dataclass
@@ -27,6 +29,10 @@ class TurnState:
 
 
 def load_turns(data_dir: str) -> TurnState | None:
+    store = get_store(data_dir)
+    if store is not None:
+        data = store.get_doc(STORE_KEY)
+        return TurnState(**data) if data else None
     path = os.path.join(data_dir, TURNS_FILE)
     if not os.path.exists(path):
         return None
@@ -36,12 +42,20 @@ def load_turns(data_dir: str) -> TurnState | None:
 
 
 def save_turns(turns: TurnState, data_dir: str) -> None:
+    store = get_store(data_dir)
+    if store is not None:
+        store.put_doc(STORE_KEY, asdict(turns))
+        return
     path = os.path.join(data_dir, TURNS_FILE)
     with open(path, "w") as f:
         json.dump(asdict(turns), f, indent=2)
 
 
 def delete_turns(data_dir: str) -> None:
+    store = get_store(data_dir)
+    if store is not None:
+        store.delete_doc(STORE_KEY)
+        return
     path = os.path.join(data_dir, TURNS_FILE)
     try:
         os.unlink(path)
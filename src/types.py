@@ -28,6 +28,12 @@ class PublishServiceRequest:
     subscription_fee: float = 0.0
     hooks: list[str] = field(default_factory=list)
     upgradeable: bool = True
+    persistent: bool = False
+    limits: dict = field(default_factory=dict)
+    state_file: bool = False
+    state_blob_mb: int = 0
+    batch: bool = False
+    event_topics: list[str] = field(default_factory=list)
 
 
 @dataclass
@@ -112,6 +118,7 @@ class SimulationConfig:
     initial_agent_count: int = 8
     initial_energy: float = 8.0
     round_timeout: int = 900
+    round_deadline: int = 0
     concurrency: int = 4
     invoker: Literal["claude", "codex", "mixed"] = "mixed"
     dry_run: bool = False
@@ -125,5 +132,8 @@ class SimulationConfig:
     base_metabolism: float = 1.5
     claude_model: str = "sonnet"
     codex_model: str = "gpt-5.3-codex"
+    eval_mode: Literal["serial", "parallel", "batch"] = "serial"
+    pipeline: bool = False
+    storage: Literal["json", "sqlite"] = "json"
     spontaneous_spawn_energy: float = 10.0
     designed_spawn_energy: float = 16.0
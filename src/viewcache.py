@@ -0,0 +1,125 @@
+"""Result cache for read-only `view` service calls.
+
+A view runs the script with trigger "view" and discards effects and state,
+so its output depends only on the script, the service state and the
+request. Results are cached under (script path, script hash, state hash,
+caller, pool energy, input, round) with LRU eviction bounded by entry count
+and total output size. A hit skips the subprocess entirely.
+
+save_entity drops a service's entries whose state no longer matches, and
+install_script / delete_entity drop all of them. Persistent services are
+never cached: their worker may keep state of its own between requests.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+MAX_ENTRIES = 1024
+MAX_BYTES = 8 * 1024 * 1024
+
+
+def state_hash(state: dict) -> str:
+    canonical = json.dumps(state, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ViewCache:
+    """LRU map from view keys to script output. Thread-safe (prefetch_views
+    looks results up from its worker threads)."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, str] = OrderedDict()
+        self._bytes = 0
+        self._script_hashes: dict[str, tuple[int, str]] = {}
+        self._lock = threading.Lock()
+
+    def script_hash(self, script_path: str) -> str | None:
+        try:
+            mtime = os.stat(script_path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._script_hashes.get(script_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(script_path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+        with self._lock:
+            self._script_hashes[script_path] = (mtime, digest)
+        return digest
+
+    def key(
+        self, script_path: str, state: dict, caller_id: str, pool_energy: float,
+        input_text: str, round_num: int,
+    ) -> tuple | None:
+        """Cache key for one view call, or None if the script can't be read."""
+        digest = self.script_hash(script_path)
+        if digest is None:
+            return None
+        return (script_path, digest, state_hash(state), caller_id, pool_energy, input_text, round_num)
+
+    def get(self, key: tuple) -> str | None:
+        with self._lock:
+            output = self._entries.get(key)
+            if output is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return output
+
+    def put(self, key: tuple, output: str) -> None:
+        size = len(output)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = output
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def invalidate(self, service_dir: str, state: dict | None = None) -> None:
+        """Drop entries for scripts in service_dir. With `state`, keep the
+        ones computed against that exact state."""
+        prefix = service_dir.rstrip(os.sep) + os.sep
+        with self._lock:
+            stale = [k for k in self._entries if k[0].startswith(prefix)]
+        # Only hash the state when there is something to compare it with.
+        keep = state_hash(state) if state is not None and stale else None
+        with self._lock:
+            for key in stale:
+                if key[2] != keep and key in self._entries:
+                    self._bytes -= len(self._entries.pop(key))
+            if state is None:
+                for path in [p for p in self._script_hashes if p.startswith(prefix)]:
+                    del self._script_hashes[path]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._script_hashes.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._entries), "bytes": self._bytes}
+
+
+view_cache = ViewCache()
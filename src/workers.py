@@ -0,0 +1,234 @@
+"""Long-lived workers for persistent services ("persistent": true at publish).
+
+Instead of one process per call, a persistent service's script is started
+once and kept running. Each request is the usual run_service_script payload
+as one JSON line on stdin; the script answers with one line on stdout (the
+same text it would print in one-shot mode). SYSTEMS_WORKER=1 is set in its
+environment so a script can support both modes.
+
+Workers are keyed by script path. A worker is replaced when its script
+changes, when it has served MAX_REQUESTS requests, when it dies or misses a
+request deadline, and it is closed after IDLE_TIMEOUT seconds without use.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import resource
+import selectors
+import signal
+import subprocess
+import threading
+import time
+
+IDLE_TIMEOUT = 300
+MAX_REQUESTS = 1000
+WORKER_ENV = "SYSTEMS_WORKER"
+
+
+def _proc_cpu_seconds(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rpartition(")")[2].split()
+    except OSError:
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _proc_peak_rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class ServiceWorker:
+    """One running service script. Requests are serialized by `lock`."""
+
+    def __init__(self, script_path: str, rlimits: list[tuple[int, int, int]] = ()) -> None:
+        self.script_path = script_path
+        self.mtime = os.stat(script_path).st_mtime_ns
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.last_used = time.monotonic()
+        self.closed = False
+        self._buf = b""
+        self.proc = subprocess.Popen(
+            [script_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+            env={**os.environ, WORKER_ENV: "1"},
+            start_new_session=True,
+        )
+        os.set_blocking(self.proc.stdin.fileno(), False)
+        for res, soft, hard in rlimits:
+            try:
+                resource.prlimit(self.proc.pid, res, (soft, hard))
+            except (ProcessLookupError, PermissionError, ValueError):
+                pass
+
+    def usable(self) -> bool:
+        if self.closed or self.proc.poll() is not None or self.requests >= MAX_REQUESTS:
+            return False
+        try:
+            return os.stat(self.script_path).st_mtime_ns == self.mtime
+        except OSError:
+            return False
+
+    def request(self, payload: str, timeout: float, max_output: int) -> tuple[str, bool, bool, float, int]:
+        """Send one request and wait for its reply line.
+
+        Returns (output, success, truncated, cpu_seconds, max_rss_kb), where
+        cpu_seconds is what the worker used during this request. A reply
+        longer than max_output is cut off and the worker is closed, since the
+        rest of the line would otherwise be read as the next reply.
+        """
+        if self.closed:
+            return "ERROR: persistent worker was recycled", False, False, 0.0, 0
+        cpu_before = _proc_cpu_seconds(self.proc.pid)
+        try:
+            output, success, truncated = self._request(payload, timeout, max_output)
+        finally:
+            cpu = max(0.0, _proc_cpu_seconds(self.proc.pid) - cpu_before)
+            rss = _proc_peak_rss_kb(self.proc.pid)
+        return output, success, truncated, cpu, rss
+
+    def _request(self, payload: str, timeout: float, max_output: int) -> tuple[str, bool, bool]:
+        self.requests += 1
+        self.last_used = time.monotonic()
+        deadline = self.last_used + timeout
+        try:
+            self._write_all((payload + "\n").encode(), deadline)
+            line, truncated = self._read_line(deadline, max_output)
+        except TimeoutError:
+            self.close(kill=True)
+            return f"ERROR: script timed out ({timeout}s limit)", False, False
+        except (BrokenPipeError, ConnectionResetError, EOFError):
+            self.close()
+            return "ERROR: persistent worker exited", False, False
+        finally:
+            self.last_used = time.monotonic()
+        if truncated:
+            self.close(kill=True)
+        output = line.decode(errors="replace").rstrip("\r")
+        return output if output else "(no output)", True, truncated
+
+    def _write_all(self, data: bytes, deadline: float) -> None:
+        fd = self.proc.stdin.fileno()
+        view = memoryview(data)
+        with selectors.DefaultSelector() as sel:
+            sel.register(fd, selectors.EVENT_WRITE)
+            while view:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError
+                if sel.select(remaining):
+                    try:
+                        view = view[os.write(fd, view):]
+                    except BlockingIOError:
+                        pass
+
+    def _read_line(self, deadline: float, max_output: int) -> tuple[bytes, bool]:
+        """Read up to the next newline. Stops after max_output bytes (truncated=True)."""
+        fd = self.proc.stdout.fileno()
+        kept = b""
+        with selectors.DefaultSelector() as sel:
+            sel.register(fd, selectors.EVENT_READ)
+            while True:
+                line, nl, rest = self._buf.partition(b"\n")
+                kept += line
+                if len(kept) > max_output:
+                    return kept[:max_output], True
+                if nl:
+                    self._buf = rest
+                    return kept, False
+                self._buf = b""
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError
+                if not sel.select(remaining):
+                    continue
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise EOFError
+                self._buf = chunk
+
+    def close(self, kill: bool = False) -> None:
+        """Close stdin and give the script a second to exit, or kill it now."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        if not kill:
+            try:
+                self.proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                kill = True
+        if kill:
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            self.proc.wait()
+        self.proc.stdout.close()
+
+
+_workers: dict[str, ServiceWorker] = {}
+_workers_lock = threading.Lock()
+
+
+def request_worker(
+    script_path: str, payload: str, timeout: float, max_output: int,
+    rlimits: list[tuple[int, int, int]] = (),
+) -> tuple[str, bool, bool, float, int]:
+    """Route one request to the persistent worker for script_path.
+
+    Returns (output, success, truncated, cpu_seconds, max_rss_kb). rlimits
+    are applied when a worker is started.
+    """
+    evict_idle_workers()
+    try:
+        with _workers_lock:
+            worker = _workers.get(script_path)
+            if worker is None or not worker.usable():
+                if worker is not None:
+                    worker.close()
+                worker = _workers[script_path] = ServiceWorker(script_path, rlimits)
+    except OSError as e:
+        return f"ERROR: {str(e)[:200]}", False, False, 0.0, 0
+    with worker.lock:
+        return worker.request(payload, timeout, max_output)
+
+
+def evict_idle_workers(idle_timeout: float = IDLE_TIMEOUT) -> None:
+    cutoff = time.monotonic() - idle_timeout
+    with _workers_lock:
+        for path, worker in list(_workers.items()):
+            if worker.last_used < cutoff and worker.lock.acquire(blocking=False):
+                try:
+                    worker.close()
+                finally:
+                    worker.lock.release()
+                del _workers[path]
+
+
+def shutdown_workers() -> None:
+    """Close every worker (end of simulation, process exit)."""
+    with _workers_lock:
+        workers = list(_workers.values())
+        _workers.clear()
+    for worker in workers:
+        with worker.lock:
+            worker.close()
+
+
+atexit.register(shutdown_workers)
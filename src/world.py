@@ -4,6 +4,9 @@ from dataclasses import asdict
 
 from .types import Agent, SimulationConfig, WorldState
 from .config import get_agent_name, resolve_model, default_model
+from .store import get_store
+
+STORE_KEY = "world"
 
 
 def create_world(config: SimulationConfig) -> WorldState:
@@ -42,11 +45,17 @@ def create_world(config: SimulationConfig) -> WorldState:
 
 
 def load_world(data_dir: str) -> WorldState | None:
-    path = os.path.join(data_dir, "world.json")
-    if not os.path.exists(path):
-        return None
-    with open(path) as f:
-        data = json.load(f)
+    store = get_store(data_dir)
+    if store is not None:
+        data = store.get_doc(STORE_KEY)
+        if data is None:
+            return None
+    else:
+        path = os.path.join(data_dir, "world.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
     agents: list[Agent] = []
     for a in data["agents"]:
         if "model" not in a:
@@ -56,10 +65,8 @@ def load_world(data_dir: str) -> WorldState | None:
     return WorldState(round=data["round"], agents=agents)
 
 
-def save_world(world: WorldState, data_dir: str) -> None:
-    os.makedirs(data_dir, exist_ok=True)
-    path = os.path.join(data_dir, "world.json")
-    data = {
+def world_data(world: WorldState) -> dict:
+    return {
         "round": world.round,
         "agents": [
             {"id": a.id, "name": a.name, "energy": a.energy,
@@ -67,6 +74,16 @@ def save_world(world: WorldState, data_dir: str) -> None:
             for a in world.agents
         ],
     }
+
+
+def save_world(world: WorldState, data_dir: str) -> None:
+    """Persist the world. world.json is always written: the designer reads it."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, "world.json")
+    data = world_data(world)
+    store = get_store(data_dir)
+    if store is not None:
+        store.put_doc(STORE_KEY, data)
     with open(path, "w") as f:
         json.dump(data, f, indent=2)
 
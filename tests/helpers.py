@@ -0,0 +1,42 @@
+"""Builders shared by the test modules."""
+import os
+import stat
+import tempfile
+
+from src.services import Service
+from src.types import Agent, WorldState
+
+
+def make_agent(**overrides) -> Agent:
+    defaults = dict(
+        id="agent-0",
+        name="Alpha",
+        energy=20,
+        alive=True,
+        age=0,
+        invoker="claude",
+    )
+    defaults.update(overrides)
+    return Agent(**defaults)
+
+
+def make_world(agents: list[Agent]) -> WorldState:
+    return WorldState(round=1, agents=agents)
+
+
+def make_service(**overrides) -> Service:
+    defaults = dict(
+        name="Echo", provider_id="agent-0", provider_name="Alpha",
+        description="echo", price=1.0, script="echo.py", round_published=1,
+    )
+    defaults.update(overrides)
+    return Service(**defaults)
+
+
+def write_script(source: str) -> str:
+    """Write an executable script to a fresh temp dir and return its path."""
+    path = os.path.join(tempfile.mkdtemp(), "svc.py")
+    with open(path, "w") as f:
+        f.write(source)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
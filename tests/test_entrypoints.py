@@ -0,0 +1,18 @@
+import importlib
+import os
+import subprocess
+import sys
+
+
+class TestEntryPoints:
+    def test_cli_modules_import(self):
+        for name in ("src.commands", "src.orchestrator", "src.__main__"):
+            importlib.import_module(name)
+
+    def test_cli_help_runs(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run(
+            [sys.executable, "-m", "src", "--help"], cwd=root, capture_output=True, text=True, timeout=60,
+        )
+        assert result.returncode == 0, result.stderr
+        assert "--eval-mode" in result.stdout
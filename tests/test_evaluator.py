@@ -0,0 +1,60 @@
+import json
+import os
+import re
+import tempfile
+
+from src import evaluator
+from src.evaluator import EVAL_AXES, BUDGET_PER_AXIS, evaluate_round
+from src.launcher import LaunchResult
+from src.types import Agent, SimulationConfig, WorldState
+
+
+def make_world() -> WorldState:
+    agents = [
+        Agent(id=f"agent-{i}", name=name, energy=5, alive=True, age=0, invoker="claude")
+        for i, name in enumerate(["Alpha", "Beta"])
+    ]
+    return WorldState(round=1, agents=agents)
+
+
+def fake_launch(write_rewards):
+    """Stand-in for launcher.launch that writes rewards.json where the prompt asks."""
+    calls = []
+
+    def launch(argv, prompt, timeout, cwd=None, on_line=None, label=""):
+        calls.append(label.removeprefix("eval:"))
+        output_dir = re.search(r"Write a JSON file to (\S+)/rewards\.json", prompt).group(1)
+        with open(os.path.join(output_dir, "rewards.json"), "w") as f:
+            json.dump(write_rewards(prompt), f)
+        return LaunchResult(returncode=0)
+
+    return launch, calls
+
+
+class TestEvaluateRound:
+    def _config(self, mode: str) -> SimulationConfig:
+        tmp = tempfile.mkdtemp()
+        return SimulationConfig(eval_mode=mode, private_dir=tmp, logs_dir=tmp)
+
+    def test_parallel_mode_calls_once_per_axis(self, monkeypatch):
+        launch, calls = fake_launch(lambda prompt: {"agent-0": 1.0})
+        monkeypatch.setattr(evaluator, "launch", launch)
+        world = make_world()
+
+        events = evaluate_round(world, self._config("parallel"))
+
+        assert sorted(calls) == sorted(a["name"] for a in EVAL_AXES)
+        assert [e.details["axis"] for e in events] == [a["name"] for a in EVAL_AXES]
+        assert world.agents[0].energy == 5 + len(EVAL_AXES)
+
+    def test_batch_mode_scores_all_axes_in_one_call_within_budget(self, monkeypatch):
+        rewards = {a["name"]: {"agent-0": BUDGET_PER_AXIS, "agent-1": 3.0} for a in EVAL_AXES}
+        launch, calls = fake_launch(lambda prompt: rewards)
+        monkeypatch.setattr(evaluator, "launch", launch)
+        world = make_world()
+
+        evaluate_round(world, self._config("batch"))
+
+        assert calls == ["batch"]
+        assert world.agents[0].energy == 5 + BUDGET_PER_AXIS * len(EVAL_AXES)
+        assert world.agents[1].energy == 5  # each axis budget already spent on Alpha
@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+
+from src import events
+from src.events import EventBus, append_event, clear_events, load_events, publish_events, take_pending_events
+
+
+def events_dir() -> str:
+    data_dir = tempfile.mkdtemp()
+    for sub in ("managed", "public"):
+        os.makedirs(os.path.join(data_dir, sub))
+    return data_dir
+
+
+class TestEventBus:
+    def test_snapshot_is_published_once_per_turn(self):
+        data_dir = events_dir()
+        clear_events(data_dir, 1)
+        append_event(data_dir, "Market", "trade", {"qty": 1}, 1)
+        append_event(data_dir, "Market", "trade", {"qty": 2}, 1)
+        assert load_events(data_dir) == []
+
+        publish_events(data_dir)
+        assert [e["data"]["qty"] for e in load_events(data_dir)] == [1, 2]
+        with open(os.path.join(data_dir, "public", "events.json")) as f:
+            assert len(json.load(f)) == 2
+
+    def test_quota_is_per_service(self):
+        data_dir = events_dir()
+        clear_events(data_dir, 1)
+        for _ in range(events.MAX_EVENTS_PER_SERVICE):
+            assert append_event(data_dir, "Noisy", "tick", {}, 1)
+        assert not append_event(data_dir, "Noisy", "tick", {}, 1)
+        assert append_event(data_dir, "Quiet", "tick", {}, 1)
+
+    def test_round_is_resumed_from_segment(self):
+        data_dir = events_dir()
+        clear_events(data_dir, 3)
+        append_event(data_dir, "Market", "trade", {}, 3)
+
+        fresh = EventBus(data_dir)  # e.g. the next --turn process
+        fresh.append("Market", "close", {}, 3)
+        fresh.publish()
+        assert [e["event"] for e in load_events(data_dir)] == ["trade", "close"]
+
+    def test_starting_a_round_prunes_older_segments(self):
+        data_dir = events_dir()
+        for round_num in (1, 2, 3):
+            clear_events(data_dir, round_num)
+            append_event(data_dir, "Market", "trade", {}, round_num)
+        assert os.listdir(os.path.join(data_dir, "events")) == ["round-3.jsonl"]
+
+    def test_undelivered_events_stay_pending_in_a_new_process(self):
+        data_dir = events_dir()
+        clear_events(data_dir, 2)
+        append_event(data_dir, "Market", "a", {}, 2)
+        append_event(data_dir, "Market", "b", {}, 2)
+        assert [e["event"] for e in take_pending_events(data_dir, 2)] == ["a", "b"]
+        append_event(data_dir, "Relay", "c", {}, 2)  # emitted by an on_event hook
+
+        fresh = EventBus(data_dir)  # the next --turn process
+        assert [e["event"] for e in fresh.take_pending(2)] == ["c"]
+        assert EventBus(data_dir).take_pending(2) == []
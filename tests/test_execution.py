@@ -0,0 +1,560 @@
+import json
+import os
+
+from src.execution import (
+    _group_calls, dispatch_events, dispatch_transfers, drain_hooks, execute_effects, prefetch_views,
+    process_unpublish_service, process_use_service, run_hooks, run_view, settle_batches, transfer_handler,
+)
+from src.events import append_event, clear_events, take_pending_events
+from src.physics import take_transfers, transfer_energy
+from src.services import (
+    ServiceRegistry, delete_entity, event_subscribers, find_service, flush_services, install_script,
+    save_entity,
+)
+from src.stateblob import create_blob
+from src.statepatch import merge_patch
+from src.types import UnpublishServiceRequest, UseServiceRequest
+from src.viewcache import ViewCache, view_cache
+from tests.helpers import make_agent, make_service, make_world, write_script
+
+VIEW_BODY = 'print(json.dumps({"output": payload["input"] + ":" + str(payload["state"].get("n", 0))}))'
+
+
+COUNTER = """#!/usr/bin/env python3
+import json, sys
+payload = json.load(sys.stdin)
+n = payload["state"].get("n", 0)
+if payload["trigger"] == "view":
+    print(json.dumps({"output": f"n={n}"}))
+else:
+    print(json.dumps({"output": "ok", "state": {"n": n + 1}}))
+"""
+VIEW_BODY_SCRIPT = "#!/usr/bin/env python3\nimport json, sys\npayload = json.load(sys.stdin)\n" + VIEW_BODY + "\n"
+
+
+def rendezvous(tmp_path, parties: int, body: str) -> str:
+    """Source of a script that waits until `parties` copies of it are running
+    at the same time, then runs `body`. A copy left waiting alone for 10s
+    fails, so the test sees overlap without timing anything."""
+    barrier = str(tmp_path / "barrier")
+    os.makedirs(barrier, exist_ok=True)
+    return f"""#!/usr/bin/env python3
+import json, os, sys, time
+payload = json.load(sys.stdin)
+open(os.path.join({barrier!r}, str(os.getpid())), "w").close()
+until = time.monotonic() + 10
+while len(os.listdir({barrier!r})) < {parties}:
+    if time.monotonic() > until:
+        sys.exit("ran alone")
+    time.sleep(0.01)
+{body}
+"""
+
+
+def setup_service(tmp_path, source, **overrides):
+    data_dir = str(tmp_path / "data")
+    private_dir = str(tmp_path / "private")
+    entity = make_service(script="svc.py", **overrides)
+    install_script(data_dir, entity.name, write_script(source))
+    save_entity(entity, data_dir)
+    return data_dir, private_dir
+
+
+class TestParallelViews:
+    def test_views_run_in_parallel_and_apply_in_order(self, tmp_path):
+        data_dir, private_dir = setup_service(tmp_path, rendezvous(tmp_path, 4, VIEW_BODY), name="Slow", state={"n": 7})
+        agent = make_agent()
+        os.makedirs(os.path.join(private_dir, agent.id))
+        world = make_world([agent])
+        requests = [UseServiceRequest(name="Slow", input=f"q{i}", view=True) for i in range(4)]
+
+        views = prefetch_views([(agent, r) for r in requests], world, data_dir)
+        assert [views[id(r)][1].output.strip() for r in requests] == [f'{{"output": "q{i}:7"}}' for i in range(4)]
+
+        events = []
+        for r in requests:
+            events.extend(process_use_service(agent, r, world, data_dir, private_dir, prefetched=views[id(r)]))
+        assert [e.details["success"] for e in events] == [True] * 4
+        with open(os.path.join(private_dir, agent.id, "service_results", "Slow.txt")) as f:
+            assert f.read() == "q3:7"
+
+    def test_non_view_requests_are_not_prefetched(self, tmp_path):
+        data_dir, _ = setup_service(tmp_path, rendezvous(tmp_path, 1, VIEW_BODY), name="Slow")
+        agent = make_agent()
+        batch = [
+            (agent, UseServiceRequest(name="Slow", input="call")),
+            (agent, UseServiceRequest(name="Missing", input="", view=True)),
+            (agent, UseServiceRequest(name="transfer", input="", view=True)),
+        ]
+        assert prefetch_views(batch, make_world([agent]), data_dir) == {}
+
+    def test_view_after_a_call_that_changed_the_service_runs_again(self, tmp_path):
+        data_dir, private_dir = setup_service(tmp_path, COUNTER, name="Counter", state={"n": 0})
+        agent = make_agent()
+        os.makedirs(os.path.join(private_dir, agent.id))
+        world = make_world([agent])
+        requests = [UseServiceRequest(name="Counter", input="BUY"),
+                    UseServiceRequest(name="Counter", input="STATUS", view=True)]
+
+        views = prefetch_views([(agent, r) for r in requests], world, data_dir)
+        for r in requests:
+            process_use_service(agent, r, world, data_dir, private_dir, prefetched=views.get(id(r)))
+        with open(os.path.join(private_dir, agent.id, "service_results", "Counter.txt")) as f:
+            assert f.read() == "n=1"
+
+    def test_view_of_a_republished_service_runs_the_new_script(self, tmp_path):
+        data_dir, private_dir = setup_service(tmp_path, COUNTER, name="Counter", state={"n": 5})
+        agent = make_agent()
+        os.makedirs(os.path.join(private_dir, agent.id))
+        world = make_world([agent])
+        request = UseServiceRequest(name="Counter", input="STATUS", view=True)
+
+        views = prefetch_views([(agent, request)], world, data_dir)
+        delete_entity("Counter", data_dir)
+        setup_service(tmp_path, VIEW_BODY_SCRIPT, name="Counter", state={"n": 9})
+        process_use_service(agent, request, world, data_dir, private_dir, prefetched=views[id(request)])
+        with open(os.path.join(private_dir, agent.id, "service_results", "Counter.txt")) as f:
+            assert f.read() == "STATUS:9"
+
+
+COUNTING_VIEW = """#!/usr/bin/env python3
+import json, os, sys
+payload = json.load(sys.stdin)
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "runs"), "a") as f:
+    f.write("x")
+print(json.dumps({"output": payload["input"] + ":" + str(payload["state"].get("n", 0))}))
+"""
+
+
+class TestViewCache:
+    def setup_method(self):
+        view_cache.clear()
+
+    def view(self, data_dir, agent, text="STATUS"):
+        entity = find_service("Counted", data_dir)
+        return run_view(agent, UseServiceRequest(name="Counted", input=text, view=True), entity,
+                        make_world([agent]), data_dir)
+
+    def runs(self, data_dir):
+        with open(os.path.join(data_dir, "services", "counted", "runs")) as f:
+            return len(f.read())
+
+    def test_repeated_view_is_served_from_cache(self, tmp_path):
+        data_dir, _ = setup_service(tmp_path, COUNTING_VIEW, name="Counted", state={"n": 1})
+        agent = make_agent()
+        first = self.view(data_dir, agent)
+        second = self.view(data_dir, agent)
+        assert first.output == second.output
+        assert self.runs(data_dir) == 1
+        assert view_cache.stats()["hits"] == 1
+        self.view(data_dir, agent, text="LIST")
+        assert self.runs(data_dir) == 2
+
+    def test_state_change_and_reinstall_invalidate(self, tmp_path):
+        data_dir, _ = setup_service(tmp_path, COUNTING_VIEW, name="Counted", state={"n": 1})
+        agent = make_agent()
+        self.view(data_dir, agent)
+
+        entity = find_service("Counted", data_dir)
+        entity.state = {"n": 2}
+        save_entity(entity, data_dir)
+        assert view_cache.stats()["entries"] == 0
+        assert '"STATUS:2"' in self.view(data_dir, agent).output
+
+        install_script(data_dir, "Counted", write_script(COUNTING_VIEW.replace('+ ":" +', '+ "=" +')))
+        assert '"STATUS=2"' in self.view(data_dir, agent).output
+        assert self.runs(data_dir) == 3
+
+    def test_lru_eviction_respects_limits(self):
+        cache = ViewCache(max_entries=2, max_bytes=10)
+        cache.put(("a",), "1234")
+        cache.put(("b",), "1234")
+        cache.get(("a",))
+        cache.put(("c",), "1234")
+        assert cache.get(("b",)) is None
+        assert cache.get(("a",)) == "1234"
+        cache.put(("d",), "12345678")
+        assert cache.stats()["bytes"] <= 10
+
+
+PATCHING = """#!/usr/bin/env python3
+import json, sys
+
+def merge(target, patch):
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict):
+            target[key] = merge(target.get(key) if isinstance(target.get(key), dict) else {}, value)
+        else:
+            target[key] = value
+    return target
+
+payload = json.load(sys.stdin)
+if "state_path" in payload:
+    with open(payload["state_path"]) as f:
+        state = json.load(f)
+    if "state_log" in payload:
+        with open(payload["state_log"]) as f:
+            for line in f:
+                merge(state, json.loads(line))
+else:
+    state = payload["state"]
+n = state["counter"]["n"]
+print(json.dumps({"output": str(n), "state_patch": {"counter": {"n": n + 1}, "drop": None}}))
+"""
+
+
+class TestStatePatch:
+    def test_merge_patch(self):
+        state = {"a": 1, "b": {"c": 2, "d": 3}, "e": [1]}
+        merge_patch(state, {"a": None, "b": {"c": 5, "d": None}, "e": [2], "f": {"g": None, "h": 1}})
+        assert state == {"b": {"c": 5}, "e": [2], "f": {"h": 1}}
+
+    def call(self, data_dir, private_dir):
+        agent = make_agent()
+        os.makedirs(os.path.join(private_dir, agent.id), exist_ok=True)
+        return process_use_service(
+            agent, UseServiceRequest(name="Counter", input=""), make_world([agent]), data_dir, private_dir,
+        )
+
+    def test_inline_service_applies_patch(self, tmp_path):
+        data_dir, private_dir = setup_service(
+            tmp_path, PATCHING, name="Counter", state={"counter": {"n": 1}, "drop": 1, "keep": True},
+        )
+        self.call(data_dir, private_dir)
+        assert find_service("Counter", data_dir).state == {"counter": {"n": 2}, "keep": True}
+
+    def test_state_file_service_reads_and_persists_state_file(self, tmp_path):
+        data_dir, private_dir = setup_service(
+            tmp_path, PATCHING, name="Counter", state={"counter": {"n": 1}}, state_file=True,
+        )
+        self.call(data_dir, private_dir)
+        self.call(data_dir, private_dir)
+        flush_services(data_dir)
+
+        svc_dir = os.path.join(data_dir, "services", "counter")
+        with open(os.path.join(svc_dir, "entity.json")) as f:
+            assert "state" not in json.load(f)
+        with open(os.path.join(svc_dir, "state.json")) as f:
+            assert json.load(f) == {"counter": {"n": 3}}
+        assert ServiceRegistry(data_dir).get("Counter").state == {"counter": {"n": 3}}
+
+    def test_patches_are_logged_until_flush(self, tmp_path):
+        data_dir, private_dir = setup_service(
+            tmp_path, PATCHING, name="Counter", state={"counter": {"n": 1}, "big": "x" * 10000}, state_file=True,
+        )
+        svc_dir = os.path.join(data_dir, "services", "counter")
+        self.call(data_dir, private_dir)
+        flush_services(data_dir)
+        with open(os.path.join(svc_dir, "state.json")) as f:
+            snapshot = f.read()
+        self.call(data_dir, private_dir)
+        self.call(data_dir, private_dir)
+
+        with open(os.path.join(svc_dir, "state.json")) as f:
+            assert f.read() == snapshot
+        with open(os.path.join(svc_dir, "state.log")) as f:
+            assert [json.loads(line)["counter"] for line in f] == [{"n": 3}, {"n": 4}]
+        # A restart before the flush replays the log.
+        assert ServiceRegistry(data_dir).get("Counter").state["counter"] == {"n": 4}
+
+        flush_services(data_dir)
+        assert not os.path.exists(os.path.join(svc_dir, "state.log"))
+        with open(os.path.join(svc_dir, "state.json")) as f:
+            assert json.load(f)["counter"] == {"n": 4}
+
+
+BLOB_WRITER = """#!/usr/bin/env python3
+import json, mmap, sys
+payload = json.load(sys.stdin)
+blob = payload["state_blob"]
+with open(blob["path"], "r+b") as f:
+    f.truncate(16)
+    with mmap.mmap(f.fileno(), 16) as m:
+        m[0:4] = payload["input"][:4].encode().ljust(4, b"-")
+if payload["input"] == "fail":
+    sys.exit(1)
+if payload["input"] == "grow":
+    with open(blob["path"], "ab") as f:
+        f.write(b"x" * (blob["max_bytes"] + 1))
+print(json.dumps({"output": "ok"}))
+"""
+
+
+class TestStateBlob:
+    def call(self, data_dir, private_dir, text):
+        agent = make_agent()
+        os.makedirs(os.path.join(private_dir, agent.id), exist_ok=True)
+        return process_use_service(
+            agent, UseServiceRequest(name="Book", input=text), make_world([agent]), data_dir, private_dir,
+        )
+
+    def blob(self, data_dir):
+        with open(os.path.join(data_dir, "services", "book", "state.bin"), "rb") as f:
+            return f.read()
+
+    def test_blob_is_kept_on_success_and_rolled_back_on_failure(self, tmp_path):
+        data_dir, private_dir = setup_service(tmp_path, BLOB_WRITER, name="Book", state_blob_mb=1)
+        create_blob(os.path.join(data_dir, "services", "book"))
+
+        assert self.call(data_dir, private_dir, "good")[0].details["success"] is True
+        assert self.blob(data_dir)[:4] == b"good"
+
+        assert self.call(data_dir, private_dir, "fail")[0].details["success"] is False
+        assert self.blob(data_dir)[:4] == b"good"
+
+        events = self.call(data_dir, private_dir, "grow")
+        assert events[0].details["success"] is False
+        assert "exceeds 1MB" in events[0].details["error"]
+        assert self.blob(data_dir) == b"good" + bytes(12)
+        assert [n for n in os.listdir(os.path.join(data_dir, "services", "book")) if n.startswith(".snap")] == []
+
+
+BATCH = """#!/usr/bin/env python3
+import json, os, sys
+payload = json.load(sys.stdin)
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "runs"), "a") as f:
+    f.write("x")
+requests = payload["context"]["requests"]
+if any(r["input"] == "crash" for r in requests):
+    sys.exit(1)
+outputs = [{"output": "echo " + r["input"]} for r in requests if r["input"] != "skip"]
+print(json.dumps({"outputs": outputs, "state_patch": {"seen": len(requests)}}))
+"""
+
+
+class TestBatchServices:
+    def setup(self, tmp_path):
+        data_dir, private_dir = setup_service(tmp_path, BATCH, name="Batcher", price=1.0, batch=True)
+        provider = make_agent(id="agent-0", name="Alpha", energy=0)
+        callers = [make_agent(id=f"agent-{i}", name=f"C{i}", energy=5) for i in (1, 2, 3)]
+        for agent in callers:
+            os.makedirs(os.path.join(private_dir, agent.id))
+        return data_dir, private_dir, provider, callers, make_world([provider] + callers)
+
+    def queue(self, data_dir, private_dir, world, callers, inputs):
+        for agent, text in zip(callers, inputs):
+            events = process_use_service(agent, UseServiceRequest(name="Batcher", input=text), world, data_dir, private_dir)
+            assert events[0].details["queued"] is True
+
+    def test_one_run_settles_every_caller(self, tmp_path):
+        data_dir, private_dir, provider, callers, world = self.setup(tmp_path)
+        self.queue(data_dir, private_dir, world, callers, ["a", "b", "c"])
+        assert [a.energy for a in callers] == [4, 4, 4]
+
+        events = settle_batches(world, data_dir, private_dir)
+        with open(os.path.join(data_dir, "services", "batcher", "runs")) as f:
+            assert f.read() == "x"
+        assert [e.details["success"] for e in events if e.type == "use_service"] == [True] * 3
+        assert provider.energy == 3
+        entity = find_service("Batcher", data_dir)
+        assert entity.state == {"seen": 3} and entity.call_count == 3 and entity.batch_queue == []
+        with open(os.path.join(private_dir, "agent-2", "service_results", "Batcher.txt")) as f:
+            assert f.read() == "echo b"
+
+    def test_missing_output_and_failed_run_are_refunded(self, tmp_path):
+        data_dir, private_dir, provider, callers, world = self.setup(tmp_path)
+        self.queue(data_dir, private_dir, world, callers, ["a", "b", "skip"])
+        settle_batches(world, data_dir, private_dir)
+        assert [a.energy for a in callers] == [4, 4, 5]
+
+        self.queue(data_dir, private_dir, world, callers[:2], ["crash", "b"])
+        events = settle_batches(world, data_dir, private_dir)
+        assert [a.energy for a in callers] == [4, 4, 5]
+        assert not any(e.details.get("success") for e in events)
+
+    def test_unpublish_refunds_queued_calls(self, tmp_path):
+        data_dir, private_dir, provider, callers, world = self.setup(tmp_path)
+        self.queue(data_dir, private_dir, world, callers[:2], ["a", "b"])
+        events = process_unpublish_service(provider, UnpublishServiceRequest(name="Batcher"), world, data_dir)
+
+        assert [a.energy for a in callers] == [5, 5, 5]
+        assert [e.details.get("error") for e in events] == ["service unpublished"] * 2 + [None]
+        assert find_service("Batcher", data_dir) is None
+        assert settle_batches(world, data_dir, private_dir) == []
+
+
+CALLEE_BODY = 'print(json.dumps({"output": payload["input"].upper()}))'
+
+
+class TestCallServiceFanOut:
+    def test_independent_calls_run_concurrently_and_merge_in_order(self, tmp_path):
+        callee = rendezvous(tmp_path, 2, CALLEE_BODY)  # only two of the three calls are affordable
+        data_dir, private_dir = setup_service(tmp_path, callee, name="S1", price=1.0)
+        for name in ("S2", "S3"):
+            install_script(data_dir, name, write_script(callee))
+            save_entity(make_service(name=name, script="svc.py", price=1.0), data_dir)
+        caller_service = make_service(name="Hub", energy=2.5)
+        agent = make_agent()
+        effects = [
+            {"type": "call_service", "name": name, "input": name.lower()}
+            for name in ("S3", "S1", "S2")
+        ]
+
+        events = execute_effects(effects, agent, caller_service, make_world([agent]), data_dir, private_dir)
+        assert all(e.details["success"] for e in events)
+
+        # Only two prices fit the pool: reserved in declaration order.
+        assert [e.details["service"] for e in events] == ["S3", "S1"]
+        assert caller_service.energy == 0.5
+        assert list(caller_service.state["_call_results"].items()) == [("S3", "S3"), ("S1", "S1")]
+
+    def test_branch_whose_target_an_earlier_branch_called_runs_again(self, tmp_path):
+        forward = """#!/usr/bin/env python3
+import json, sys
+payload = json.load(sys.stdin)
+state = payload["state"]
+state["n"] = state.get("n", 0) + 1
+effects = [{"type": "call_service", "name": state["forward"]}] if state.get("forward") else []
+print(json.dumps({"output": "ok", "state": state, "effects": effects}))
+"""
+        data_dir, private_dir = setup_service(tmp_path, forward, name="A", price=1.0, energy=5,
+                                              state={"forward": "B"})
+        install_script(data_dir, "B", write_script(forward))
+        save_entity(make_service(name="B", script="svc.py", price=1.0), data_dir)
+        agent = make_agent()
+        effects = [{"type": "call_service", "name": "A"}, {"type": "call_service", "name": "B"}]
+
+        execute_effects(effects, agent, make_service(name="Hub", energy=5), make_world([agent]),
+                        data_dir, private_dir)
+
+        assert find_service("B", data_dir).state == {"n": 2}
+        assert find_service("A", data_dir).state["n"] == 1
+
+    def test_repeated_target_starts_a_new_group(self):
+        effects = [
+            {"type": "call_service", "name": "A"}, {"type": "call_service", "name": "B"},
+            {"type": "call_service", "name": "a"}, {"type": "message"}, {"type": "call_service", "name": "C"},
+        ]
+        grouped = _group_calls(effects)
+        assert [len(g) if isinstance(g, list) else g["type"] for g in grouped] == [2, 1, "message", 1]
+
+
+LISTENER = """#!/usr/bin/env python3
+import json, sys
+payload = json.load(sys.stdin)
+seen = payload["state"].get("seen", []) + [e["event"] for e in payload["context"]["events"]]
+print(json.dumps({"output": "ok", "state": {"seen": seen, "calls": payload["state"].get("calls", 0) + 1}}))
+"""
+
+
+class TestOnEventHooks:
+    def test_matching_events_are_delivered_in_one_batch(self, tmp_path):
+        data_dir, private_dir = setup_service(
+            tmp_path, LISTENER, name="Listener", hooks=["on_event"], event_topics=["trade.*", "close"],
+        )
+        world = make_world([make_agent()])
+        clear_events(data_dir, 1)
+        for name in ("trade.buy", "tick", "trade.sell", "close"):
+            append_event(data_dir, "Market", name, {}, 1)
+        append_event(data_dir, "Listener", "close", {}, 1)
+
+        dispatch_events(world, data_dir, private_dir)
+        dispatch_events(world, data_dir, private_dir)  # nothing new
+
+        assert find_service("Listener", data_dir).state == {"seen": ["trade.buy", "trade.sell", "close"], "calls": 1}
+
+    def test_topic_index_follows_registry(self, tmp_path):
+        data_dir, _ = setup_service(tmp_path, LISTENER, name="Listener", hooks=["on_event"], event_topics=["close"])
+        save_entity(make_service(name="Deaf", event_topics=["close"]), data_dir)
+        assert [e.name for e in event_subscribers("close", data_dir)] == ["Listener"]
+        delete_entity(data_dir, "Listener")
+        assert event_subscribers("close", data_dir) == []
+
+
+RELAY = """#!/usr/bin/env python3
+import json, sys
+payload = json.load(sys.stdin)
+state = payload["state"]
+state["seen"] = state.get("seen", []) + [e["event"] for e in payload["context"].get("events", [])]
+effects = [{"type": "emit", "name": state["emits"], "data": {}}] if state.get("emits") else []
+print(json.dumps({"output": "ok", "state": state, "effects": effects}))
+"""
+
+
+class TestDrainHooks:
+    def test_round_end_drains_a_pipeline_of_hooks(self, tmp_path):
+        setup_service(tmp_path, RELAY, name="Source", hooks=["on_round_end"], state={"emits": "a"})
+        setup_service(tmp_path, RELAY, name="Relay", hooks=["on_event"], event_topics=["a"], state={"emits": "b"})
+        data_dir, private_dir = setup_service(tmp_path, RELAY, name="Sink", hooks=["on_event"], event_topics=["b"])
+        world = make_world([make_agent()])
+        clear_events(data_dir, 1)
+
+        run_hooks("on_round_end", {"round": 1}, world, data_dir, private_dir)
+        drain_hooks(world, data_dir, private_dir)
+
+        assert find_service("Relay", data_dir).state["seen"] == ["a"]
+        assert find_service("Sink", data_dir).state["seen"] == ["b"]
+        assert take_pending_events(data_dir, 1) == []
+
+
+TRANSFER_LOG = """#!/usr/bin/env python3
+import json, sys
+payload = json.load(sys.stdin)
+runs = payload["state"].get("runs", []) + [[t["kind"] for t in payload["context"]["transfers"]]]
+print(json.dumps({"output": "ok", "state": {"runs": runs}}))
+"""
+
+
+class TestOnTransferHooks:
+    def test_transfers_are_journaled_and_delivered_once(self, tmp_path):
+        data_dir, private_dir = setup_service(tmp_path, TRANSFER_LOG, name="Ledger", hooks=["on_transfer"])
+        take_transfers()
+        alpha, beta = make_agent(), make_agent(id="agent-1", name="Beta")
+        world = make_world([alpha, beta])
+        payer = make_service(name="Payer", energy=5)
+
+        transfer_handler("agent-0", "Alpha", json.dumps({"to": "Beta", "amount": 2}), 1, None, data_dir, world, private_dir)
+        execute_effects([{"type": "transfer_to", "agent": "Beta", "amount": 1}], alpha, payer, world, data_dir, private_dir)
+        transfer_energy(alpha, payer, 1)  # plain price payment: not journaled
+
+        dispatch_transfers(world, data_dir, private_dir)
+        assert dispatch_transfers(world, data_dir, private_dir) == []
+        assert find_service("Ledger", data_dir).state == {"runs": [["transfer", "transfer_to"]]}
+
+
+HOOK_BODY = """print(json.dumps({"output": "ok", "state": {"round": payload["context"]["round"]},
+                  "effects": [{"type": "emit", "name": "tick", "data": {}}]}))"""
+
+
+class TestParallelHooks:
+    def test_hooks_run_in_parallel_and_apply_in_name_order(self, tmp_path):
+        for name in ("Gamma", "Alpha", "Beta"):
+            data_dir, private_dir = setup_service(
+                tmp_path, rendezvous(tmp_path, 3, HOOK_BODY), name=name, hooks=["on_round_end"],
+            )
+        world = make_world([make_agent()])
+        clear_events(data_dir, 1)
+
+        run_hooks("on_round_end", {"round": 1}, world, data_dir, private_dir)
+
+        assert [e["service"] for e in take_pending_events(data_dir, 1)] == ["Alpha", "Beta", "Gamma"]
+        for name in ("Alpha", "Beta", "Gamma"):
+            assert find_service(name, data_dir).state == {"round": 1}
+
+CALL_ON_HOOK = """#!/usr/bin/env python3
+import json, sys
+payload = json.load(sys.stdin)
+state = payload["state"]
+effects = []
+if payload["trigger"] == "on_round_end":
+    state["hooks"] = state.get("hooks", 0) + 1
+    if state.get("calls_out"):
+        effects = [{"type": "call_service", "name": state["calls_out"]}]
+else:
+    state["calls"] = state.get("calls", 0) + 1
+print(json.dumps({"output": "ok", "state": state, "effects": effects}))
+"""
+
+
+class TestHookConflicts:
+    def test_hook_reached_by_an_earlier_hooks_call_sees_that_call(self, tmp_path):
+        setup_service(tmp_path, CALL_ON_HOOK, name="Alpha", hooks=["on_round_end"],
+                      energy=5, state={"calls_out": "Beta"})
+        data_dir, private_dir = setup_service(tmp_path, CALL_ON_HOOK, name="Beta", hooks=["on_round_end"])
+
+        run_hooks("on_round_end", {"round": 1}, make_world([make_agent()]), data_dir, private_dir)
+
+        assert find_service("Beta", data_dir).state == {"calls": 1, "hooks": 1}
+        assert find_service("Alpha", data_dir).state["hooks"] == 1
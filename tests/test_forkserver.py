@@ -0,0 +1,80 @@
+import os
+import sys
+import tempfile
+
+from src import sandbox
+from src.forkserver import is_python_script
+from src.sandbox import parse_service_output, run_service_script
+from tests.helpers import write_script
+
+PY = f"#!{sys.executable}\n"  # resolves to the engine's interpreter, so it is fork-served
+ECHO = PY + """import json, os, sys
+req = json.load(sys.stdin)
+print(json.dumps({"output": req["input"], "state": {"pid": os.getpid(), "name": __name__}}))
+"""
+
+
+class TestForkserver:
+    def test_serves_only_shebangs_that_resolve_to_the_engine_interpreter(self, monkeypatch):
+        bin_dir = tempfile.mkdtemp()
+        os.symlink(sys.executable, os.path.join(bin_dir, "python3"))
+        monkeypatch.setenv("PATH", bin_dir)
+        assert is_python_script(write_script(PY))
+        assert is_python_script(write_script("#!/usr/bin/env python3\n"))
+        assert not is_python_script(write_script("#!/bin/sh\n"))
+        assert not is_python_script(write_script(f"#!{sys.executable} -u\n"))
+
+        venv = tempfile.mkdtemp()  # same binary, different site-packages
+        os.makedirs(os.path.join(venv, "bin"))
+        open(os.path.join(venv, "pyvenv.cfg"), "w").close()
+        os.symlink(sys.executable, os.path.join(venv, "bin", "python3"))
+        assert not is_python_script(write_script(f"#!{venv}/bin/python3\n"))
+
+    def test_other_python_interpreters_are_execd(self):
+        fake = os.path.join(tempfile.mkdtemp(), "python3")  # e.g. the system python, not the engine's
+        os.rename(write_script('#!/bin/sh\ncat >/dev/null\necho \'{"output": "other python"}\'\n'), fake)
+        path = write_script(f"#!{fake}\nprint('engine python')\n")
+        result = run_service_script(path, "agent-0", "Alpha", "", 1)
+        assert result.success and parse_service_output(result.output)[0] == "other python"
+
+    def test_runs_script_as_main_in_fresh_child(self):
+        path = write_script(ECHO)
+        first = run_service_script(path, "agent-0", "Alpha", "hello", 1)
+        second = run_service_script(path, "agent-0", "Alpha", "again", 1)
+        assert first.success and second.success
+        out1, _, state1 = parse_service_output(first.output)
+        out2, _, state2 = parse_service_output(second.output)
+        assert (out1, out2) == ("hello", "again")
+        assert state1["name"] == "__main__"
+        assert state1["pid"] != state2["pid"]
+
+    def test_reports_errors_like_exec(self):
+        path = write_script(PY + "import sys\nsys.stderr.write('bad input')\nsys.exit(3)\n")
+        result = run_service_script(path, "agent-0", "Alpha", "", 1)
+        assert (result.output, result.success) == ("ERROR: bad input", False)
+        path = write_script(PY + "raise ValueError('boom')\n")
+        result = run_service_script(path, "agent-0", "Alpha", "", 1)
+        assert not result.success and "ValueError: boom" in result.output
+
+    def test_traceback_starts_at_the_script(self):
+        path = write_script(PY + "def a(): b()\ndef b(): c()\ndef c(): {}['missing']\na()\n")
+        result = run_service_script(path, "agent-0", "Alpha", "", 1)
+        assert result.output.startswith("ERROR: Traceback (most recent call last):")
+        assert "forkserver" not in result.output and "runpy" not in result.output
+        assert result.output.rstrip().endswith("KeyError: 'missing'")
+
+    def test_output_cap_and_timeout(self, monkeypatch):
+        path = write_script(PY + "print('x' * 100000)\n")
+        result = run_service_script(path, "agent-0", "Alpha", "", 1)
+        assert result.success and result.truncated
+        assert len(result.output) == sandbox.MAX_OUTPUT
+
+        monkeypatch.setattr(sandbox, "TIMEOUT", 0.5)
+        path = write_script(PY + "import time\ntime.sleep(10)\n")
+        result = run_service_script(path, "agent-0", "Alpha", "", 1)
+        assert (result.output, result.success) == ("ERROR: script timed out (0.5s limit)", False)
+
+    def test_large_input_round_trips(self):
+        path = write_script(PY + "import json, sys\nprint(len(json.load(sys.stdin)['input']))\n")
+        result = run_service_script(path, "agent-0", "Alpha", "y" * 300000, 1)
+        assert result.success and result.output.strip() == "300000"
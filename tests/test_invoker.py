@@ -0,0 +1,90 @@
+import asyncio
+
+from src import invoker, orchestrator
+from src.invoker import InvokeResult, invoke_agents_async
+from src.types import SimulationConfig
+from tests.helpers import make_agent, make_world
+
+
+class FakeSessions:
+    """Stands in for invoke_agent_async: each agent "runs" for a scripted
+    number of event-loop steps and records how many sessions were in flight."""
+
+    def __init__(self, steps: dict[str, int], fail: tuple[str, ...] = ()) -> None:
+        self.steps = steps
+        self.fail = fail
+        self.in_flight = 0
+        self.peak = 0
+        self.finished: list[str] = []
+        self.cancelled: list[str] = []
+
+    async def __call__(self, agent, world, public_dir, private_dir, timeout, dry_run, logs_dir):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            for _ in range(self.steps[agent.name]):
+                await asyncio.sleep(0)
+            if agent.name in self.fail:
+                raise RuntimeError(f"{agent.name} crashed")
+            self.finished.append(agent.name)
+            return InvokeResult(raw_output=agent.name)
+        except asyncio.CancelledError:
+            self.cancelled.append(agent.name)
+            raise
+        finally:
+            self.in_flight -= 1
+
+
+def agents(*names):
+    return [make_agent(id=f"agent-{i}", name=name) for i, name in enumerate(names)]
+
+
+def run(batch, **kwargs):
+    return asyncio.run(invoke_agents_async(batch, make_world(batch), "public", "private", 60, False, **kwargs))
+
+
+class TestInvokeAgentsAsync:
+    def test_concurrency_bounds_sessions_in_flight(self, monkeypatch):
+        fake = FakeSessions({name: 5 for name in "ABCDEF"})
+        monkeypatch.setattr(invoker, "invoke_agent_async", fake)
+        run(agents(*"ABCDEF"), concurrency=2)
+        assert fake.peak == 2
+        assert sorted(fake.finished) == list("ABCDEF")
+
+    def test_results_keep_agent_order_when_sessions_finish_out_of_order(self, monkeypatch):
+        fake = FakeSessions({"Slow": 50, "Mid": 20, "Fast": 1})
+        monkeypatch.setattr(invoker, "invoke_agent_async", fake)
+        batch = agents("Slow", "Mid", "Fast")
+        results = run(batch, concurrency=3)
+        assert fake.finished == ["Fast", "Mid", "Slow"]
+        assert list(results) == [a.id for a in batch]
+        assert [r.raw_output for r in results.values()] == ["Slow", "Mid", "Fast"]
+
+    def test_a_failing_session_does_not_affect_the_others(self, monkeypatch):
+        fake = FakeSessions({"A": 3, "B": 1, "C": 2}, fail=("B",))
+        monkeypatch.setattr(invoker, "invoke_agent_async", fake)
+        results = run(agents("A", "B", "C"), concurrency=3)
+        assert [r.failed for r in results.values()] == [False, True, False]
+        assert "B crashed" in results["agent-1"].raw_output
+
+    def test_deadline_cancels_unfinished_sessions(self, monkeypatch):
+        fake = FakeSessions({"Done": 1, "Stuck": 10**9, "Queued": 1})
+        monkeypatch.setattr(invoker, "invoke_agent_async", fake)
+        started = []
+        results = run(agents("Done", "Stuck", "Queued"), concurrency=2, deadline=0.2,
+                      on_start=lambda a: started.append(a.name))
+        assert fake.cancelled == ["Stuck"]
+        assert results["agent-1"].failed and "deadline" in results["agent-1"].raw_output
+        assert [results[k].failed for k in ("agent-0", "agent-2")] == [False, False]
+        assert started == ["Done", "Stuck", "Queued"]
+        assert fake.in_flight == 0
+
+    def test_invoke_all_applies_config_concurrency_and_deadline(self, monkeypatch):
+        fake = FakeSessions({"A": 3, "B": 3, "Stuck": 10**9})
+        monkeypatch.setattr(invoker, "invoke_agent_async", fake)
+        batch = agents("A", "B", "Stuck")
+        config = SimulationConfig(concurrency=1, round_deadline=1)
+        results = orchestrator._invoke_all(batch, make_world(batch), config)
+        assert fake.peak == 1
+        assert list(results) == [a.id for a in batch]
+        assert fake.cancelled == ["Stuck"]
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from src.launcher import launch, launch_async
+from src.logger import init_logger
+
+
+class TestLaunch:
+    def setup_method(self):
+        self.logs_dir = tempfile.mkdtemp()
+        init_logger(self.logs_dir)
+
+    def test_feeds_stdin_and_streams_stdout(self):
+        lines = []
+        result = launch(
+            [sys.executable, "-c", "import sys; [print(l.upper(), end='') for l in sys.stdin]"],
+            "one\ntwo\n", timeout=10, on_line=lines.append, label="test",
+        )
+        assert result.returncode == 0
+        assert lines == ["ONE\n", "TWO\n"]
+        assert result.cpu_seconds is not None and result.max_rss_kb > 0
+
+        with open(os.path.join(self.logs_dir, "invocations.jsonl")) as f:
+            entry = json.loads(f.readline())
+        assert entry["label"] == "test" and entry["returncode"] == 0
+
+    def test_timeout_kills_whole_process_group(self):
+        pid_file = os.path.join(self.logs_dir, "grandchild.pid")
+        script = (
+            "import subprocess, time;"
+            f"p = subprocess.Popen(['sleep', '30']); open({pid_file!r}, 'w').write(str(p.pid));"
+            "time.sleep(30)"
+        )
+        started = time.monotonic()
+        with pytest.raises(subprocess.TimeoutExpired):
+            launch([sys.executable, "-c", script], "", timeout=1)
+        assert time.monotonic() - started < 10
+
+        grandchild = int(open(pid_file).read())
+        time.sleep(0.2)
+        assert _is_gone(grandchild)
+
+
+def _is_gone(pid: int) -> bool:
+    """True if pid no longer exists or is a zombie waiting for init to reap it."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] == "Z"
+    except FileNotFoundError:
+        return True
+
+
+class TestLaunchAsync:
+    def setup_method(self):
+        init_logger(tempfile.mkdtemp())
+
+    def test_streams_stdout_and_records_rusage(self):
+        lines = []
+        prompt = "x" * 200_000 + "\n"
+        result = asyncio.run(launch_async(
+            [sys.executable, "-c", "import sys; print(len(sys.stdin.read()))"],
+            prompt, timeout=10, on_line=lines.append,
+        ))
+        assert result.returncode == 0
+        assert lines == [f"{len(prompt)}\n"]
+        assert result.cpu_seconds > 0 and result.max_rss_kb > 0
+
+    def test_timeout_raises_and_kills(self):
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            asyncio.run(launch_async([sys.executable, "-c", "import time; time.sleep(30)"], "", timeout=1))
+        assert time.monotonic() - started < 10
+
+    def test_falls_back_to_a_waiter_thread_without_pidfd(self, monkeypatch):
+        def unsupported(pid):
+            raise OSError(38, "Function not implemented")
+        monkeypatch.setattr(os, "pidfd_open", unsupported)
+        result = asyncio.run(launch_async([sys.executable, "-c", "print('hi')"], "", timeout=10))
+        assert result.returncode == 0 and result.stdout == "hi\n"
+        assert result.cpu_seconds > 0
+        with pytest.raises(TimeoutError):
+            asyncio.run(launch_async([sys.executable, "-c", "import time; time.sleep(30)"], "", timeout=1))
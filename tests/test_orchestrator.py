@@ -0,0 +1,86 @@
+import signal
+import sys
+import tempfile
+import threading
+
+from src import orchestrator, spawner
+from src.launcher import launch
+from src.orchestrator import AdvisoryWork
+from src.logger import init_logger
+from src.types import SimulationConfig, WorldState
+from tests.helpers import make_agent
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(60)"]
+
+
+def advisory(monkeypatch, score):
+    tmp = tempfile.mkdtemp()
+    init_logger(tmp)
+    config = SimulationConfig(data_dir=tmp, logs_dir=tmp, pipeline=True)
+    world = WorldState(round=1, agents=[make_agent()])
+    monkeypatch.setattr(orchestrator, "round_summaries", lambda world, config: f"round {world.round}")
+    monkeypatch.setattr(orchestrator, "score_summaries", score)
+    monkeypatch.setattr(orchestrator, "apply_scores", lambda world, scores, scored_round: [(scored_round, scores)])
+    return AdvisoryWork(world, config), world
+
+
+class TestAdvisoryWork:
+    def test_commit_waits_for_the_evaluation_of_the_submitted_round(self, monkeypatch):
+        release = threading.Event()
+
+        def score(summaries, config):
+            release.wait(10)
+            return [summaries]
+
+        work, world = advisory(monkeypatch, score)
+        work.submit_eval(world)
+        world.round = 2
+        threading.Timer(0.05, release.set).start()
+        assert work.commit_eval(world) == [(1, ["round 1"])]
+        assert work.commit_eval(world) == []
+        work.submit_eval(world)
+        assert work.close(world) == [(2, ["round 2"])]
+
+    def test_interrupt_kills_running_evaluator_and_designers(self, monkeypatch):
+        launched = {}
+        started = threading.Event()
+
+        def score(summaries, config):
+            started.set()
+            for axis in ("a", "b"):  # a killed axis must not let the next one run on
+                launched[axis] = launch(SLEEPER, "", 120, label=f"eval:{axis}")
+            return []
+
+        def design(world, config, d_invoker, d_model):
+            launched[d_model] = launch(SLEEPER, "", 120, label=f"design:{d_model}")
+            return None, None
+
+        monkeypatch.setattr(spawner, "_design_self_prompt", design)
+        work, world = advisory(monkeypatch, score)
+        work.submit_eval(world)
+        work.designers.refill()
+        assert started.wait(10)
+
+        assert work.close(world, interrupted=True) == []
+        assert work.designers.in_flight == 0
+        assert launched.keys() >= {"a", "b"}
+        assert all(r.returncode == -signal.SIGKILL for r in launched.values())
+
+    def test_normal_close_kills_designers_instead_of_waiting(self, monkeypatch):
+        launched = {}
+        started = threading.Event()
+
+        def design(world, config, d_invoker, d_model):
+            started.set()
+            launched[d_model] = launch(SLEEPER, "", 600, label=f"design:{d_model}")
+            return None, None
+
+        monkeypatch.setattr(spawner, "_design_self_prompt", design)
+        work, world = advisory(monkeypatch, lambda summaries, config: [summaries])
+        work.submit_eval(world)
+        work.designers.refill()
+        assert started.wait(10)
+
+        assert work.close(world) == [(1, ["round 1"])]
+        assert work.designers.in_flight == 0
+        assert launched and all(r.returncode == -signal.SIGKILL for r in launched.values())
@@ -2,25 +2,9 @@ import json
 import os
 import tempfile
 
-from src.types import Agent, Entity, UseServiceRequest, WorldState
+from src.types import Entity, UseServiceRequest
 from src.physics import consume_energy, transfer_energy, check_deaths
-
-
-def make_agent(**overrides) -> Agent:
-    defaults = dict(
-        id="agent-0",
-        name="Alpha",
-        energy=20,
-        alive=True,
-        age=0,
-        invoker="claude",
-    )
-    defaults.update(overrides)
-    return Agent(**defaults)
-
-
-def make_world(agents: list[Agent]) -> WorldState:
-    return WorldState(round=1, agents=agents)
+from tests.helpers import make_agent, make_world
 
 
 class TestTransferEnergy:
@@ -0,0 +1,121 @@
+import os
+import time
+
+from src import sandbox
+from src.execution import process_use_service
+from src.services import install_script, save_entity
+from src.sandbox import run_service_script
+from src.types import UseServiceRequest
+from tests.helpers import make_agent, make_service, make_world, write_script
+
+FLOOD_SH = "#!/bin/sh\nwhile :; do echo xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx; done\n"
+FLOOD_PY = "#!/usr/bin/env python3\nwhile True:\n    print('x' * 1000)\n"
+
+
+class TestBoundedOutput:
+    def test_endless_stdout_is_cut_off_and_killed(self):
+        for source in (FLOOD_SH, FLOOD_PY):
+            started = time.monotonic()
+            result = run_service_script(write_script(source), "agent-0", "Alpha", "", 1)
+            assert result.success and result.truncated
+            assert len(result.output) == sandbox.MAX_OUTPUT
+            assert time.monotonic() - started < 5
+
+    def test_stderr_is_capped(self):
+        path = write_script("#!/usr/bin/env python3\nimport sys\nsys.stderr.write('e' * 100000)\nsys.exit(1)\n")
+        result = run_service_script(path, "agent-0", "Alpha", "", 1)
+        assert not result.success
+        assert result.output == "ERROR: " + "e" * sandbox.MAX_STDERR
+
+    def test_use_service_event_reports_truncation(self, tmp_path):
+        data_dir = str(tmp_path / "data")
+        private_dir = str(tmp_path / "private")
+        agent = make_agent()
+        os.makedirs(os.path.join(private_dir, agent.id))
+        entity = make_service(name="Flood", script="svc.py")
+        install_script(data_dir, entity.name, write_script(FLOOD_PY))
+        save_entity(entity, data_dir)
+
+        events = process_use_service(
+            agent, UseServiceRequest(name="Flood", input=""), make_world([agent]), data_dir, private_dir,
+        )
+        assert events[0].details["truncated"] is True
+
+
+DETACHED_PY = """#!/usr/bin/env python3
+import os, sys, time
+print('{"output": "done"}')
+sys.stdout.flush()
+os.close(1)
+os.close(2)
+time.sleep(30)
+"""
+
+
+class TestReapDeadline:
+    def test_script_that_closes_its_output_is_killed_at_the_timeout(self, monkeypatch):
+        monkeypatch.setattr(sandbox, "TIMEOUT", 1)
+        for forkserver in (True, False):
+            monkeypatch.setattr(sandbox, "USE_FORKSERVER", forkserver)
+            started = time.monotonic()
+            result = run_service_script(write_script(DETACHED_PY), "agent-0", "Alpha", "", 1)
+            assert not result.success
+            assert "timed out" in result.output
+            assert time.monotonic() - started < 15
+
+
+BUSY_PY = "#!/usr/bin/env python3\nwhile True:\n    pass\n"
+ALLOC_PY = "#!/usr/bin/env python3\nblock = bytearray(300 * 1024 * 1024)\nprint('allocated')\n"
+
+
+class TestResourceLimits:
+    def test_defaults_cover_the_timeout_and_memory_is_opt_in(self):
+        limits = sandbox.resolve_limits({})
+        assert limits == {"cpu": sandbox.TIMEOUT, "fsize_mb": 64}
+
+    def test_limits_are_set_up_to_a_ceiling(self):
+        limits = sandbox.resolve_limits({"cpu": 5, "memory_mb": 10**6, "nproc": 10**6, "bogus": 1, "fsize_mb": -1})
+        assert limits["cpu"] == 5
+        assert limits["memory_mb"] == sandbox.MAX_LIMITS["memory_mb"]
+        assert limits["fsize_mb"] == sandbox.DEFAULT_LIMITS["fsize_mb"]
+        assert limits["nproc"] == sandbox.MAX_LIMITS["nproc"]
+        assert "bogus" not in limits
+        assert sandbox.resolve_limits({"memory_mb": 2048, "fsize_mb": 256}) == {
+            "cpu": sandbox.TIMEOUT, "memory_mb": 2048, "fsize_mb": 256,
+        }
+
+    def test_cpu_limit_stops_busy_loop(self):
+        started = time.monotonic()
+        result = run_service_script(write_script(BUSY_PY), "agent-0", "Alpha", "", 1, limits={"cpu": 1})
+        assert not result.success
+        assert "CPU" in result.output
+        assert result.cpu_seconds > 0.5
+        assert time.monotonic() - started < 10
+
+    def test_memory_limit_is_enforced(self):
+        path = write_script(ALLOC_PY)
+        assert not run_service_script(path, "agent-0", "Alpha", "", 1, limits={"memory_mb": 100}).success
+        assert run_service_script(path, "agent-0", "Alpha", "", 1).success
+
+    def test_use_service_event_records_usage(self, tmp_path):
+        data_dir = str(tmp_path / "data")
+        private_dir = str(tmp_path / "private")
+        agent = make_agent()
+        os.makedirs(os.path.join(private_dir, agent.id))
+        entity = make_service(name="Echo", script="svc.py")
+        install_script(data_dir, entity.name, write_script("#!/usr/bin/env python3\nprint('hi')\n"))
+        save_entity(entity, data_dir)
+
+        events = process_use_service(
+            agent, UseServiceRequest(name="Echo", input=""), make_world([agent]), data_dir, private_dir,
+        )
+        assert events[0].details["success"] is True
+        assert "cpu_seconds" in events[0].details
+        assert events[0].details["max_rss_kb"] > 0
+
+    def test_exec_scripts_and_their_children_start_limited(self):
+        # The subshell forks before the script's first command could finish.
+        path = write_script("#!/bin/sh\n(ulimit -t; ulimit -v)\n")
+        result = run_service_script(path, "agent-0", "Alpha", "", 1, limits={"cpu": 5, "memory_mb": 512})
+        assert result.success
+        assert result.output.split() == ["5", str(512 * 1024)]
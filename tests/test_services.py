@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+
+from src.services import (
+    ServiceRegistry, count_agent_services, delete_entity, ensure_system_services,
+    find_service, flush_services, hooked_services, load_all_entities, save_entity,
+)
+from tests.helpers import make_service
+
+
+class TestServiceRegistry:
+    def test_lookups_are_served_from_memory(self):
+        data_dir = tempfile.mkdtemp()
+        save_entity(make_service(), data_dir)
+        save_entity(make_service(name="Other"), data_dir)
+
+        assert find_service("echo", data_dir) is find_service("ECHO", data_dir)
+        assert count_agent_services("agent-0", data_dir) == 2
+        assert [e.name for e in load_all_entities(data_dir)] == ["Echo", "Other"]
+
+    def test_writes_are_deferred_until_flush(self):
+        data_dir = tempfile.mkdtemp()
+        entity = make_service(state={"n": 1})
+        save_entity(entity, data_dir)
+        path = os.path.join(data_dir, "services", "echo", "entity.json")
+        assert not os.path.exists(path)
+
+        flush_services(data_dir)
+        with open(path) as f:
+            assert json.load(f)["state"] == {"n": 1}
+
+        # A fresh registry reads the flushed files back.
+        reloaded = ServiceRegistry(data_dir).get("echo")
+        assert reloaded.state == {"n": 1}
+        assert reloaded.provider_id == "agent-0"
+
+    def test_delete_removes_entity_and_index(self):
+        data_dir = tempfile.mkdtemp()
+        save_entity(make_service(), data_dir)
+        flush_services(data_dir)
+
+        delete_entity(data_dir, "Echo")
+        flush_services(data_dir)
+
+        assert find_service("Echo", data_dir) is None
+        assert count_agent_services("agent-0", data_dir) == 0
+        assert not os.path.exists(os.path.join(data_dir, "services", "echo"))
+
+    def test_system_services_are_not_shared_between_data_dirs(self):
+        a, b = tempfile.mkdtemp(), tempfile.mkdtemp()
+        ensure_system_services(a)
+        ensure_system_services(b)
+
+        find_service("message", a).energy = 99
+        assert find_service("message", b).energy != 99
+
+    def test_mirror_is_published_once_per_flush(self):
+        data_dir = tempfile.mkdtemp()
+        for sub in ("managed", "public"):
+            os.makedirs(os.path.join(data_dir, sub))
+        mirror = os.path.join(data_dir, "managed", "services.json")
+        save_entity(make_service(state={"secret": 1}), data_dir)
+        save_entity(make_service(name="Other"), data_dir)
+        assert not os.path.exists(mirror)
+
+        flush_services(data_dir)
+        with open(mirror) as f:
+            published = json.load(f)
+        assert [s["name"] for s in published] == ["Echo", "Other"]
+        assert "state" not in published[0]
+        assert not any(n.startswith(".tmp-") for n in os.listdir(os.path.dirname(mirror)))
+
+        mtime = os.stat(mirror).st_mtime_ns
+        flush_services(data_dir)  # nothing changed
+        assert os.stat(mirror).st_mtime_ns == mtime
+
+    def test_hook_index_follows_publish_and_unpublish(self):
+        data_dir = tempfile.mkdtemp()
+        save_entity(make_service(name="B", hooks=["on_agent_death", "on_round_end"]), data_dir)
+        save_entity(make_service(name="A", hooks=["on_agent_death"]), data_dir)
+        save_entity(make_service(name="C"), data_dir)
+
+        assert [e.name for e in hooked_services("on_agent_death", data_dir)] == ["A", "B"]
+        delete_entity(data_dir, "B")
+        assert [e.name for e in hooked_services("on_agent_death", data_dir)] == ["A"]
+        assert hooked_services("on_round_end", data_dir) == []
@@ -0,0 +1,38 @@
+import tempfile
+import time
+
+from src.config import TOP_MODELS
+from src.spawner import DesignerPool, load_designs
+from src.types import SimulationConfig, WorldState
+
+
+class TestDesignerPool:
+    def test_refill_builds_persisted_inventory(self):
+        config = SimulationConfig(data_dir=tempfile.mkdtemp(), dry_run=True)
+        pool = DesignerPool(WorldState(round=1, agents=[]), config)
+
+        pool.refill()
+        pool.refill()  # in-flight jobs count toward the target
+        _wait_idle(pool)
+
+        assert len(load_designs(config.data_dir)) == len(TOP_MODELS)
+        taken = pool.take(1)
+        assert taken[0]["self_prompt"]
+        assert len(load_designs(config.data_dir)) == len(TOP_MODELS) - 1
+
+    def test_inventory_survives_restart(self):
+        config = SimulationConfig(data_dir=tempfile.mkdtemp(), dry_run=True)
+        pool = DesignerPool(WorldState(round=1, agents=[]), config)
+        pool.refill()
+        _wait_idle(pool)
+
+        restarted = DesignerPool(WorldState(round=1, agents=[]), config)
+        assert len(restarted.take(10)) == len(TOP_MODELS)
+        restarted.shutdown()
+
+
+def _wait_idle(pool: DesignerPool) -> None:
+    deadline = time.monotonic() + 10
+    while pool.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pool.shutdown()
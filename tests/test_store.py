@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+from src.eval_service import handle_evaluator_service
+from src.execution import process_use_service
+from src.orchestrator import _command_txn
+from src.services import (
+    find_service, flush_services, install_script, is_subscribed, load_subscriptions, persist_services,
+    save_entity, subscribe, unsubscribe,
+)
+from src.store import STATE_DB, open_store
+from src.turns import TurnState, load_turns, save_turns
+from src.types import Agent, SimulationConfig, UseServiceRequest, WorldState
+from src.world import load_world, save_world
+from tests.helpers import make_agent, make_service, make_world, write_script
+
+INCREMENT = """#!/usr/bin/env python3
+import json, sys
+payload = json.load(sys.stdin)
+with open(payload["state_path"]) as f:
+    n = json.load(f)["n"]
+if "state_log" in payload:
+    with open(payload["state_log"]) as f:
+        n = [json.loads(line)["n"] for line in f][-1]
+print(json.dumps({"output": str(n), "state_patch": {"n": n + 1}}))
+"""
+
+
+def sqlite_dir() -> str:
+    data_dir = tempfile.mkdtemp()
+    for sub in ("managed", "public"):
+        os.makedirs(os.path.join(data_dir, sub))
+    open_store(data_dir)
+    return data_dir
+
+
+class TestSqliteStore:
+    def test_seeds_from_existing_json(self):
+        data_dir = tempfile.mkdtemp()
+        world = WorldState(round=3, agents=[
+            Agent(id="agent-0", name="Alpha", energy=5, alive=True, age=1, invoker="claude"),
+        ])
+        save_world(world, data_dir)
+        with open(os.path.join(data_dir, "subscriptions.json"), "w") as f:
+            json.dump({"grid": ["agent-0"]}, f)
+
+        open_store(data_dir)
+
+        assert os.path.exists(os.path.join(data_dir, STATE_DB))
+        assert load_world(data_dir).round == 3
+        assert is_subscribed("agent-0", "grid", data_dir)
+
+    def test_state_round_trips_without_engine_json(self):
+        data_dir = sqlite_dir()
+        save_entity(make_service(state={"n": 2}), data_dir)
+        flush_services(data_dir)
+        save_turns(TurnState(round=1, order=["agent-0"]), data_dir)
+
+        store = open_store(data_dir)
+        assert store.load_services()[0]["state"] == {"n": 2}
+        assert load_turns(data_dir).order == ["agent-0"]
+        assert not os.path.exists(os.path.join(data_dir, "services", "echo", "entity.json"))
+        assert not os.path.exists(os.path.join(data_dir, "turns.json"))
+        # Agent-facing mirror is still exported.
+        with open(os.path.join(data_dir, "managed", "services.json")) as f:
+            assert json.load(f)[0]["name"] == "Echo"
+
+    def test_subscriptions_and_mirror(self):
+        data_dir = sqlite_dir()
+        assert subscribe("agent-0", "grid", data_dir)
+        assert subscribe("agent-1", "grid", data_dir)
+        assert not subscribe("agent-0", "grid", data_dir)
+        assert unsubscribe("agent-0", "grid", data_dir)
+
+        assert load_subscriptions(data_dir) == {"grid": ["agent-1"]}
+        with open(os.path.join(data_dir, "managed", "subscriptions.json")) as f:
+            assert json.load(f) == {"grid": ["agent-1"]}
+
+    def test_votes_are_indexed_by_round(self):
+        data_dir = sqlite_dir()
+        handle_evaluator_service("agent-0", "Alpha", "RATE Beta good", 1, data_dir)
+        handle_evaluator_service("agent-0", "Alpha", "RATE Gamma", 2, data_dir)
+
+        store = open_store(data_dir)
+        assert store.load_votes(1)["agent-0"]["target"] == "Beta"
+        assert store.load_votes(2)["agent-0"]["target"] == "Gamma"
+        output, _ = handle_evaluator_service("agent-0", "Alpha", "RATE Gamma", 2, data_dir)
+        assert output.startswith("Already voted")
+
+    def test_failed_transaction_rolls_back(self):
+        data_dir = sqlite_dir()
+        store = open_store(data_dir)
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                subscribe("agent-0", "grid", data_dir)
+                save_entity(make_service(), data_dir)
+                persist_services(data_dir)
+                raise RuntimeError("crash mid-command")
+
+        assert load_subscriptions(data_dir) == {}
+        assert store.load_services() == []
+
+    def test_commands_append_state_patches_without_rewriting_state_file(self, tmp_path):
+        data_dir = sqlite_dir()
+        install_script(data_dir, "Counter", write_script(INCREMENT))
+        save_entity(make_service(name="Counter", script="svc.py", state={"n": 1, "big": "x" * 10000},
+                                 state_file=True), data_dir)
+        agent = make_agent()
+        private_dir = str(tmp_path / "private")
+        os.makedirs(os.path.join(private_dir, agent.id))
+        world = make_world([agent])
+        config = SimulationConfig(data_dir=data_dir)
+
+        def call():
+            with _command_txn(world, config):
+                process_use_service(agent, UseServiceRequest(name="Counter", input=""), world, data_dir, private_dir)
+
+        call()
+        flush_services(data_dir)  # turn boundary: state.json holds n=2
+        state_json = os.path.join(data_dir, "services", "counter", "state.json")
+        before = os.stat(state_json)
+        call()
+        call()
+
+        after = os.stat(state_json)
+        assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+        with open(os.path.join(data_dir, "services", "counter", "state.log")) as f:
+            assert [json.loads(line) for line in f] == [{"n": 3}, {"n": 4}]
+        assert find_service("Counter", data_dir).state["n"] == 4
+
+        flush_services(data_dir)
+        with open(state_json) as f:
+            assert json.load(f)["n"] == 4
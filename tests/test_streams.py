@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+
+from src.streams import ClaudeStream, CodexStream, MAX_TEXT_CHARS
+
+
+def _stream_file() -> str:
+    return os.path.join(tempfile.mkdtemp(), "r1-agent-0.jsonl")
+
+
+class TestClaudeStream:
+    def test_extracts_text_cost_and_usage_in_one_pass(self):
+        path = _stream_file()
+        lines = [
+            json.dumps({"type": "system", "subtype": "init"}) + "\n",
+            json.dumps({"type": "assistant", "message": {"content": [{"type": "text", "text": "thinking"}]}}) + "\n",
+            "not json\n",
+            json.dumps({"type": "result", "result": "done", "total_cost_usd": 0.25,
+                        "usage": {"input_tokens": 120, "output_tokens": 30}}) + "\n",
+        ]
+        with ClaudeStream(path) as stream:
+            for line in lines:
+                stream.feed(line)
+
+        assert stream.text == "thinking\ndone"
+        assert stream.cost_usd == 0.25
+        assert stream.input_tokens == 120
+        assert stream.output_tokens == 30
+        assert open(path).read() == "".join(lines)
+
+    def test_falls_back_to_raw_stream_without_text(self):
+        with ClaudeStream(_stream_file()) as stream:
+            stream.feed("plain output\n")
+        assert stream.text == "plain output\n"
+
+    def test_retained_text_is_bounded(self):
+        block = "x" * 1000
+        with ClaudeStream(_stream_file()) as stream:
+            for _ in range(500):
+                stream.feed(json.dumps({"type": "assistant", "message": {"content": [{"type": "text", "text": block}]}}) + "\n")
+        assert len(stream.text) <= MAX_TEXT_CHARS
+
+
+class TestCodexStream:
+    def test_sums_usage_across_turns(self):
+        with CodexStream(_stream_file(), "gpt-5.4") as stream:
+            for _ in range(2):
+                stream.feed(json.dumps({"type": "turn.completed", "usage": {"input_tokens": 1_000_000, "output_tokens": 0}}) + "\n")
+        assert stream.input_tokens == 2_000_000
+        assert stream.cost_usd == 5.0
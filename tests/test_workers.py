@@ -0,0 +1,88 @@
+import json
+import os
+import stat
+import tempfile
+import time
+
+from src import workers
+from src.sandbox import parse_service_output, run_service_script
+
+COUNTER = """#!/usr/bin/env python3
+import json, os, sys, time
+n = 0
+for line in sys.stdin:
+    req = json.loads(line)
+    n += 1
+    if req["input"] == "sleep":
+        time.sleep(5)
+    print(json.dumps({"output": f"{os.getpid()}:{n}", "state": req["state"]}), flush=True)
+"""
+
+
+def write_script(source: str = COUNTER) -> str:
+    path = os.path.join(tempfile.mkdtemp(), "svc.py")
+    with open(path, "w") as f:
+        f.write(source)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def call(path: str, text: str = "") -> tuple[str, bool]:
+    result = run_service_script(path, "agent-0", "Alpha", text, 1, state={"k": 1}, persistent=True)
+    return parse_service_output(result.output)[0], result.success
+
+
+class TestPersistentWorkers:
+    def teardown_method(self):
+        workers.shutdown_workers()
+
+    def test_worker_is_reused_across_calls(self):
+        path = write_script()
+        first, ok1 = call(path)
+        second, ok2 = call(path)
+        assert ok1 and ok2
+        assert first.split(":")[0] == second.split(":")[0]
+        assert second.endswith(":2")
+
+    def test_recycles_after_max_requests(self, monkeypatch):
+        monkeypatch.setattr(workers, "MAX_REQUESTS", 2)
+        path = write_script()
+        pids = {call(path)[0].split(":")[0] for _ in range(3)}
+        assert len(pids) == 2
+
+    def test_restarts_when_script_changes(self):
+        path = write_script()
+        call(path)
+        time.sleep(0.01)
+        with open(path, "a") as f:
+            f.write("# v2\n")
+        assert call(path)[0].endswith(":1")
+
+    def test_timeout_kills_worker(self, monkeypatch):
+        monkeypatch.setattr("src.sandbox.TIMEOUT", 0.5)
+        path = write_script()
+        worker_output, ok = call(path, "sleep")
+        assert not ok and "timed out" in worker_output
+        output, ok = call(path)
+        assert ok and output.endswith(":1")
+
+    def test_idle_workers_are_evicted(self):
+        path = write_script()
+        call(path)
+        proc = workers._workers[path].proc
+        workers.evict_idle_workers(idle_timeout=0)
+        assert path not in workers._workers
+        assert proc.poll() is not None
+
+    def test_payload_matches_one_shot_mode(self):
+        path = write_script("""#!/usr/bin/env python3
+import json, sys
+for line in sys.stdin:
+    print(json.dumps({"output": json.dumps(sorted(json.loads(line)))}), flush=True)
+""")
+        output, ok = call(path)
+        assert ok
+        assert json.loads(output) == sorted([
+            "trigger", "caller_id", "caller_name", "input", "round",
+            "energy", "price", "state", "context",
+        ])